@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-16 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_alter_alarm_options_alarm_video_absolute_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='control',
+            name='roi',
+            field=models.TextField(blank=True, null=True, verbose_name='检测区域'),
+        ),
+    ]
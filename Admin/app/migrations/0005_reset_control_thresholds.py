@@ -0,0 +1,22 @@
+# Generated by Django 5.2 on 2026-10-17 09:30
+
+from django.db import migrations
+
+
+def reset_placeholder_thresholds(apps, schema_editor):
+    # Controls used to be saved with a placeholder of 1 for both thresholds.
+    # 0 means "use the behavior's value", which is what those controls got.
+    Control = apps.get_model('app', 'Control')
+    Control.objects.filter(sensitivity=1).update(sensitivity=0)
+    Control.objects.filter(overlap_thresh=1).update(overlap_thresh=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_control_roi'),
+    ]
+
+    operations = [
+        migrations.RunPython(reset_placeholder_thresholds, migrations.RunPython.noop),
+    ]
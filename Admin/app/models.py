@@ -56,6 +56,8 @@ class Control(models.Model):
     sensitivity = models.FloatField(default=0.0, verbose_name='灵敏度') # SQL has INTEGER NOT NULL DEFAULT 0 (Changed to FloatField based on typical sensitivity values and av_behavior definition)
     overlap_thresh = models.FloatField(default=0.0, verbose_name='阈值') # SQL has integer NOT NULL DEFAULT 0 (Changed to FloatField based on typical threshold values and av_behavior definition)
     remark = models.CharField(max_length=200, verbose_name='备注') # SQL has varchar(200) NOT NULL
+    # JSON list of regions of interest normalized to 0-1: [x1, y1, x2, y2] rectangles or [[x, y], ...] polygons
+    roi = models.TextField(null=True, blank=True, verbose_name='检测区域') # 为空时检测整个画面
 
     push_stream = models.BooleanField(verbose_name='是否推流') # SQL has INTEGER NOT NULL (BooleanField is appropriate)
     push_stream_app = models.CharField(max_length=50, null=True, blank=True, verbose_name='推流应用') # SQL has varchar(50) (Added blank=True for admin form)
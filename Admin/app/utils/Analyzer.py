@@ -73,13 +73,18 @@ class Analyzer():
 
         return __state, __msg, __control
 
-    def control_add(self, code, behaviorCode, streamUrl, pushStream, pushStreamUrl):
+    def control_add(self, code, behaviorCode, streamUrl, pushStream, pushStreamUrl, interval=None, roi=None,
+                    sensitivity=None, overlapThresh=None):
         """
         @code          布控编号                    [str]  xxxxxxxxx
         @behaviorCode  布控的视频流处理算法          [str]ZHOUJIERUQIN
         @streamUrl     布控视频流的拉流地址          [str]rtmp://192.168.1.3:1935/live/m2
         @pushStream  布控的视频流经处理后是否推流      [bool] True
         @pushStreamUrl 布控的视频流经过处理的推流地址  [str]rtmp://192.168.1.3:1935/live/m2-behavior
+        @interval      算法检测间隔（空闲时每隔多少帧检测一次） [int] 10
+        @roi           检测区域（坐标归一化到0-1，矩形或多边形） [list] [[0.1, 0.2, 0.5, 0.8]]
+        @sensitivity   灵敏度（模型推理的置信度阈值）   [float] 0.5
+        @overlapThresh 阈值（模型NMS的IoU阈值）         [float] 0.45
         """
         __state = False
         __msg = "error"
@@ -99,6 +104,14 @@ class Analyzer():
                 "pushStreamUrl": pushStreamUrl,
                 "behaviorCode": behaviorCode,
             }
+            if interval is not None:
+                data["interval"] = interval
+            if roi:
+                data["roi"] = roi
+            if sensitivity is not None:
+                data["sensitivity"] = sensitivity
+            if overlapThresh is not None:
+                data["overlapThresh"] = overlapThresh
 
             data_json = json.dumps(data)
 
@@ -18,6 +18,48 @@ base_djangoSql = DjangoSql()
 font_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + "/font/hei.ttf"
 captcha = Captcha(font_path=font_path)
 
+def parse_control_roi(roi):
+    """
+    检测区域参数校验：返回规范化后的JSON字符串，为空时返回None
+    Raises ValueError if roi is not a JSON list.
+    """
+    roi = roi.strip() if roi else ""
+    if not roi:
+        return None
+    try:
+        roi_list = json.loads(roi)
+    except ValueError:
+        raise ValueError("检测区域格式错误，应为JSON数组")
+    if not isinstance(roi_list, list):
+        raise ValueError("检测区域格式错误，应为JSON数组")
+    return json.dumps(roi_list) if roi_list else None
+
+def parse_control_threshold(value, label):
+    """
+    布控灵敏度/阈值参数校验：返回(0, 1]之间的浮点数，为空时返回0（使用算法的值）
+    Raises ValueError if value is not a number in (0, 1].
+    """
+    value = value.strip() if value else ""
+    if not value:
+        return 0
+    try:
+        value = float(value)
+    except ValueError:
+        raise ValueError("%s应为数字" % label)
+    if not 0 < value <= 1:
+        raise ValueError("%s应在(0, 1]之间" % label)
+    return value
+
+def get_control_threshold(control_value, behavior_value):
+    """
+    布控的灵敏度/阈值：布控上设置了(0, 1]之间的值时使用布控的值，否则使用算法的值
+    Returns None if neither is a usable threshold (the analyzer keeps the model default).
+    """
+    for value in (control_value, behavior_value):
+        if value is not None and 0 < float(value) <= 1:
+            return float(value)
+    return None
+
 
 @require_http_methods(["POST"])
 def handle_alarm_api(request):
@@ -333,6 +375,9 @@ def api_controlAdd(request):
         behaviorCode = params.get("behaviorCode")
         pushStream = True if '1' == params.get("pushStream") else False
         remark = params.get("remark")
+        roi = params.get("roi")
+        sensitivity = params.get("sensitivity")
+        overlapThresh = params.get("overlapThresh")
 
         streamApp = params.get("streamApp")
         streamName = params.get("streamName")
@@ -345,6 +390,9 @@ def api_controlAdd(request):
             __save_msg = "error"
 
             try:
+                roi = parse_control_roi(roi)
+                sensitivity = parse_control_threshold(sensitivity, "灵敏度")
+                overlapThresh = parse_control_threshold(overlapThresh, "阈值")
                 control = None
                 try:
                     control = Control.objects.get(code=controlCode)
@@ -359,9 +407,10 @@ def api_controlAdd(request):
 
                     control.behavior_code = behaviorCode
                     control.interval = 1
-                    control.sensitivity = 1
-                    control.overlap_thresh = 1
+                    control.sensitivity = sensitivity
+                    control.overlap_thresh = overlapThresh
                     control.remark = remark
+                    control.roi = roi
                     control.push_stream = pushStream
                     control.last_update_time = datetime.now()
                     control.save()
@@ -385,9 +434,10 @@ def api_controlAdd(request):
 
                     control.behavior_code = behaviorCode
                     control.interval = 1
-                    control.sensitivity = 1
-                    control.overlap_thresh = 1
+                    control.sensitivity = sensitivity
+                    control.overlap_thresh = overlapThresh
                     control.remark = remark
+                    control.roi = roi
 
                     control.push_stream = pushStream
                     control.push_stream_app = base_media.default_push_stream_app
@@ -432,6 +482,9 @@ def api_controlEdit(request):
         behaviorCode = params.get("behaviorCode")
         pushStream = True if '1' == params.get("pushStream") else False
         remark = params.get("remark")
+        roi = params.get("roi")
+        sensitivity = params.get("sensitivity")
+        overlapThresh = params.get("overlapThresh")
 
 
         if controlCode and behaviorCode:
@@ -440,9 +493,10 @@ def api_controlEdit(request):
 
                 control.behavior_code = behaviorCode
                 control.interval = 1
-                control.sensitivity = 1
-                control.overlap_thresh = 1
+                control.sensitivity = parse_control_threshold(sensitivity, "灵敏度")
+                control.overlap_thresh = parse_control_threshold(overlapThresh, "阈值")
                 control.remark = remark
+                control.roi = parse_control_roi(roi)
                 control.push_stream = pushStream
 
                 control.last_update_time = datetime.now()
@@ -484,12 +538,21 @@ def api_analyzerControlAdd(request):
             except:
                 pass
             if control:
+                behavior = None
+                try:
+                    behavior = Behavior.objects.get(code=control.behavior_code)
+                except:
+                    pass
                 __state,__msg = base_analyzer.control_add(
                     code=controlCode,
                     behaviorCode=control.behavior_code,
                     streamUrl=base_media.get_rtspUrl(control.stream_app, control.stream_name), #拉流地址
                     pushStream=control.push_stream,
                     pushStreamUrl=base_media.get_rtspUrl(control.push_stream_app,control.push_stream_name), # 推流地址
+                    interval=behavior.interval if behavior else None, # 算法检测间隔
+                    roi=json.loads(control.roi) if control.roi else None, # 检测区域
+                    sensitivity=get_control_threshold(control.sensitivity, behavior.sensitivity if behavior else None), # 置信度阈值
+                    overlapThresh=get_control_threshold(control.overlap_thresh, behavior.overlap_thresh if behavior else None), # NMS IoU阈值
                 )
 
                 msg = __msg
@@ -202,8 +202,8 @@ def web_control_add(request):
         user_id=getUser(request).get("id") if getUser(request) else 0,
         sort=0,
         interval=1,
-        sensitivity=1,
-        overlap_thresh=1,
+        sensitivity=0,
+        overlap_thresh=0,
         stream_app="",
         stream_name="",
         stream_video="",
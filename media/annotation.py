@@ -0,0 +1,81 @@
+# inference_service/annotation.py (Standalone with SQLite)
+
+import threading
+
+class LazyAnnotatedFrame:
+    """
+    A raw frame together with the drawing steps of its annotations
+    (general detections, ROI outlines, behavior overlays). Nothing is drawn
+    until a consumer (the pusher, an alarm clip save, a snapshot request)
+    calls render(); the result is then memoized, so a frame is drawn at
+    most once however many consumers need it.
+    延迟标注：保存原始帧和检测结果，仅在推流、告警录像或截图需要时才绘制，并缓存绘制结果
+    """
+    def __init__(self, frame, renderers=None, lease=None):
+        """
+        Args:
+            frame (np.ndarray): The raw BGR frame. It is never modified.
+            renderers (list | None): Callables taking the image being annotated,
+                                     drawing on it in place and returning it.
+            lease (ingest.FrameLease | None): Lease of the frame's pooled ingest buffer, if any.
+                                              Holders of the annotated frame retain()/release() it.
+        """
+        self.frame = frame
+        self.lease = lease
+        self._renderers = list(renderers or [])
+        self._rendered = None
+        self._lock = threading.Lock()
+
+    @property
+    def shape(self):
+        return self.frame.shape
+
+    @property
+    def is_rendered(self):
+        return self._rendered is not None
+
+    def retain(self):
+        """
+        Adds a hold on the raw frame's pooled buffer (always succeeds for an unpooled frame).
+
+        Returns:
+            bool: False if the buffer was already returned to its pool.
+        """
+        return self.lease is None or self.lease.retain()
+
+    def release(self):
+        """Drops a hold taken with retain()."""
+        if self.lease is not None:
+            self.lease.release()
+
+    def add_renderer(self, renderer):
+        """Appends a drawing step (only effective before the first render())."""
+        self._renderers.append(renderer)
+
+    def render(self):
+        """
+        Draws the annotations on a copy of the raw frame (once) and returns it.
+
+        Returns:
+            np.ndarray: The annotated frame. Callers must not modify it.
+        """
+        with self._lock:
+            if self._rendered is None:
+                image = self.frame.copy()
+                for renderer in self._renderers:
+                    image = renderer(image)
+                self._rendered = image
+            return self._rendered
+
+    @classmethod
+    def from_image(cls, image):
+        """Wraps an already annotated image (e.g. drawn by a legacy behavior)."""
+        annotated = cls(image)
+        annotated._rendered = image
+        return annotated
+
+def render_frame(frame):
+    """Returns the annotated image of a LazyAnnotatedFrame, or the frame itself if it is already an image."""
+    if isinstance(frame, LazyAnnotatedFrame):
+        return frame.render()
+    return frame
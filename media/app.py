@@ -1,6 +1,6 @@
 # inference_service/app.py (Standalone with SQLite)
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 import logging
 import os
 import sys
@@ -9,6 +9,8 @@ import time # Import standard time
 # Import configuration and VideoProcessor
 import config
 from video_processor import VideoProcessor
+from regions import parse_rois
+from ingest import INGEST_BACKENDS, parse_decoder_options, parse_analysis_options
 # Note: No Django imports here anymore
 
 # Configure logging (basic configuration is in config.py, but can add more here)
@@ -20,6 +22,11 @@ app = Flask(__name__)
 # Initialize processor with model path from config
 video_processor = VideoProcessor()
 
+# Optionally preload and warm up every configured model in the background;
+# /health reports not ready until this finishes
+if config.MODEL_PRELOAD_ENABLED:
+    video_processor.start_preload(list(config.BEHAVIOR_MODEL_MAP.keys()))
+
 # --- API Endpoints Aligned with Analyzer Class ---
 
 @app.route('/api/controls', methods=['POST'])  # Analyzer uses POST /api/controls
@@ -82,6 +89,14 @@ def start_detection_route_aligned():
     streamUrl = data.get('streamUrl')
     pushStream = data.get('pushStream', False) # Default to False if not provided
     pushStreamUrl = data.get('pushStreamUrl')
+    interval = data.get('interval') # Optional behavior detection interval (adaptive sampling)
+    motionThreshold = data.get('motionThreshold') # Optional motion gate threshold (0 disables)
+    roi = data.get('roi') # Optional regions of interest: [[x1, y1, x2, y2] | [[x, y], ...], ...] normalized to 0-1
+    sensitivity = data.get('sensitivity') # Optional confidence threshold (0-1) of the model call
+    overlapThresh = data.get('overlapThresh') # Optional NMS IoU threshold (0-1) of the model call
+    ingest = data.get('ingest') # Optional ingest backend: "opencv" or "ffmpeg"
+    decoderOptions = data.get('decoderOptions') # Optional FFmpeg decoder options: {threads, scale, fps, lowLatency}
+    analysis = data.get('analysis') # Optional analysis resolution/frame rate applied in the decoder: {width, fps}
 
     if not all([code, behaviorCode, streamUrl]):
         return jsonify({
@@ -95,9 +110,66 @@ def start_detection_route_aligned():
             "msg": "pushStream is true but pushStreamUrl is missing"
         }), 400
 
+    if interval is not None:
+        try:
+            interval = int(interval)
+        except (TypeError, ValueError):
+            return jsonify({
+                "code": 400,
+                "msg": "interval must be an integer"
+            }), 400
+
+    if motionThreshold is not None:
+        try:
+            motionThreshold = float(motionThreshold)
+        except (TypeError, ValueError):
+            return jsonify({
+                "code": 400,
+                "msg": "motionThreshold must be a number"
+            }), 400
+
+    for name, value in (("sensitivity", sensitivity), ("overlapThresh", overlapThresh)):
+        if value is None:
+            continue
+        try:
+            valid = 0.0 < float(value) <= 1.0
+        except (TypeError, ValueError):
+            valid = False
+        if not valid:
+            return jsonify({
+                "code": 400,
+                "msg": f"{name} must be a number in (0, 1]"
+            }), 400
+    sensitivity = float(sensitivity) if sensitivity is not None else None
+    overlapThresh = float(overlapThresh) if overlapThresh is not None else None
+
+    try:
+        rois = parse_rois(roi)
+    except ValueError as e:
+        return jsonify({
+            "code": 400,
+            "msg": str(e)
+        }), 400
+
+    if ingest is not None and ingest not in INGEST_BACKENDS:
+        return jsonify({
+            "code": 400,
+            "msg": f"ingest must be one of {', '.join(INGEST_BACKENDS)}"
+        }), 400
+
+    try:
+        decoderOptions = parse_decoder_options(decoderOptions)
+        analysis = parse_analysis_options(analysis)
+    except ValueError as e:
+        return jsonify({
+            "code": 400,
+            "msg": str(e)
+        }), 400
+
     # Call the internal start_detection method with the parameters
     success, message = video_processor.start_detection(
-        code, behaviorCode, streamUrl, pushStream, pushStreamUrl
+        code, behaviorCode, streamUrl, pushStream, pushStreamUrl, interval, motionThreshold, rois,
+        sensitivity, overlapThresh, ingest, decoderOptions, analysis
     )
 
     # Analyzer expects {"code": 1000, "msg": "..."} on success
@@ -159,20 +231,98 @@ def stop_detection_route_aligned():
         }), error_code
 
 
+@app.route('/api/control/stats', methods=['POST'])
+def get_control_stats_route():
+    """
+    API endpoint to get the per-stage latency statistics (read, queue wait,
+    inference, behavior, annotation, push write; p50/p95/p99 in milliseconds)
+    of one control, or of all controls if no code is given.
+    """
+    data = request.get_json(silent=True) or {}
+    code = data.get('code')
+
+    stats = video_processor.get_stage_stats(code)
+    if stats is None:
+        return jsonify({
+            "code": 404,
+            "msg": "Control not found or inactive",
+            "data": {}
+        }), 404
+    return jsonify({
+        "code": 1000,
+        "msg": "success",
+        "data": stats
+    })
+
+
+@app.route('/api/control/snapshot', methods=['POST'])
+def get_control_snapshot_route():
+    """
+    API endpoint to get the latest annotated frame of a control as a JPEG image.
+    The annotations are drawn on request, so controls without push streaming
+    never pay for drawing frames nobody looks at.
+    """
+    data = request.json
+    code = data.get('code')
+
+    if not code:
+        return jsonify({
+            "code": 400,
+            "msg": "Missing code parameter"
+        }), 400
+
+    image = video_processor.get_snapshot(code)
+    if image is None:
+        return jsonify({
+            "code": 404,
+            "msg": "Control not found or no frame available yet"
+        }), 404
+    return Response(image, mimetype="image/jpeg")
+
+
+@app.route('/api/models', methods=['POST'])
+def get_models_route():
+    """
+    API endpoint to get model cache statistics (hits, misses, evictions)
+    and the models currently loaded.
+    """
+    return jsonify({
+        "code": 1000,
+        "msg": "success",
+        "data": video_processor.get_model_cache_stats()
+    })
+
+
 # Keeping the original health check route
 @app.route('/health', methods=['GET'])
 def health_check_route():
     """
     Health check endpoint to monitor the application status.
     Reports the number of actively running detection pipelines.
+    Returns HTTP 503 with status "starting" while startup model preloading
+    is still running, so orchestration can hold traffic until it is ready.
     """
     # Count controls where the manager thread is still alive and not explicitly stopping/errored
     active_count = sum(1 for control in video_processor.controls.values()
                        if control["manager_thread"].is_alive()
                        and not control["stop_event"].is_set()
                        and not control["error_event"].is_set())
+    model_cache_stats = video_processor.get_model_cache_stats()
+    ready = video_processor.is_ready
     # Since Django is removed, we don't report django_ready
-    return jsonify({"status": "ok", "active_detections": active_count})
+    return jsonify({
+        "status": "ok" if ready else "starting",
+        "ready": ready,
+        "preload": video_processor.preload_status,
+        "active_detections": active_count,
+        "model_cache": {
+            "hits": model_cache_stats["hits"],
+            "misses": model_cache_stats["misses"],
+            "evictions": model_cache_stats["evictions"],
+            "loaded_models": model_cache_stats["loadedModels"],
+            "memory_bytes": model_cache_stats["memoryBytes"]
+        }
+    }), 200 if ready else 503
 
 
 if __name__ == "__main__":
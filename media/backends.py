@@ -0,0 +1,168 @@
+# inference_service/backends.py (Standalone with SQLite)
+
+import os
+import shutil
+import hashlib
+import logging
+import threading
+import importlib.util
+
+from config import (
+    BEHAVIOR_MODEL_MAP, BEHAVIOR_CLASSES_MAP, BEHAVIOR_BACKEND_MAP,
+    DEFAULT_MODEL_PATH, DEFAULT_INFERENCE_BACKEND, INFERENCE_IMGSZ
+)
+
+logger = logging.getLogger(__name__)
+
+# 推理后端 -> ultralytics导出格式及所需的运行时依赖
+BACKEND_PYTORCH = "pytorch"
+BACKEND_ONNX = "onnx"
+BACKEND_OPENVINO = "openvino"
+# INT8-quantized ONNX model run by ONNX Runtime (see quantization.py)
+BACKEND_ONNX_INT8 = "onnx_int8"
+BACKEND_RUNTIME_MODULES = {
+    BACKEND_PYTORCH: None,
+    BACKEND_ONNX: "onnxruntime",
+    BACKEND_OPENVINO: "openvino",
+    BACKEND_ONNX_INT8: "onnxruntime",
+}
+
+# One lock per exported artifact so concurrent loads export it only once
+_export_locks = {}
+_export_locks_guard = threading.Lock()
+
+def get_backend_for_behavior(behavior_code):
+    """
+    Returns the inference backend configured for a behavior, falling back to
+    PyTorch if the backend is unknown or its runtime is not installed.
+
+    Args:
+        behavior_code (str): 行为代码
+
+    Returns:
+        str: One of "pytorch", "onnx", "openvino" or "onnx_int8".
+    """
+    backend = BEHAVIOR_BACKEND_MAP.get(behavior_code, DEFAULT_INFERENCE_BACKEND)
+    if backend not in BACKEND_RUNTIME_MODULES:
+        logger.warning(f"Unknown inference backend '{backend}' for behavior {behavior_code}, using {BACKEND_PYTORCH}.")
+        return BACKEND_PYTORCH
+    runtime_module = BACKEND_RUNTIME_MODULES[backend]
+    if runtime_module and importlib.util.find_spec(runtime_module) is None:
+        logger.warning(f"Inference backend '{backend}' for behavior {behavior_code} requires '{runtime_module}', which is not installed. Using {BACKEND_PYTORCH}.")
+        return BACKEND_PYTORCH
+    return backend
+
+def get_exported_model_path(model_path, backend, classes=None):
+    """
+    Returns where the exported artifact of a model is cached: next to the
+    weights, with a suffix derived from the class list for open-vocabulary models.
+
+    Args:
+        model_path (str): Path to the .pt weights.
+        backend (str): "onnx", "openvino" or "onnx_int8".
+        classes (list | None): Detection classes baked into the export.
+
+    Returns:
+        str: Path of the .onnx file (*_int8.onnx for INT8) or the *_openvino_model directory.
+    """
+    stem = os.path.splitext(model_path)[0]
+    if classes:
+        classes_hash = hashlib.md5(",".join(classes).encode("utf-8")).hexdigest()[:8]
+        stem = f"{stem}_{classes_hash}"
+    if backend == BACKEND_ONNX:
+        return f"{stem}.onnx"
+    if backend == BACKEND_ONNX_INT8:
+        return f"{stem}_int8.onnx"
+    # ultralytics recognizes OpenVINO IR directories by this suffix
+    return f"{stem}_openvino_model"
+
+def _is_export_current(exported_path, model_path):
+    """True if the exported artifact exists and is not older than the weights."""
+    if not os.path.exists(exported_path):
+        return False
+    if not os.path.exists(model_path):
+        return True
+    return os.path.getmtime(exported_path) >= os.path.getmtime(model_path)
+
+def _get_export_lock(exported_path):
+    with _export_locks_guard:
+        return _export_locks.setdefault(exported_path, threading.Lock())
+
+def ensure_exported_model(model_path, backend, classes=None):
+    """
+    Exports a model to the given backend format unless an up-to-date export is
+    already cached next to the weights.
+
+    Args:
+        model_path (str): Path to the .pt weights.
+        backend (str): "onnx", "openvino" or "onnx_int8".
+        classes (list | None): Detection classes to set before exporting.
+
+    Returns:
+        str: Path of the exported artifact.
+
+    Raises:
+        Exception: If the export fails.
+    """
+    # Imported here so that only processes that actually load models pay for ultralytics
+    from ultralytics import YOLO
+
+    if backend == BACKEND_ONNX_INT8:
+        # INT8 models are quantized from the cached FP32 ONNX export
+        fp32_path = ensure_exported_model(model_path, BACKEND_ONNX, classes)
+        int8_path = get_exported_model_path(model_path, backend, classes)
+        with _get_export_lock(int8_path):
+            if _is_export_current(int8_path, fp32_path):
+                return int8_path
+            from quantization import quantize_onnx_model
+            method = quantize_onnx_model(fp32_path, int8_path)
+            logger.info(f"INT8 model ({method} quantization) cached at {int8_path}")
+            return int8_path
+
+    exported_path = get_exported_model_path(model_path, backend, classes)
+    with _get_export_lock(exported_path):
+        if _is_export_current(exported_path, model_path):
+            return exported_path
+
+        logger.info(f"Exporting {model_path} to {backend} (classes={classes}): {exported_path}")
+        model = YOLO(model_path)
+        if classes:
+            # Open-vocabulary classes are baked into the exported graph
+            from text_embeddings import set_classes_cached
+            set_classes_cached(model, model_path, classes)
+        # dynamic=True keeps the batch dimension variable for batched inference
+        output_path = model.export(format=backend, imgsz=INFERENCE_IMGSZ, dynamic=True, verbose=False)
+
+        # ultralytics names the export after the weights file; move it to the class-specific cache path
+        if os.path.abspath(output_path) != os.path.abspath(exported_path):
+            if os.path.isdir(exported_path):
+                shutil.rmtree(exported_path)
+            elif os.path.exists(exported_path):
+                os.remove(exported_path)
+            shutil.move(output_path, exported_path)
+        logger.info(f"Exported model cached at {exported_path}")
+        return exported_path
+
+def resolve_model_source(behavior_code):
+    """
+    Returns what to load for a behavior: the weights path or the exported
+    artifact of its configured backend (exported on first use).
+
+    Args:
+        behavior_code (str): 行为代码
+
+    Returns:
+        tuple[str, str]: (path to load, backend actually used)
+    """
+    model_path = BEHAVIOR_MODEL_MAP.get(behavior_code, DEFAULT_MODEL_PATH)
+    backend = get_backend_for_behavior(behavior_code)
+    if backend == BACKEND_PYTORCH:
+        return model_path, backend
+
+    classes = BEHAVIOR_CLASSES_MAP.get(behavior_code)
+    try:
+        return ensure_exported_model(model_path, backend, classes), backend
+    except Exception as e:
+        logger.warning(f"Failed to export {model_path} to {backend} for behavior {behavior_code}: {e}")
+        logger.warning(f"Behavior {behavior_code} will use the {BACKEND_PYTORCH} backend")
+        return model_path, BACKEND_PYTORCH
@@ -2,6 +2,7 @@
 
 # Import necessary behavior classes
 from behaviors.base_behavior import BaseBehavior
+from behaviors.detections import Detections
 from behaviors.zhoujieruqin import ZhouJieRuQinBehavior
 from behaviors.renshutongji import RenShuTongJiBehavior
 from behaviors.insulator import InsulatorBehavior
@@ -3,6 +3,7 @@
 import abc
 import logging
 import numpy as np
+from behaviors.detections import Detections
 
 logger = logging.getLogger(__name__)
 
@@ -11,6 +12,25 @@ class BaseBehavior(abc.ABC):
     Base class for defining custom detection behaviors.
     All specific behaviors should inherit from this class.
     """
+    # Class ids the behavior needs (None = all classes of the model). Passed to the
+    # model call, so other classes are dropped inside NMS instead of after it.
+    detection_classes = None
+    # Whether evaluate() can trigger events that save an alarm clip. Clips (like the pushed
+    # stream) keep the source resolution, so only behaviors that never record a clip and are
+    # not pushed can have their frames downscaled in the decoder (BEHAVIOR_ANALYSIS_MAP).
+    records_clips = True
+
+    def __init_subclass__(cls, **kwargs):
+        """
+        Enforces the behavior contract when the subclass is defined rather than on its first frame.
+
+        Raises:
+            TypeError: If the subclass overrides neither evaluate() nor process_frame().
+        """
+        super().__init_subclass__(**kwargs)
+        if cls.evaluate is BaseBehavior.evaluate and cls.process_frame is BaseBehavior.process_frame:
+            raise TypeError(f"{cls.__name__} must implement evaluate() or process_frame()")
+
     def __init__(self, control_code):
         """
         Initializes the base behavior handler.
@@ -23,18 +43,63 @@ class BaseBehavior(abc.ABC):
         self.logger = logging.getLogger(f"[{self.control_code}] {self.__class__.__name__}")
         self.logger.info("Behavior handler initialized.")
 
-    @abc.abstractmethod
-    def process_frame(self, frame: np.ndarray, detections: list, control_state: dict) -> tuple[np.ndarray, bool]:
+    def evaluate(self, detections: Detections, control_state: dict) -> bool:
         """
-        Process a single frame based on the behavior logic.
-        This method should implement the core detection logic for the behavior.
+        Runs the behavior logic on the detections of one frame, without drawing.
+        Behaviors implement this (plus draw_overlay if they annotate frames) so
+        the pipeline only draws when a consumer needs the annotated frame;
+        behaviors that only override process_frame are drawn on every frame.
 
         Args:
-            frame (np.ndarray): The current frame (potentially already annotated with general detections).
-            detections (list): A list of raw detection results from the model
-                               (e.g., [x1, y1, x2, y2, confidence, class_id] for each detection).
+            detections (Detections): The raw detection results from the model as one array
+                               ([x1, y1, x2, y2, confidence, class_id] per row), with vectorized
+                               helpers (filter_classes, count, iou_with, area_in, centers_in_polygon).
+                               Iterating it still yields one list per detection.
+                               When tracking is enabled each detection also carries a stable
+                               track_id as its 7th element, and on frames that skipped inference
+                               the boxes are the tracker's predictions.
             control_state (dict): The mutable state dictionary for this control code.
                                    Behaviors can read and update their state here.
+                                   control_state["frame_time"] is when the frame was presented at
+                                   the source (PTS-based, time.monotonic() seconds); measure
+                                   durations with it rather than with time.time().
+
+        Returns:
+            bool: True if an event requiring action (like saving video or triggering alarm)
+                  was triggered by this frame, False otherwise.
+        """
+        return False
+
+    def draw_overlay(self, frame: np.ndarray, detections: Detections) -> np.ndarray:
+        """
+        Draws the behavior-specific annotations of a frame in place.
+        May run later than evaluate() (e.g. when an alarm clip is saved), so it
+        must only depend on the frame's detections, not on control_state.
+
+        Args:
+            frame (np.ndarray): A copy of the frame, already annotated with general detections.
+            detections (Detections): The detections the frame was evaluated with.
+
+        Returns:
+            np.ndarray: The annotated frame.
+        """
+        return frame
+
+    @property
+    def draws_lazily(self) -> bool:
+        """True if the behavior implements evaluate(), so its annotations can be deferred."""
+        return type(self).evaluate is not BaseBehavior.evaluate
+
+    def process_frame(self, frame: np.ndarray, detections: Detections, control_state: dict) -> tuple[np.ndarray, bool]:
+        """
+        Process a single frame based on the behavior logic and annotate it.
+        The default runs evaluate() and draws draw_overlay() on a copy of the frame;
+        older behaviors override this method directly.
+
+        Args:
+            frame (np.ndarray): The current frame (potentially already annotated with general detections).
+            detections (Detections): The detections of the frame (see evaluate()).
+            control_state (dict): The mutable state dictionary for this control code.
 
         Returns:
             tuple[np.ndarray, bool]:
@@ -42,7 +107,26 @@ class BaseBehavior(abc.ABC):
                 - bool: True if an event requiring action (like saving video or triggering alarm)
                         was triggered by this frame, False otherwise.
         """
-        pass
+        detections = self.as_detections(detections, control_state.get("class_names"))
+        event_triggered = self.evaluate(detections, control_state)
+        return self.draw_overlay(frame.copy(), detections), event_triggered
+
+    @staticmethod
+    def as_detections(detections, names=None) -> Detections:
+        """
+        Wraps detections passed in the old list form in a Detections container
+        (compatibility shim for callers that still pass lists).
+
+        Args:
+            detections (Detections | list): The detections of a frame.
+            names (dict | None): Class id -> class name of the model.
+
+        Returns:
+            Detections: The detections container.
+        """
+        if isinstance(detections, Detections):
+            return detections
+        return Detections(detections, names)
 
     def on_detection_start(self, control_state: dict):
         """
@@ -0,0 +1,185 @@
+# inference_service/behaviors/detections.py (Standalone with SQLite)
+
+import numpy as np
+
+class Detections:
+    """
+    Detections of one frame as a single (N, 6) or (N, 7) float32 array
+    ([x1, y1, x2, y2, confidence, class_id], plus track_id when tracking),
+    with vectorized helpers so behaviors do not loop over boxes in Python.
+    检测结果容器：用NumPy数组保存整帧检测框，提供按类别过滤、计数、与区域的面积/IoU计算
+
+    Iterating, indexing with an int, len() and tolist() behave like the old
+    list of [x1, y1, x2, y2, confidence, class_id] lists, so behaviors written
+    against the list form keep working.
+    """
+    def __init__(self, data=None, names=None):
+        """
+        Args:
+            data (np.ndarray | list | Detections | None): Raw detections, one row per box.
+            names (dict | list | None): Class id -> class name of the model (e.g. Results.names).
+        """
+        if isinstance(data, Detections):
+            names = data.names if names is None else names
+            data = data.data
+        if data is None or len(data) == 0:
+            array = np.zeros((0, 6), dtype=np.float32)
+        elif isinstance(data, np.ndarray):
+            array = data.astype(np.float32, copy=False)
+        else:
+            # The tracker appends a track_id; rows of a frame always have the same length
+            array = np.asarray([list(det) for det in data], dtype=np.float32)
+        self.data = array.reshape(-1, array.shape[-1] if array.ndim == 2 else 6)
+        if isinstance(names, (list, tuple)):
+            names = dict(enumerate(names))
+        self.names = names or {}
+        self._ids_by_name = None
+
+    # --- Columns ---
+
+    @property
+    def xyxy(self):
+        """(N, 4) boxes."""
+        return self.data[:, :4]
+
+    @property
+    def confidence(self):
+        """(N,) confidences."""
+        return self.data[:, 4]
+
+    @property
+    def class_id(self):
+        """(N,) integer class ids."""
+        return self.data[:, 5].astype(np.int64)
+
+    @property
+    def track_id(self):
+        """(N,) integer track ids, or None when the detections are not tracked."""
+        if self.data.shape[1] < 7:
+            return None
+        return self.data[:, 6].astype(np.int64)
+
+    @property
+    def centers(self):
+        """(N, 2) box centers."""
+        return (self.data[:, :2] + self.data[:, 2:4]) / 2.0
+
+    def areas(self):
+        """(N,) box areas in pixels."""
+        return (self.data[:, 2] - self.data[:, 0]).clip(min=0) * (self.data[:, 3] - self.data[:, 1]).clip(min=0)
+
+    # --- Class helpers ---
+
+    def resolve_class_ids(self, classes):
+        """
+        Maps classes given as ids or (case-insensitive) names to class ids.
+
+        Args:
+            classes (list): Class ids and/or class names.
+
+        Returns:
+            np.ndarray: The class ids (names unknown to the model are ignored).
+        """
+        if self._ids_by_name is None:
+            self._ids_by_name = {str(name).lower(): int(class_id) for class_id, name in self.names.items()}
+        ids = []
+        for cls in classes:
+            if isinstance(cls, str):
+                if cls.lower() in self._ids_by_name:
+                    ids.append(self._ids_by_name[cls.lower()])
+            else:
+                ids.append(int(cls))
+        return np.asarray(ids, dtype=np.int64)
+
+    def class_mask(self, classes):
+        """(N,) boolean mask of the detections whose class is in classes (ids and/or names)."""
+        return np.isin(self.class_id, self.resolve_class_ids(classes))
+
+    def filter(self, mask):
+        """Returns the detections selected by a boolean mask or index array."""
+        return Detections(self.data[mask], self.names)
+
+    def filter_classes(self, classes):
+        """Returns the detections whose class is in classes (ids and/or names)."""
+        return self.filter(self.class_mask(classes))
+
+    def count(self, classes=None):
+        """Number of detections, optionally only of the given classes."""
+        if classes is None:
+            return len(self)
+        return int(np.count_nonzero(self.class_mask(classes)))
+
+    # --- Zone helpers ---
+
+    def iou_with(self, zone):
+        """
+        IoU of every box with a rectangular zone.
+
+        Args:
+            zone (list | tuple): [x1, y1, x2, y2] in pixels.
+
+        Returns:
+            np.ndarray: (N,) IoU values.
+        """
+        x1, y1, x2, y2 = (float(v) for v in zone)
+        intersection = self._intersection_with(x1, y1, x2, y2)
+        zone_area = max(x2 - x1, 0.0) * max(y2 - y1, 0.0)
+        return intersection / np.maximum(self.areas() + zone_area - intersection, 1e-6)
+
+    def area_in(self, zone):
+        """
+        Fraction of every box's area that lies inside a rectangular zone.
+
+        Args:
+            zone (list | tuple): [x1, y1, x2, y2] in pixels.
+
+        Returns:
+            np.ndarray: (N,) fractions in 0-1.
+        """
+        x1, y1, x2, y2 = (float(v) for v in zone)
+        return self._intersection_with(x1, y1, x2, y2) / np.maximum(self.areas(), 1e-6)
+
+    def centers_in_polygon(self, polygon):
+        """
+        (N,) boolean mask of the boxes whose center lies inside a polygon
+        (even-odd rule, all boxes tested at once).
+
+        Args:
+            polygon (np.ndarray | list): (M, 2) polygon vertices in pixels.
+        """
+        polygon = np.asarray(polygon, dtype=np.float32).reshape(-1, 2)
+        centers = self.centers
+        if len(centers) == 0 or len(polygon) < 3:
+            return np.zeros(len(centers), dtype=bool)
+        px, py = centers[:, 0:1], centers[:, 1:2]
+        ax, ay = polygon[:, 0], polygon[:, 1]
+        bx, by = np.roll(ax, -1), np.roll(ay, -1)
+        crosses = (ay > py) != (by > py)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_at_py = ax + (py - ay) * (bx - ax) / (by - ay)
+        return np.count_nonzero(crosses & (px < x_at_py), axis=1) % 2 == 1
+
+    def _intersection_with(self, x1, y1, x2, y2):
+        inter_w = (np.minimum(self.data[:, 2], x2) - np.maximum(self.data[:, 0], x1)).clip(min=0)
+        inter_h = (np.minimum(self.data[:, 3], y2) - np.maximum(self.data[:, 1], y1)).clip(min=0)
+        return inter_w * inter_h
+
+    # --- List compatibility ---
+
+    def __len__(self):
+        return len(self.data)
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return self.data[index].tolist()
+        return self.filter(index)
+
+    def tolist(self):
+        """The detections as a list of [x1, y1, x2, y2, confidence, class_id(, track_id)] lists."""
+        return self.data.tolist()
+
+    def __repr__(self):
+        return f"Detections(count={len(self)})"
@@ -3,12 +3,16 @@
 import cv2
 import numpy as np
 from .base_behavior import BaseBehavior
+from .detections import Detections
 
 class InsulatorBehavior(BaseBehavior):
     """
     Behavior to detect insulators using a specialized trained model.
     专门检测绝缘子的行为处理器，使用单独训练的绝缘子检测权重
     """
+    # Only annotates frames, never triggers a clip save
+    records_clips = False
+
     def __init__(self, control_code):
         """
         Initializes the Insulator behavior handler.
@@ -19,24 +23,33 @@ class InsulatorBehavior(BaseBehavior):
         # 专门训练的模型不需要类别配置，所有检测结果都是绝缘子
         self.logger.info("Insulator behavior initialized with specialized insulator detection model")
 
-    def process_frame(self, frame: np.ndarray, detections: list, control_state: dict) -> tuple[np.ndarray, bool]:
+    def evaluate(self, detections: Detections, control_state: dict) -> bool:
         """
-        Processes the frame to detect insulators and draw bounding boxes.
-        处理帧以检测绝缘子并绘制边界框
-        
+        这个behavior只做检测显示，不触发特定事件如视频保存
+
         Args:
-            frame (np.ndarray): The current frame (already has general detections drawn).
-            detections (list): Raw detection results from specialized insulator model.
+            detections (Detections): Raw detection results from specialized insulator model.
             control_state (dict): The mutable state dictionary for this control code.
 
         Returns:
-            tuple[np.ndarray, bool]:
-                - np.ndarray: The frame with insulator detections drawn.
-                - bool: Always False, as this behavior only does detection visualization.
+            bool: Always False, as this behavior only does detection visualization.
         """
-        # 在帧的副本上绘制检测结果，避免修改缓冲区帧
-        annotated_frame = frame.copy()
-        
+        return False
+
+    def draw_overlay(self, frame: np.ndarray, detections: Detections) -> np.ndarray:
+        """
+        Draws the insulator count and model information.
+        绘制绝缘子数量和模型信息
+
+        Args:
+            frame (np.ndarray): A copy of the frame, already annotated with general detections.
+            detections (Detections): Raw detection results from specialized insulator model.
+
+        Returns:
+            np.ndarray: The frame with the insulator overlay drawn.
+        """
+        annotated_frame = frame
+
         insulator_count = len(detections)  # 所有检测结果都是绝缘子
         
 
@@ -71,10 +84,7 @@ class InsulatorBehavior(BaseBehavior):
             cv2.putText(annotated_frame, status_text, status_position, 
                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 1)  # 黄色文字
 
-        # 这个behavior只做检测显示，不触发特定事件如视频保存
-        event_triggered = False
-
-        return annotated_frame, event_triggered
+        return annotated_frame
 
     # This behavior does not trigger alarms, so get_alarm_data is not needed
     # or can return None as per the BaseBehavior default.
\ No newline at end of file
@@ -3,6 +3,7 @@
 import cv2
 import numpy as np
 from .base_behavior import BaseBehavior
+from .detections import Detections
 from config import BEHAVIOR_CLASSES_MAP
 
 class RenShuTongJiBehavior(BaseBehavior):
@@ -10,6 +11,9 @@ class RenShuTongJiBehavior(BaseBehavior):
     Behavior to count the number of people detected in a frame and display the count.
     支持开放词汇模型，可以检测特定类别
     """
+    # Only annotates frames, never triggers a clip save
+    records_clips = False
+
     def __init__(self, control_code):
         """
         Initializes the RENSHUTONGJI behavior handler.
@@ -22,51 +26,51 @@ class RenShuTongJiBehavior(BaseBehavior):
         self.target_classes = BEHAVIOR_CLASSES_MAP.get("RENSHUTONGJI", ["person"])
         self.logger.info(f"RENSHUTONGJI behavior initialized with target classes: {self.target_classes}")
 
-    def process_frame(self, frame: np.ndarray, detections: list, control_state: dict) -> tuple[np.ndarray, bool]:
+    def count_targets(self, detections: Detections) -> int:
         """
-        Counts people and draws the count on the frame.
+        Counts the detections of the target classes.
         支持多种检测类别的计数
 
         Args:
-            frame (np.ndarray): The current frame (already has general detections drawn).
-            detections (list): Raw detection results.
+            detections (Detections): Raw detection results.
+
+        Returns:
+            int: Number of detected targets.
+        """
+        # 开放词汇模型的类别由target_classes设置，按类别名称（不区分大小写）计数；
+        # 模型的类别名称中没有目标类别时，按传统模型处理，假设0是person类
+        target_ids = detections.resolve_class_ids(self.target_classes)
+        if len(target_ids) > 0:
+            return detections.count(target_ids)
+        return detections.count([0])
+
+    def evaluate(self, detections: Detections, control_state: dict) -> bool:
+        """
+        Counting people does not trigger specific events like video save.
+
+        Args:
+            detections (Detections): Raw detection results.
             control_state (dict): The mutable state dictionary for this control code.
 
         Returns:
-            tuple[np.ndarray, bool]:
-                - np.ndarray: The frame with the people count drawn.
-                - bool: Always False, as this behavior doesn't trigger specific events like video save.
+            bool: Always False.
         """
-        # 对于开放词汇模型，检测结果可能包含类别名称而不是数字ID
-        # 需要根据实际模型输出格式调整检测逻辑
-        
-        person_count = 0
-        
-        # 遍历所有检测结果
-        for det in detections:
-            try:
-                # 检查检测结果的格式
-                if len(det) >= 6:
-                    # 标准格式: [x1, y1, x2, y2, confidence, class_id/class_name]
-                    class_info = det[5]
-                    
-                    # 判断类别信息是字符串还是数字
-                    if isinstance(class_info, str):
-                        # 开放词汇模型返回类别名称
-                        if class_info.lower() in [cls.lower() for cls in self.target_classes]:
-                            person_count += 1
-                    else:
-                        # 传统模型返回类别ID，假设0是person类
-                        if int(class_info) == 0:  # 假设person的class_id是0
-                            person_count += 1
-                            
-            except (IndexError, ValueError, TypeError) as e:
-                self.logger.debug(f"Error processing detection: {det}, error: {e}")
-                continue
-
-        # Draw the count on a copy of the frame to avoid modifying the buffer frame directly
-        annotated_frame = frame.copy()
-        
+        return False
+
+    def draw_overlay(self, frame: np.ndarray, detections: Detections) -> np.ndarray:
+        """
+        Draws the people count on the frame.
+
+        Args:
+            frame (np.ndarray): A copy of the frame, already annotated with general detections.
+            detections (Detections): Raw detection results.
+
+        Returns:
+            np.ndarray: The frame with the people count drawn.
+        """
+        person_count = self.count_targets(detections)
+        annotated_frame = frame
+
         # Define text properties
         font = cv2.FONT_HERSHEY_SIMPLEX
         font_scale = 1
@@ -91,10 +95,7 @@ class RenShuTongJiBehavior(BaseBehavior):
         cv2.putText(annotated_frame, class_info_text, class_info_position, 
                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 0), 1)
 
-        # This behavior does not trigger specific events
-        event_triggered = False
-
-        return annotated_frame, event_triggered
+        return annotated_frame
 
     # This behavior does not trigger alarms, so get_alarm_data is not needed
     # or can return None as per the BaseBehavior default.
\ No newline at end of file
@@ -4,6 +4,7 @@ import time
 import cv2
 import numpy as np
 from behaviors.base_behavior import BaseBehavior
+from behaviors.detections import Detections
 from config import VIDEO_SAVE_DURATION_SECONDS
 
 class ZhouJieRuQinBehavior(BaseBehavior):
@@ -11,6 +12,9 @@ class ZhouJieRuQinBehavior(BaseBehavior):
     Behavior to detect continuous presence of a person for a defined duration
     and trigger a video save and Alarm creation.
     """
+    # Only 'person' (class 0 of the COCO model) is used
+    detection_classes = [0]
+
     def __init__(self, control_code):
         """
         Initializes the ZHOUJIERUQIN behavior handler.
@@ -31,27 +35,23 @@ class ZhouJieRuQinBehavior(BaseBehavior):
         # is_saving_video and save_video_thread_active flags are managed by VideoProcessor,
         # but the behavior sets the condition that triggers the save.
 
-    def process_frame(self, frame: np.ndarray, detections: list, control_state: dict) -> tuple[np.ndarray, bool]:
+    def evaluate(self, detections: Detections, control_state: dict) -> bool:
         """
         Checks for continuous person detection and triggers video save event.
+        This behavior adds no annotations of its own (draw_overlay is the default).
 
         Args:
-            frame (np.ndarray): The current frame (already has general detections drawn).
-            detections (list): Raw detection results.
+            detections (Detections): Raw detection results.
             control_state (dict): The mutable state dictionary for this control code.
 
         Returns:
-            tuple[np.ndarray, bool]:
-                - np.ndarray: The frame (no additional annotations for this behavior).
-                - bool: True if the video save condition is met, False otherwise.
+            bool: True if the video save condition is met, False otherwise.
         """
-        current_time = time.time()
-        person_detected_in_frame = False
+        # PTS-based presentation time of the frame, so decode stalls and bursts do not stretch the duration
+        current_time = control_state.get("frame_time") or time.monotonic()
+        detections = self.as_detections(detections)
         # Assuming class 0 in detections is 'person' in the YOLO model
-        person_detections = [det for det in detections if int(det[5]) == 0]
-
-        if person_detections:
-            person_detected_in_frame = True
+        person_detected_in_frame = detections.count([0]) > 0
 
         # Get state from control_state
         person_detected_since = control_state.get("person_detected_since")
@@ -63,7 +63,7 @@ class ZhouJieRuQinBehavior(BaseBehavior):
             if person_detected_since is None:
                 # First time person detected in a continuous sequence
                 control_state["person_detected_since"] = current_time
-                self.logger.info(f"Person first detected at {current_time:.2f}.")
+                self.logger.info("Person first detected.")
             else:
                 # Person detected continuously, check duration
                 duration = current_time - person_detected_since
@@ -85,8 +85,7 @@ class ZhouJieRuQinBehavior(BaseBehavior):
                 # If a save was in progress and person disappears, the save will still complete
                 # for the buffered frames.
 
-        # No additional annotations are added by this behavior to the frame itself.
-        return frame, event_triggered
+        return event_triggered
 
     def get_alarm_data(self, control_state: dict) -> dict | None:
         """
@@ -31,6 +31,19 @@ BEHAVIOR_CLASSES_MAP = {
 # 默认模型路径（当behavior没有指定模型时使用）
 DEFAULT_MODEL_PATH = "yolov8n.pt"
 
+# 推理后端配置 - 每个behavior可选择 "pytorch"、"onnx"（ONNX Runtime）、"openvino"（OpenVINO IR）
+# 或 "onnx_int8"（INT8量化的ONNX模型，适合边缘CPU节点）
+# 非PyTorch后端的模型在首次加载时自动导出，并缓存在权重文件旁边
+BEHAVIOR_BACKEND_MAP = {
+    # "ZHOUJIERUQIN": "onnx",
+    # "INSULATOR": "openvino",
+    # "RENSHUTONGJI": "onnx_int8",
+}
+# 默认推理后端（当behavior没有指定后端时使用）
+DEFAULT_INFERENCE_BACKEND = "pytorch"
+# Model input size used when exporting ONNX / OpenVINO models
+INFERENCE_IMGSZ = 640
+
 # 原有的MODEL_PATH保持向后兼容
 MODEL_PATH = DEFAULT_MODEL_PATH
 # MODEL_PATH = "yolov8n.pt"
@@ -68,6 +81,10 @@ VIDEO_SAVE_SUB_DIR = "alarm_videos"
 # Full absolute path where alarm videos will be saved
 VIDEO_SAVE_FULL_PATH = os.path.join(VIDEO_SAVE_BASE_DIR, VIDEO_SAVE_SUB_DIR)
 
+# Directory for cached YOLO-World class text embeddings, keyed by (weights hash, class list).
+# Filled on first load or ahead of time with: python text_embeddings.py
+TEXT_EMBEDDING_CACHE_DIR = os.path.join(BASE_DIR, "embedding_cache")
+
 # Duration of video to save after detection (in seconds)
 VIDEO_SAVE_DURATION_SECONDS = 3
 
@@ -75,14 +92,71 @@ VIDEO_SAVE_DURATION_SECONDS = 3
 FFMPEG_TIMEOUT_SECONDS = 60
 
 # Queue sizes for inter-thread communication
-FRAME_QUEUE_MAXSIZE = 60  # Increased size for raw frames (puller -> detector)
+# Puller -> detector hand-off: "queue" (FIFO of up to FRAME_QUEUE_MAXSIZE frames, every frame is
+# analyzed while the detector keeps up) or, opt-in, "mailbox" (single slot: the detector always gets
+# the newest frame and older unprocessed frames are dropped, for the lowest latency under load)
+FRAME_QUEUE_MODE = "queue"
+FRAME_QUEUE_MAXSIZE = 60  # Increased size for raw frames (puller -> detector), "queue" mode only
+# Frames older than this (time since they were read from the stream) are discarded before inference,
+# e.g. 1.0 together with the mailbox. None processes every frame regardless of age.
+FRAME_MAX_AGE_SECONDS = None
 ANNOTATED_FRAME_QUEUE_MAXSIZE = 60 # Increased size for annotated frames (detector -> pusher)
 
 # Thread join timeout (in seconds) during stopping
 THREAD_JOIN_TIMEOUT_SECONDS = 10
 
-# Stream reconnect retry delay (in seconds)
-STREAM_RECONNECT_DELAY_SECONDS = 5
+# Stream reconnects: after a read failure on a healthy connection the stream is reopened at once;
+# further consecutive failures back off exponentially from STREAM_RECONNECT_BASE_DELAY_SECONDS up to
+# STREAM_RECONNECT_MAX_DELAY_SECONDS. Each delay is shortened by a random fraction of up to
+# STREAM_RECONNECT_JITTER, so controls on a flapping server do not retry in lockstep.
+STREAM_RECONNECT_BASE_DELAY_SECONDS = 0.5
+STREAM_RECONNECT_MAX_DELAY_SECONDS = 30.0
+STREAM_RECONNECT_JITTER = 0.5
+# A connection counts as healthy (its failure count is reset) once it has delivered frames this long
+STREAM_CONNECTION_STABLE_SECONDS = 10.0
+# Circuit breaker: after this many consecutive failures the source stops retrying for the cooldown,
+# then makes a single probe attempt (half-open) that either closes the circuit or reopens it
+STREAM_CIRCUIT_BREAKER_FAILURES = 8
+STREAM_CIRCUIT_BREAKER_COOLDOWN_SECONDS = 60.0
+
+# Stream ingest backend: "opencv" (cv2.VideoCapture) or "ffmpeg" (FFmpeg subprocess writing raw
+# BGR frames to a pipe, read into preallocated buffers). A control can override it via "ingest",
+# and pass FFmpeg decoder options via "decoderOptions" (threads, scale, fps, lowLatency, keyframesOnly).
+DEFAULT_INGEST_BACKEND = "opencv"
+# Decoder threads of the FFmpeg backend (0 lets FFmpeg decide)
+FFMPEG_INGEST_THREADS = 2
+# Disable FFmpeg input buffering / long probing (lower latency on live streams)
+FFMPEG_INGEST_LOW_LATENCY = True
+# Frame buffers one FFmpeg-ingested stream is expected to need for queued and in-flight frames; the
+# alarm clip buffer length of each subscriber is added to it. The pool grows past that on demand, with
+# a warning each time its size doubles, up to FFMPEG_INGEST_BUFFER_LIMIT; beyond that frames are dropped
+FFMPEG_INGEST_MAX_BUFFERS = 32
+FFMPEG_INGEST_BUFFER_LIMIT = 512
+FFMPEG_PROBE_TIMEOUT_SECONDS = 10
+# Read each frame's source PTS from FFmpeg's showinfo filter (stderr); the raw pipe itself carries none.
+# Uses showinfo's "checksum=0" where the FFmpeg build supports it (probed once), plain showinfo otherwise.
+# A frame whose showinfo line is late goes without PTS (receive time) instead of stalling the reader.
+FFMPEG_INGEST_PTS = True
+# Keyframe-only decoding (decoderOptions.keyframesOnly, or "keyframes_only" in BEHAVIOR_ANALYSIS_MAP):
+# the FFmpeg decoder skips every non-key frame (-skip_frame nokey), so only I-frames are analyzed.
+# Always uses the FFmpeg backend. The rate then depends on the camera's GOP, so this is the rate
+# assumed for buffer and sampler sizing; the measured rate is reported as analysisRate.
+KEYFRAME_ONLY_ASSUMED_FPS = 1.0
+
+# Analysis resolution and frame rate per behavior, applied in the decoder: frames wider than
+# "width" are downscaled (FFmpeg scale filter / resize right after decoding), frames above
+# "fps" are dropped before they are decoded (FFmpeg fps filter / grab() without retrieve()),
+# and "keyframes_only" skips decoding everything but I-frames (see KEYFRAME_ONLY_ASSUMED_FPS).
+# The model letterboxes to INFERENCE_IMGSZ anyway, so decoding wider frames is wasted work.
+# The width is ignored (frames keep the source resolution) while the control pushes its stream
+# or its behavior can record alarm clips. A control can override both via "analysis".
+BEHAVIOR_ANALYSIS_MAP = {
+    "RENSHUTONGJI": {"width": INFERENCE_IMGSZ, "fps": None},
+    "ZHOUJIERUQIN": {"width": INFERENCE_IMGSZ, "fps": 10},
+    # Inspection of static infrastructure: about one analysis per GOP would be enough, but keyframe-only
+    # decoding changes the analysis rate and needs FFmpeg, so controls opt in via decoderOptions.keyframesOnly
+    "INSULATOR": {"width": None, "fps": None, "keyframes_only": False},
+}
 
 # Detector thread queue get timeout (in seconds)
 DETECTOR_QUEUE_GET_TIMEOUT = 0.01
@@ -96,6 +170,138 @@ MANAGER_CHECK_INTERVAL_SECONDS = 0.5
 # Detector FPS update interval (in seconds)
 DETECTOR_FPS_UPDATE_INTERVAL = 1.0
 
+# Cross-stream batched inference (one scheduler per loaded model)
+# Maximum number of frames (from all controls sharing a model) run in one model call
+INFERENCE_BATCH_MAX_SIZE = 8
+# How long the scheduler waits for more frames after the first one arrives (in seconds); only
+# applied while frames are submitted more often than this, otherwise a frame is dispatched at once
+INFERENCE_BATCH_MAX_WAIT_SECONDS = 0.01
+# How long a detector waits for its batched result before giving up (in seconds)
+INFERENCE_RESULT_TIMEOUT_SECONDS = 10
+# Scheduler thread queue get timeout (in seconds)
+SCHEDULER_QUEUE_GET_TIMEOUT = 0.1
+
+# Model replica pool (one pool per model_path + classes key)
+# Fixed number of replicas per model; None sizes the pool from the available CPU cores
+MODEL_POOL_SIZE = None
+# CPU cores assumed to be used by one replica when sizing the pool automatically.
+# With more than one replica, torch intra-op threads are limited to cpu_count // replicas.
+MODEL_POOL_CORES_PER_REPLICA = 4
+# Upper bound on automatically sized pools
+MODEL_POOL_MAX_REPLICAS = 4
+# How long an inference waits for a free replica (in seconds)
+MODEL_POOL_CHECKOUT_TIMEOUT_SECONDS = 10
+
+# Model cache RAM budget (in bytes) for all loaded models, estimated from weights size per replica.
+# Models with no active controls are evicted least-recently-used first when over budget.
+# Set to None to keep every loaded model resident.
+MODEL_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Startup preloading: load and warm up (one dummy inference at INFERENCE_IMGSZ) every model in
+# BEHAVIOR_MODEL_MAP in parallel when the service starts. /health reports not ready (HTTP 503)
+# until this finishes. Preloaded models stay pinned in the model cache.
+MODEL_PRELOAD_ENABLED = False
+# Number of models loaded in parallel
+MODEL_PRELOAD_WORKERS = 4
+
+# Activity-adaptive detection rate
+# When enabled, the model runs at the full input FPS while there are detections and drops to
+# input FPS / interval (Behavior.interval) after ADAPTIVE_IDLE_AFTER_SECONDS without detections
+ADAPTIVE_SAMPLING_ENABLED = True
+ADAPTIVE_IDLE_AFTER_SECONDS = 5.0
+# Detection interval used when the control does not provide one (matches the Behavior.interval default)
+DEFAULT_DETECTION_INTERVAL = 10
+
+# Motion-gated inference: behaviors listed here skip the model on frames whose motion score
+# (fraction of changed pixels on a downscaled grayscale copy) is below the threshold,
+# reusing the last detections. A control can override the threshold via motionThreshold.
+BEHAVIOR_MOTION_GATE_MAP = {
+    "ZHOUJIERUQIN": 0.002,
+}
+# "diff" (frame differencing against the last inferred frame) or "mog2" (background subtraction)
+MOTION_GATE_METHOD = "diff"
+MOTION_GATE_DOWNSCALE_WIDTH = 160
+# Gray-level difference counted as a changed pixel ("diff" method)
+MOTION_GATE_PIXEL_THRESHOLD = 25
+# Longest time a static scene may skip inference (in seconds)
+MOTION_GATE_MAX_SKIP_SECONDS = 2.0
+
+# Near-duplicate frame cache: a frame whose grayscale thumbnail differs from the last inferred
+# frame's by at most DUPLICATE_FRAME_MAX_PIXEL_DIFF gray levels in every pixel (frozen streams,
+# parked PTZ cameras) reuses the cached detections instead of calling the model.
+# Opt-in: a small distant object can move without changing the thumbnail past the threshold.
+DUPLICATE_FRAME_CACHE_ENABLED = False
+DUPLICATE_FRAME_THUMBNAIL_WIDTH = 64
+DUPLICATE_FRAME_MAX_PIXEL_DIFF = 6
+# Cached detections are refreshed at least this often (in seconds)
+DUPLICATE_FRAME_MAX_AGE_SECONDS = 30.0
+
+# Regions of interest: when a control defines ROIs, only the crops around them are run
+# through the model. Padding (in pixels) keeps objects on the ROI edge from being cut off.
+ROI_CROP_PADDING = 16
+# IoU above which same-class detections from overlapping ROI crops are merged
+ROI_MERGE_IOU_THRESHOLD = 0.5
+
+# Tiled (sliced) inference for small objects: behaviors listed here split each frame (or ROI crop)
+# into overlapping tiles of tile_size pixels, and all tiles of a frame are run in one batched call
+BEHAVIOR_TILING_MAP = {
+    "INSULATOR": {"tile_size": 640, "overlap": 0.2},
+}
+# Also run the (downscaled) whole frame so objects larger than a tile are still detected
+TILED_INFERENCE_INCLUDE_FULL_FRAME = True
+# Cross-tile merge: "ios" (intersection over smaller box) also removes boxes cut by tile edges
+TILE_MERGE_METRIC = "ios"
+TILE_MERGE_IOU_THRESHOLD = 0.6
+
+# Multi-object tracking (ByteTrack-style IoU + Kalman) between inference and the behavior logic.
+# Detections get a persistent track_id (7th element), and boxes are predicted on frames where
+# inference is skipped (adaptive sampling, motion gate, or TRACKER_DETECT_EVERY_N_FRAMES).
+# Off by default: tracking changes which low-confidence detections reach the behaviors.
+TRACKER_ENABLED = False
+# Run the model on every Nth frame only while tracking; the frames in between use predicted boxes
+TRACKER_DETECT_EVERY_N_FRAMES = 1
+# Detections at or above this confidence start tracks and are matched first (the ultralytics default conf);
+# a control's own conf (sensitivity) replaces it
+TRACKER_HIGH_THRESHOLD = 0.25
+# Lower-confidence detections (down to this value) can only continue existing tracks. While tracking,
+# the model is called with this conf (or the control's, if lower) so it returns those detections
+TRACKER_LOW_THRESHOLD = 0.1
+TRACKER_MATCH_IOU_THRESHOLD = 0.3
+# How many inferred frames a lost track is kept for re-association
+TRACKER_MAX_LOST_FRAMES = 30
+
+# INT8 quantization ("onnx_int8" backend in BEHAVIOR_BACKEND_MAP): the FP32 ONNX export is
+# statically quantized, calibrated on frames of this local clip (dynamic quantization if missing).
+# Compare against FP32 with: python quantization.py report --behavior <code>
+INT8_CALIBRATION_VIDEO = os.path.join(os.path.dirname(BASE_DIR), "data", "test.mp4")
+INT8_CALIBRATION_FRAMES = 100
+
+# Process-pool detector mode (opt-in): run detection in worker processes instead of
+# detector threads, passing frames through shared memory rings to avoid the GIL
+DETECTOR_PROCESS_POOL_ENABLED = False
+# Number of detector worker processes (None uses half of the CPU cores)
+DETECTOR_PROCESS_POOL_WORKERS = None
+# Torch intra-op threads per worker process (None keeps the torch default)
+DETECTOR_PROCESS_THREADS_PER_WORKER = 1
+# Shared memory slots per control ring
+DETECTOR_SHM_RING_SLOTS = 2
+
+# Per-stage latency statistics (read, queue wait, inference, behavior, annotation, push write):
+# p50/p95/p99 over the last STAGE_STATS_WINDOW samples of each stage, reported per control
+# in /api/control and /api/control/stats
+STAGE_STATS_WINDOW = 1000
+
+# Frame timestamps: frames carry their source PTS and a monotonic receive time. Timing logic
+# (sampling, motion gate, behavior durations) uses the PTS mapped onto the monotonic clock, so
+# decode stalls and network bursts do not distort it. A PTS jump larger than this (in seconds)
+# starts a new mapping (stream restart, timestamp wrap).
+FRAME_PTS_MAX_DRIFT_SECONDS = 5.0
+# Per-control arrival statistics (status "arrival"): an inter-arrival time above
+# ARRIVAL_GAP_FACTOR x the expected frame interval counts as a gap, one below
+# ARRIVAL_BURST_FACTOR x the interval as a burst
+ARRIVAL_GAP_FACTOR = 2.5
+ARRIVAL_BURST_FACTOR = 0.25
+
 # --- End Application Configuration ---
 
 # Ensure necessary directories exist when this module is imported
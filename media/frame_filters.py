@@ -0,0 +1,226 @@
+# inference_service/frame_filters.py (Standalone with SQLite)
+
+import logging
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class AdaptiveSampler:
+    """
+    Activity-adaptive detection rate for one control.
+    Runs the model on every frame while the scene is active, and drops to a
+    low inference rate once no detections have been seen for a while.
+    The first detection switches straight back to the full rate.
+    根据画面活跃程度自适应调整检测频率
+    """
+    MODE_ACTIVE = "active"
+    MODE_IDLE = "idle"
+
+    def __init__(self, max_fps, min_fps, idle_after_seconds):
+        """
+        Args:
+            max_fps (float): Inference rate while the scene is active (usually the input FPS).
+            min_fps (float): Inference rate while the scene is idle.
+            idle_after_seconds (float): How long without detections before switching to idle.
+        """
+        self.max_fps = max(0.1, float(max_fps))
+        self.min_fps = min(self.max_fps, max(0.1, float(min_fps)))
+        self.idle_after_seconds = float(idle_after_seconds)
+        self.mode = self.MODE_ACTIVE
+        self.last_inference_time = None
+        self.last_detection_time = None
+        self.inferred_frames = 0
+        self.skipped_frames = 0
+
+    def should_infer(self, frame_timestamp):
+        """
+        Decides whether the model should run on a frame.
+
+        Args:
+            frame_timestamp (float): Timestamp of the frame in seconds.
+
+        Returns:
+            bool: True if the frame should be run through the model.
+        """
+        if self.last_inference_time is None:
+            return True
+        target_fps = self.max_fps if self.mode == self.MODE_ACTIVE else self.min_fps
+        # Small tolerance so frame timing jitter does not halve the effective rate
+        if frame_timestamp - self.last_inference_time >= 0.9 / target_fps:
+            return True
+        self.skipped_frames += 1
+        return False
+
+    def update(self, frame_timestamp, has_detections):
+        """
+        Records the outcome of an inference and switches mode if needed.
+
+        Args:
+            frame_timestamp (float): Timestamp of the inferred frame in seconds.
+            has_detections (bool): Whether the inference found anything.
+        """
+        self.inferred_frames += 1
+        self.last_inference_time = frame_timestamp
+        if self.last_detection_time is None:
+            # Treat start-up as activity so a new control begins at the full rate
+            self.last_detection_time = frame_timestamp
+
+        if has_detections:
+            self.last_detection_time = frame_timestamp
+            if self.mode != self.MODE_ACTIVE:
+                logger.debug("Detections found, switching to full inference rate.")
+            self.mode = self.MODE_ACTIVE
+        elif self.mode == self.MODE_ACTIVE and frame_timestamp - self.last_detection_time >= self.idle_after_seconds:
+            logger.debug("No detections for a while, switching to idle inference rate.")
+            self.mode = self.MODE_IDLE
+
+class MotionGate:
+    """
+    Cheap pre-inference motion gate for one control.
+    Scores motion on a downscaled grayscale copy of the frame, using either
+    frame differencing against the last inferred frame or MOG2 background
+    subtraction. Frames scoring below the threshold skip the model and reuse
+    the last detections. A frame is still inferred at least every
+    max_skip_seconds so slowly appearing objects are never missed for long.
+    运动门控：画面静止时跳过模型推理，复用上一次的检测结果
+    """
+    METHOD_DIFF = "diff"
+    METHOD_MOG2 = "mog2"
+
+    def __init__(self, threshold, method=METHOD_DIFF, downscale_width=160, pixel_threshold=25, max_skip_seconds=2.0):
+        """
+        Args:
+            threshold (float): Minimum fraction of changed pixels (0-1) for a frame to be inferred.
+            method (str): "diff" (frame differencing) or "mog2" (background subtraction).
+            downscale_width (int): Width of the grayscale copy used for scoring.
+            pixel_threshold (int): Gray-level difference counted as a changed pixel ("diff" only).
+            max_skip_seconds (float): Longest time frames may be skipped in a row.
+        """
+        self.threshold = float(threshold)
+        self.method = method
+        self.downscale_width = int(downscale_width)
+        self.pixel_threshold = int(pixel_threshold)
+        self.max_skip_seconds = float(max_skip_seconds)
+        self._subtractor = cv2.createBackgroundSubtractorMOG2(detectShadows=False) if method == self.METHOD_MOG2 else None
+        self._reference = None
+        self._current = None
+        self._last_inference_time = None
+        self.last_score = 0.0
+        self.checked_frames = 0
+        self.skipped_frames = 0
+
+    def _prepare(self, frame):
+        """Downscaled, blurred grayscale copy of the frame."""
+        height, width = frame.shape[:2]
+        scale = self.downscale_width / float(width) if width > self.downscale_width else 1.0
+        small = cv2.resize(frame, (max(1, int(width * scale)), max(1, int(height * scale))), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def should_infer(self, frame, frame_timestamp):
+        """
+        Scores motion in a frame and decides whether the model should run on it.
+
+        Args:
+            frame (np.ndarray): The BGR frame.
+            frame_timestamp (float): Timestamp of the frame in seconds.
+
+        Returns:
+            bool: True if the frame should be run through the model.
+        """
+        self.checked_frames += 1
+        self._current = self._prepare(frame)
+
+        if self._subtractor is not None:
+            mask = self._subtractor.apply(self._current)
+            self.last_score = cv2.countNonZero(mask) / float(mask.size)
+        elif self._reference is None or self._reference.shape != self._current.shape:
+            self.last_score = 1.0
+        else:
+            diff = cv2.absdiff(self._current, self._reference)
+            self.last_score = np.count_nonzero(diff > self.pixel_threshold) / float(diff.size)
+
+        if self._last_inference_time is None or self.last_score >= self.threshold:
+            return True
+        if frame_timestamp - self._last_inference_time >= self.max_skip_seconds:
+            return True
+        self.skipped_frames += 1
+        return False
+
+    def mark_inferred(self, frame_timestamp):
+        """Records that the last checked frame was run through the model; it becomes the new reference."""
+        self._last_inference_time = frame_timestamp
+        self._reference = self._current
+
+    @property
+    def hit_rate(self):
+        """Fraction of checked frames that skipped inference."""
+        return self.skipped_frames / self.checked_frames if self.checked_frames else 0.0
+
+class DuplicateFrameCache:
+    """
+    Near-duplicate frame check for one control. Compares a small grayscale
+    thumbnail of each frame with the thumbnail of the last inferred frame;
+    when no thumbnail pixel changed by more than max_pixel_diff gray levels
+    the frame is treated as identical (frozen sources, parked PTZ cameras)
+    and the cached detections are returned instead of calling the model.
+    Unlike the motion gate it only skips frames that are effectively
+    unchanged, though at thumbnail resolution a small distant object can
+    move without changing any pixel enough, so it is opt-in.
+    重复帧缓存：画面与上一次推理的帧几乎相同时，直接返回缓存的检测结果
+    """
+    def __init__(self, thumbnail_width=64, max_pixel_diff=6, max_age_seconds=30.0):
+        """
+        Args:
+            thumbnail_width (int): Width of the grayscale thumbnail compared between frames.
+            max_pixel_diff (int): Largest gray-level change of any thumbnail pixel for a duplicate.
+            max_age_seconds (float): Cached detections older than this are not reused.
+        """
+        self.thumbnail_width = int(thumbnail_width)
+        self.max_pixel_diff = int(max_pixel_diff)
+        self.max_age_seconds = float(max_age_seconds)
+        self._reference = None
+        self._current = None
+        self._detections = None
+        self._stored_time = None
+        self.lookups = 0
+        self.hits = 0
+
+    def _thumbnail(self, frame):
+        height, width = frame.shape[:2]
+        scale = self.thumbnail_width / float(width) if width > self.thumbnail_width else 1.0
+        small = cv2.resize(frame, (max(1, int(width * scale)), max(1, int(height * scale))), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    def lookup(self, frame, frame_timestamp):
+        """
+        Returns the cached detections if the frame is a near-duplicate of the last inferred frame.
+
+        Args:
+            frame (np.ndarray): The BGR frame.
+            frame_timestamp (float): Timestamp of the frame in seconds.
+
+        Returns:
+            list | np.ndarray | None: The cached detections, or None if the model must run.
+        """
+        self.lookups += 1
+        self._current = self._thumbnail(frame)
+        if (self._reference is None or self._reference.shape != self._current.shape
+                or frame_timestamp - self._stored_time > self.max_age_seconds):
+            return None
+        if int(cv2.absdiff(self._current, self._reference).max()) > self.max_pixel_diff:
+            return None
+        self.hits += 1
+        return self._detections
+
+    def store(self, detections, frame_timestamp):
+        """Caches the detections of the last looked-up frame, which becomes the new reference."""
+        self._reference = self._current
+        self._detections = detections
+        self._stored_time = frame_timestamp
+
+    @property
+    def hit_ratio(self):
+        """Fraction of looked-up frames answered from the cache."""
+        return self.hits / self.lookups if self.lookups else 0.0
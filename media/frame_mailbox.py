@@ -0,0 +1,72 @@
+# inference_service/frame_mailbox.py (Standalone with SQLite)
+
+import queue
+import threading
+
+class FrameMailbox:
+    """
+    Single-slot, latest-frame-wins mailbox between the puller and the detector.
+    A new frame replaces the one waiting in the slot, so the detector always
+    gets the freshest frame instead of working through a backlog.
+    Implements the part of the queue.Queue interface used by the pipeline.
+    最新帧优先的单槽邮箱：检测线程始终拿到最新的帧，旧帧直接被覆盖
+    """
+    def __init__(self):
+        self._item = None
+        self._has_item = False
+        self._condition = threading.Condition()
+        # Frames overwritten before the detector picked them up
+        self.dropped = 0
+
+    def put_nowait(self, item):
+        """
+        Puts an item in the slot, replacing (and counting) any item still waiting. Never blocks.
+
+        Returns:
+            The replaced item (so the caller can release its frame), or None.
+        """
+        with self._condition:
+            replaced = self._item if self._has_item else None
+            if self._has_item:
+                self.dropped += 1
+            self._item = item
+            self._has_item = True
+            self._condition.notify()
+            return replaced
+
+    def put(self, item, block=True, timeout=None):
+        """Same as put_nowait(); the mailbox is never full."""
+        return self.put_nowait(item)
+
+    def get(self, block=True, timeout=None):
+        """
+        Takes the item from the slot, waiting up to timeout seconds for one.
+
+        Raises:
+            queue.Empty: If no item arrived in time.
+        """
+        with self._condition:
+            if block and not self._condition.wait_for(lambda: self._has_item, timeout):
+                raise queue.Empty
+            if not self._has_item:
+                raise queue.Empty
+            item = self._item
+            self._item = None
+            self._has_item = False
+            return item
+
+    def get_nowait(self):
+        """Takes the item from the slot without waiting. Raises queue.Empty if there is none."""
+        return self.get(block=False)
+
+    def empty(self):
+        with self._condition:
+            return not self._has_item
+
+    def qsize(self):
+        with self._condition:
+            return 1 if self._has_item else 0
+
+    def task_done(self):
+        """No-op, for compatibility with queue.Queue consumers."""
+        pass
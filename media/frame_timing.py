@@ -0,0 +1,173 @@
+# inference_service/frame_timing.py (Standalone with SQLite)
+
+import time
+import threading
+
+from config import FRAME_PTS_MAX_DRIFT_SECONDS, ARRIVAL_GAP_FACTOR, ARRIVAL_BURST_FACTOR
+from stage_stats import LatencyWindow
+
+class FrameTime:
+    """
+    Timing of one ingested frame.
+
+    Attributes:
+        received (float): time.monotonic() when the frame left the decoder.
+        pts (float | None): Presentation timestamp from the source in seconds, None if unknown.
+        stream_time (float): When the frame was presented at the source, on the monotonic clock:
+                             the PTS mapped through the smallest transit delay seen, so decode
+                             stalls and network bursts do not move it. Equals `received` for a
+                             stream without PTS; extrapolated from the last PTS for a frame of a
+                             stream with PTS that lacks its own.
+    帧时间：源PTS、单调时钟接收时间，以及按PTS换算到单调时钟的呈现时间
+    """
+    __slots__ = ("received", "pts", "stream_time")
+
+    def __init__(self, received, pts=None, stream_time=None):
+        self.received = received
+        self.pts = pts
+        self.stream_time = received if stream_time is None else stream_time
+
+    @property
+    def age(self):
+        """Seconds since the frame was received."""
+        return time.monotonic() - self.received
+
+    def is_older_than(self, max_age):
+        """True if the frame was received more than max_age seconds ago (never when max_age is None)."""
+        return max_age is not None and self.age > max_age
+
+    def __repr__(self):
+        return f"FrameTime(received={self.received:.3f}, pts={self.pts}, stream_time={self.stream_time:.3f})"
+
+class FrameClock:
+    """
+    Maps the source PTS of a stream onto the monotonic clock. The mapping
+    follows the smallest transit delay (receive time minus PTS) seen since the
+    last discontinuity, i.e. the frame that arrived the fastest; frames that
+    arrive later (network bursts, decode stalls) keep their source spacing.
+    A PTS that goes backwards or drifts more than FRAME_PTS_MAX_DRIFT_SECONDS
+    from the mapping (stream restart, wrap, long outage) starts a new mapping.
+    Once a stream has delivered a PTS its stream_time stays on that time base
+    and never goes backwards: frames without a (new) PTS are placed after the
+    last mapped frame by their receive interval.
+    源时间戳时钟：将源PTS映射到本地单调时钟，遇到PTS回退或大幅跳变时重新对齐
+    """
+    def __init__(self, max_drift=FRAME_PTS_MAX_DRIFT_SECONDS):
+        self.max_drift = max_drift
+        self._min_transit = None
+        self._last_pts = None
+        self._last = None  # FrameTime of the last frame stamped since the stream had a PTS
+        self.discontinuities = 0
+
+    def reset(self):
+        """Forgets the mapping (e.g. after the stream was reopened)."""
+        self._min_transit = None
+        self._last_pts = None
+        self._last = None
+
+    def stamp(self, pts=None, received=None):
+        """
+        Timestamps a frame.
+
+        Args:
+            pts (float | None): The frame's presentation timestamp in seconds (None if unknown).
+            received (float | None): time.monotonic() when it was received (now if None).
+
+        Returns:
+            FrameTime: The frame's timing.
+        """
+        received = time.monotonic() if received is None else received
+        if pts is None or pts == self._last_pts:
+            # No PTS, or a source that does not advance it (e.g. some OpenCV camera backends)
+            if self._last is None:
+                return FrameTime(received)
+            # Stay on the stream's PTS time base: extrapolate from the last frame
+            last = self._last
+            self._last = FrameTime(received, None, last.stream_time + max(0.0, received - last.received))
+            return self._last
+
+        transit = received - pts
+        if (self._min_transit is None or (self._last_pts is not None and pts < self._last_pts)
+                or abs(transit - self._min_transit) > self.max_drift):
+            if self._min_transit is not None:
+                self.discontinuities += 1
+            self._min_transit = transit
+        elif transit < self._min_transit:
+            self._min_transit = transit
+        self._last_pts = pts
+        stream_time = pts + self._min_transit
+        if self._last is not None and stream_time < self._last.stream_time:
+            # A faster frame lowered the transit mapping below an extrapolated stream_time
+            stream_time = self._last.stream_time
+        self._last = FrameTime(received, pts, stream_time)
+        return self._last
+
+class ArrivalStats:
+    """
+    Inter-arrival statistics of the frames delivered to one control:
+    inter-arrival time percentiles, RFC 3550 style jitter (how much the
+    arrival spacing deviates from the PTS spacing), gaps (arrivals much later
+    than expected) and bursts (arrivals much sooner than expected, i.e. frames
+    arriving in a clump after a stall), plus the current transit delay
+    relative to the fastest frame. High jitter, gaps or delay point at the
+    network or decoder; queue wait and inference latencies at processing.
+    帧到达统计：到达间隔、抖动、断流和突发，用于区分网络问题和处理问题
+    """
+    def __init__(self, window=1000):
+        """
+        Args:
+            window (int): Number of most recent inter-arrival samples kept.
+        """
+        self._intervals = LatencyWindow(window)
+        self._lock = threading.Lock()
+        self._last = None
+        self.jitter = 0.0  # Seconds
+        self.gaps = 0
+        self.bursts = 0
+        self.delay = 0.0  # Seconds the last frame arrived after its stream_time
+
+    def record(self, frame_time, expected_interval=None):
+        """
+        Records one delivered frame.
+
+        Args:
+            frame_time (FrameTime): The frame's timing.
+            expected_interval (float | None): Expected seconds between frames, used when the
+                                              frames have no PTS (e.g. 1 / input_fps).
+        """
+        with self._lock:
+            self.delay = frame_time.received - frame_time.stream_time
+            last, self._last = self._last, frame_time
+            if last is None:
+                return
+            interval = frame_time.received - last.received
+            self._intervals.record(interval * 1000.0)
+            if frame_time.pts is not None and last.pts is not None and frame_time.pts > last.pts:
+                expected_interval = frame_time.pts - last.pts
+                deviation = abs(interval - expected_interval)
+                self.jitter += (deviation - self.jitter) / 16.0
+            if expected_interval:
+                if interval > ARRIVAL_GAP_FACTOR * expected_interval:
+                    self.gaps += 1
+                elif interval < ARRIVAL_BURST_FACTOR * expected_interval:
+                    self.bursts += 1
+
+    def reset(self):
+        """Forgets the last frame (e.g. after a reconnect, so the outage is not counted as a gap)."""
+        with self._lock:
+            self._last = None
+
+    def summary(self):
+        """
+        Returns:
+            dict: {"interArrival": {count, meanMs, p50Ms, p95Ms, p99Ms, maxMs}, "jitterMs",
+                   "gaps", "bursts", "delayMs"}.
+        """
+        with self._lock:
+            return {
+                "interArrival": self._intervals.summary(),
+                "jitterMs": self.jitter * 1000.0,
+                "gaps": self.gaps,
+                "bursts": self.bursts,
+                "delayMs": self.delay * 1000.0,
+            }
@@ -0,0 +1,218 @@
+# inference_service/inference_scheduler.py (Standalone with SQLite)
+
+import threading
+import time
+import logging
+import collections
+from concurrent.futures import Future
+
+from config import SCHEDULER_QUEUE_GET_TIMEOUT, MODEL_POOL_CHECKOUT_TIMEOUT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+def _predict_kwargs_key(predict_kwargs):
+    """Hashable key of a predict arguments dict (lists become tuples)."""
+    return tuple(sorted(
+        (name, tuple(value) if isinstance(value, list) else value)
+        for name, value in (predict_kwargs or {}).items()
+    ))
+
+def _predict_kwargs_from_key(key):
+    """Inverse of _predict_kwargs_key()."""
+    return {name: list(value) if isinstance(value, tuple) else value for name, value in key}
+
+class InferenceScheduler:
+    """
+    Central inference scheduler for one loaded model.
+    Collects pending frames from every control that uses the model,
+    runs them through the model as a single batch and hands each
+    control its own Results object back through a Future.
+    Frames are only batched with frames submitted with the same predict
+    arguments (class subset, conf/IoU thresholds), since one model call
+    applies one set of arguments to the whole batch.
+    One batching thread runs per replica in the model pool, and each
+    batch checks a replica out, so batches run in parallel without
+    sharing predictor state. A batch only waits for more frames while
+    submissions arrive faster than the wait (several busy controls);
+    otherwise the first frame is dispatched at once.
+    所有使用同一模型的布控共享一个调度器，按批次执行推理
+    """
+    def __init__(self, name, pool, max_batch_size, max_wait_seconds):
+        """
+        Initializes the scheduler. Call start() to launch the batching threads.
+
+        Args:
+            name (str): Name used in log messages (usually the model cache key).
+            pool (ModelPool): The replica pool of the model shared by the controls.
+            max_batch_size (int): Maximum number of frames run in one model call.
+            max_wait_seconds (float): How long to wait for more frames after the
+                                      first frame of a batch arrives (only while the
+                                      mean interval between submissions is shorter).
+        """
+        self.name = name
+        self.pool = pool
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_seconds = max(0.0, float(max_wait_seconds))
+        self.logger = logging.getLogger(f"[{self.name}] {self.__class__.__name__}")
+
+        # Request groups waiting to run, keyed by their predict arguments (oldest key first)
+        self._pending = collections.OrderedDict()
+        self._condition = threading.Condition()
+        # Smoothed interval between submitted request groups, decides whether batches wait
+        self._last_submit = None
+        self._mean_submit_interval = None
+        self._stop_event = threading.Event()
+        self._threads = []
+
+    def start(self):
+        """Starts one batching thread per pool replica if not already running."""
+        if any(thread.is_alive() for thread in self._threads):
+            return
+        self._stop_event.clear()
+        self._threads = [threading.Thread(target=self._run, daemon=True) for _ in range(self.pool.size)]
+        for thread in self._threads:
+            thread.start()
+        self.logger.info(f"Inference scheduler started with {len(self._threads)} worker(s) (max_batch_size={self.max_batch_size}, max_wait={self.max_wait_seconds}s).")
+
+    def stop(self, timeout=None):
+        """
+        Stops the batching threads. Pending requests are failed so that no
+        detector thread stays blocked on a Future that will never complete.
+        """
+        self._stop_event.set()
+        with self._condition:
+            self._condition.notify_all()
+        for thread in self._threads:
+            if thread.is_alive():
+                thread.join(timeout=timeout)
+        self._fail_pending(RuntimeError("Inference scheduler stopped"))
+        self.logger.info("Inference scheduler stopped.")
+
+    def submit(self, frame, predict_kwargs=None):
+        """
+        Queues a frame for inference.
+
+        Args:
+            frame (np.ndarray): The BGR frame to run through the model.
+            predict_kwargs (dict | None): Extra model call arguments (e.g. classes, conf, iou).
+
+        Returns:
+            Future: Resolves to the ultralytics Results object for this frame.
+        """
+        return self.submit_many([frame], predict_kwargs)[0]
+
+    def submit_many(self, frames, predict_kwargs=None):
+        """
+        Queues a group of images (e.g. the tiles of one frame) that is always
+        run in the same model call. A group is never split, so a batch may
+        exceed max_batch_size when a group does not fit in the current batch.
+
+        Args:
+            frames (list[np.ndarray]): The BGR images to run through the model.
+            predict_kwargs (dict | None): Extra model call arguments (e.g. classes, conf, iou),
+                                          applied inside the model's postprocessing (NMS).
+
+        Returns:
+            list[Future]: One Future per image, resolving to its ultralytics Results object.
+        """
+        futures = [Future() for _ in frames]
+        if self._stop_event.is_set():
+            for future in futures:
+                future.set_exception(RuntimeError("Inference scheduler is not running"))
+            return futures
+        if futures:
+            key = _predict_kwargs_key(predict_kwargs)
+            with self._condition:
+                now = time.monotonic()
+                if self._last_submit is not None:
+                    interval = now - self._last_submit
+                    mean = self._mean_submit_interval
+                    self._mean_submit_interval = interval if mean is None else 0.9 * mean + 0.1 * interval
+                self._last_submit = now
+                self._pending.setdefault(key, collections.deque()).append(list(zip(frames, futures)))
+                self._condition.notify_all()
+        return futures
+
+    def _collect_batch(self):
+        """
+        Blocks for the first request group, then gathers more groups with the
+        same predict arguments until the batch is full or the deadline passes.
+        The deadline is now unless another group is expected within max_wait_seconds.
+
+        Returns:
+            tuple[tuple, list]: The predict arguments key and the (frame, future) pairs of the batch.
+        """
+        with self._condition:
+            if not self._pending:
+                self._condition.wait(timeout=SCHEDULER_QUEUE_GET_TIMEOUT)
+            if not self._pending:
+                return (), []
+
+            key = next(iter(self._pending))
+            batch = []
+            deadline = time.monotonic() + self._batch_wait()
+            while True:
+                groups = self._pending.get(key)
+                while groups and (not batch or len(batch) < self.max_batch_size):
+                    batch.extend(groups.popleft())
+                if groups is not None and not groups:
+                    del self._pending[key]
+                remaining = deadline - time.monotonic()
+                # Once the deadline passed, whatever was already waiting has been taken
+                if len(batch) >= self.max_batch_size or remaining <= 0 or self._stop_event.is_set():
+                    return key, batch
+                self._condition.wait(timeout=remaining)
+
+    def _batch_wait(self):
+        """How long a batch waits for more frames: max_wait_seconds only if submissions arrive faster. Lock held."""
+        mean = self._mean_submit_interval
+        if mean is None or mean >= self.max_wait_seconds:
+            # A single control (or a few slow ones): waiting would only add latency
+            return 0.0
+        return self.max_wait_seconds
+
+    def _run_batch(self, key, batch):
+        """Runs one model call for the whole batch on a checked-out replica and resolves each Future."""
+        # Skip requests whose caller already gave up
+        batch = [(frame, future) for frame, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        frames = [frame for frame, _ in batch]
+        try:
+            with self.pool.checkout(timeout=MODEL_POOL_CHECKOUT_TIMEOUT_SECONDS) as model:
+                results = model(frames, verbose=False, **_predict_kwargs_from_key(key))
+        except Exception as e:
+            self.logger.error(f"Batched inference failed for {len(frames)} frame(s): {e}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for i, (_, future) in enumerate(batch):
+            if i < len(results):
+                future.set_result(results[i])
+            else:
+                future.set_exception(RuntimeError("Model returned fewer results than frames submitted"))
+
+    def _run(self):
+        """Batching thread main loop (one per replica)."""
+        try:
+            while not self._stop_event.is_set():
+                key, batch = self._collect_batch()
+                if batch:
+                    self._run_batch(key, batch)
+        except Exception as e:
+            self.logger.exception(f"Exception in inference scheduler thread: {e}")
+        finally:
+            if self._stop_event.is_set():
+                self._fail_pending(RuntimeError("Inference scheduler stopped"))
+
+    def _fail_pending(self, error):
+        """Fails every request still waiting in the queue."""
+        with self._condition:
+            groups = [group for pending in self._pending.values() for group in pending]
+            self._pending.clear()
+        for group in groups:
+            for _, future in group:
+                if future.set_running_or_notify_cancel():
+                    future.set_exception(error)
@@ -0,0 +1,630 @@
+# inference_service/ingest.py (Standalone with SQLite)
+
+import re
+import json
+import logging
+import threading
+import subprocess
+import cv2
+import numpy as np
+
+from config import (
+    FFMPEG_PROBE_TIMEOUT_SECONDS, FFMPEG_INGEST_THREADS, FFMPEG_INGEST_LOW_LATENCY, FFMPEG_INGEST_MAX_BUFFERS,
+    FFMPEG_INGEST_BUFFER_LIMIT,
+    KEYFRAME_ONLY_ASSUMED_FPS, FFMPEG_INGEST_PTS
+)
+
+logger = logging.getLogger(__name__)
+
+INGEST_OPENCV = "opencv"
+INGEST_FFMPEG = "ffmpeg"
+INGEST_BACKENDS = (INGEST_OPENCV, INGEST_FFMPEG)
+
+# "n:  12 pts:  12345 pts_time:0.48 ..." lines of FFmpeg's showinfo filter
+_SHOWINFO_PTS = re.compile(r"\bn:\s*(\d+)\s+pts:\s*-?\d+\s+pts_time:\s*(-?[\d.]+)")
+# How long read() waits for a frame's showinfo line (written before the frame reaches the pipe)
+_PTS_WAIT_SECONDS = 0.05
+_showinfo_filter = None  # showinfo filter spec supported by the installed FFmpeg (probed once)
+_showinfo_lock = threading.Lock()
+
+def parse_decoder_options(raw_options):
+    """
+    Validates the per-control decoder options of the FFmpeg ingest backend.
+
+    Args:
+        raw_options (dict | None): Options as received from the API:
+            threads (int): Decoder threads (0 lets FFmpeg decide).
+            scale ([int, int]): Output width and height; one of them may be -1 to keep the aspect ratio.
+            fps (float): Output frame rate (frames are dropped in the decoder).
+            lowLatency (bool): Disable input buffering and probing delays.
+            keyframesOnly (bool): Decode only key frames (I-frames).
+
+    Returns:
+        dict: The options with snake_case keys (only those given).
+
+    Raises:
+        ValueError: If an option is malformed.
+    """
+    if not raw_options:
+        return {}
+    if not isinstance(raw_options, dict):
+        raise ValueError("decoderOptions must be an object")
+
+    options = {}
+    if raw_options.get("threads") is not None:
+        threads = raw_options["threads"]
+        if not isinstance(threads, int) or threads < 0:
+            raise ValueError("decoderOptions.threads must be a non-negative integer")
+        options["threads"] = threads
+    if raw_options.get("scale") is not None:
+        scale = raw_options["scale"]
+        if (not isinstance(scale, list) or len(scale) != 2 or not all(isinstance(v, int) for v in scale)
+                or not all(v > 0 or v == -1 for v in scale) or scale == [-1, -1]):
+            raise ValueError("decoderOptions.scale must be [width, height] (one of them may be -1)")
+        options["scale"] = tuple(scale)
+    if raw_options.get("fps") is not None:
+        fps = raw_options["fps"]
+        if not isinstance(fps, (int, float)) or fps <= 0:
+            raise ValueError("decoderOptions.fps must be a positive number")
+        options["fps"] = float(fps)
+    if raw_options.get("lowLatency") is not None:
+        options["low_latency"] = bool(raw_options["lowLatency"])
+    if raw_options.get("keyframesOnly") is not None:
+        options["keyframes_only"] = bool(raw_options["keyframesOnly"])
+    return options
+
+def parse_analysis_options(raw_options):
+    """
+    Validates the per-control analysis resolution and frame rate.
+
+    Args:
+        raw_options (dict | None): Options as received from the API:
+            width (int): Frames wider than this are downscaled in the decoder.
+            fps (float): Frames above this rate are dropped in the decoder.
+
+    Returns:
+        dict: The options given (width and/or fps).
+
+    Raises:
+        ValueError: If an option is malformed.
+    """
+    if not raw_options:
+        return {}
+    if not isinstance(raw_options, dict):
+        raise ValueError("analysis must be an object")
+
+    options = {}
+    if raw_options.get("width") is not None:
+        width = raw_options["width"]
+        if not isinstance(width, int) or width < 32:
+            raise ValueError("analysis.width must be an integer of at least 32")
+        options["width"] = width
+    if raw_options.get("fps") is not None:
+        fps = raw_options["fps"]
+        if not isinstance(fps, (int, float)) or fps <= 0:
+            raise ValueError("analysis.fps must be a positive number")
+        options["fps"] = float(fps)
+    return options
+
+def probe_stream(stream_url, timeout=FFMPEG_PROBE_TIMEOUT_SECONDS):
+    """
+    Reads the resolution and frame rate of the first video stream with ffprobe.
+
+    Args:
+        stream_url (str): The stream URL or file path.
+        timeout (float): Seconds to wait for ffprobe.
+
+    Returns:
+        tuple[int, int, float]: Width, height and frame rate (0.0 if unknown).
+
+    Raises:
+        RuntimeError: If the stream cannot be probed.
+    """
+    command = ['ffprobe', '-v', 'error']
+    if stream_url.startswith("rtsp://"):
+        command += ['-rtsp_transport', 'tcp']
+    command += [
+        '-select_streams', 'v:0',
+        '-show_entries', 'stream=width,height,avg_frame_rate,r_frame_rate',
+        '-of', 'json', stream_url
+    ]
+    try:
+        output = subprocess.run(command, capture_output=True, timeout=timeout, check=True).stdout
+        stream = json.loads(output)["streams"][0]
+    except (subprocess.SubprocessError, OSError, ValueError, KeyError, IndexError) as e:
+        raise RuntimeError(f"ffprobe failed for {stream_url}: {e}")
+
+    fps = 0.0
+    for rate in (stream.get("avg_frame_rate"), stream.get("r_frame_rate")):
+        try:
+            numerator, denominator = (float(v) for v in str(rate).split("/"))
+            if denominator > 0 and numerator > 0:
+                fps = numerator / denominator
+                break
+        except ValueError:
+            continue
+    return int(stream["width"]), int(stream["height"]), fps
+
+def showinfo_filter():
+    """
+    The showinfo filter spec to use: "showinfo=checksum=0" where the installed FFmpeg
+    supports the option (skips hashing every frame), plain "showinfo" on older builds.
+    Probed once per process.
+    """
+    global _showinfo_filter
+    with _showinfo_lock:
+        if _showinfo_filter is None:
+            try:
+                output = subprocess.run(['ffmpeg', '-hide_banner', '-h', 'filter=showinfo'], capture_output=True,
+                                        timeout=FFMPEG_PROBE_TIMEOUT_SECONDS).stdout
+                supported = b"checksum" in output
+            except (subprocess.SubprocessError, OSError):
+                supported = False
+            _showinfo_filter = "showinfo=checksum=0" if supported else "showinfo"
+            if not supported:
+                logger.info("FFmpeg showinfo has no checksum option; frames are hashed while reading their PTS.")
+        return _showinfo_filter
+
+class FrameLease:
+    """
+    One hold on a pooled frame buffer. The puller takes the first hold when it
+    reads the frame; every consumer that keeps the frame past the puller's
+    fan-out (a frame queue, the clip buffer, the pusher queue, a save thread)
+    retains it and releases it explicitly once it drops the frame. The buffer
+    returns to its pool with the last release.
+    帧缓冲租约：每个持有帧的环节显式retain/release，最后一次release后缓冲区归还缓冲池
+    """
+    __slots__ = ("_pool", "_index", "_generation")
+
+    def __init__(self, pool, index, generation):
+        self._pool = pool
+        self._index = index
+        self._generation = generation
+
+    def retain(self):
+        """
+        Adds a hold on the buffer.
+
+        Returns:
+            bool: False if the buffer was already returned to the pool (the frame is gone).
+        """
+        return self._pool._retain(self._index, self._generation)
+
+    def release(self):
+        """Drops a hold on the buffer; the buffer is free again once every hold is released."""
+        self._pool._release(self._index, self._generation)
+
+class FrameBufferPool:
+    """
+    Pool of preallocated frame buffers of one shape. acquire() hands out a
+    free buffer with a FrameLease; the buffer is reused only after every
+    holder released the lease, so frames are never overwritten while the
+    pipeline still holds them.
+    The pool grows on demand; once warm, reading a frame allocates nothing.
+    Growing past max_buffers is logged (the pipeline holds more frames than
+    expected), and it never grows past limit.
+    预分配帧缓冲池：缓冲区在所有持有者显式释放后才会被复用
+    """
+    def __init__(self, shape, max_buffers=FFMPEG_INGEST_MAX_BUFFERS, limit=FFMPEG_INGEST_BUFFER_LIMIT):
+        """
+        Args:
+            shape (tuple): Shape of each uint8 buffer, e.g. (height, width, 3).
+            max_buffers (int): Buffers the pool is expected to need; growing past it is logged.
+            limit (int): Most buffers the pool may allocate.
+        """
+        self.shape = tuple(shape)
+        self.max_buffers = max(2, int(max_buffers))
+        self.limit = max(self.max_buffers, int(limit))
+        self._buffers = []
+        self._holds = []  # Outstanding holds per buffer (0 = free)
+        self._generations = []  # Bumped on every acquire, so a stale lease cannot release a reused buffer
+        self._next = 0
+        self._warn_at = self.max_buffers
+        self._lock = threading.Lock()
+
+    def reserve(self, max_buffers):
+        """
+        Raises the number of buffers the pool is expected to need (e.g. once a
+        subscriber's clip buffer length is known). Nothing is allocated up front.
+
+        Args:
+            max_buffers (int): Buffers expected to be held at once.
+        """
+        with self._lock:
+            self.max_buffers = max(2, int(max_buffers))
+            self.limit = max(self.limit, self.max_buffers)
+            self._warn_at = max(self._warn_at, self.max_buffers)
+
+    def acquire(self):
+        """
+        Returns a free buffer with the caller's hold on it, allocating one if none is free.
+
+        Returns:
+            tuple[np.ndarray | None, FrameLease | None]: The buffer and its lease, or (None, None)
+                                                         if the pool is exhausted.
+        """
+        with self._lock:
+            count = len(self._buffers)
+            for i in range(count):
+                index = (self._next + i) % count
+                if self._holds[index] == 0:
+                    self._next = (index + 1) % count
+                    return self._buffers[index], self._hold_new(index)
+            if count >= self.limit:
+                return None, None
+            if count >= self._warn_at:
+                self._warn_at *= 2
+                buffer_mb = np.prod(self.shape) / 1024 / 1024
+                logger.warning(f"Frame buffer pool grew past {count} buffers ({count * buffer_mb:.0f} MB); the pipeline "
+                               f"holds more frames than the {self.max_buffers} expected.")
+            self._buffers.append(np.empty(self.shape, dtype=np.uint8))
+            self._holds.append(0)
+            self._generations.append(0)
+            return self._buffers[count], self._hold_new(count)
+
+    def _hold_new(self, index):
+        """Hands out a free buffer (lock held)."""
+        self._holds[index] = 1
+        self._generations[index] += 1
+        return FrameLease(self, index, self._generations[index])
+
+    def _retain(self, index, generation):
+        with self._lock:
+            if self._generations[index] != generation or self._holds[index] == 0:
+                return False
+            self._holds[index] += 1
+            return True
+
+    def _release(self, index, generation):
+        with self._lock:
+            if self._generations[index] != generation or self._holds[index] == 0:
+                logger.error("Frame buffer released more often than it was retained; ignoring the release.")
+                return
+            self._holds[index] -= 1
+
+    @property
+    def size(self):
+        return len(self._buffers)
+
+    @property
+    def in_use(self):
+        """Buffers currently held by the pipeline."""
+        with self._lock:
+            return sum(1 for holds in self._holds if holds)
+
+class FFmpegFrameReader:
+    """
+    Ingest backend that decodes a stream with an FFmpeg subprocess writing raw
+    BGR frames to a pipe. Frames are read with readinto() straight into
+    buffers of a FrameBufferPool, and the decoder's thread count, output
+    scaling, frame rate, low-latency flags and keyframe-only decoding are
+    configurable per control. The raw pipe carries no timestamps, so each
+    frame's PTS is read from the showinfo filter's log lines on stderr.
+    Implements the part of the cv2.VideoCapture interface used by the puller
+    (isOpened, read, get, release).
+    FFmpeg子进程拉流解码：原始帧通过管道读入预分配的缓冲区
+    """
+    def __init__(self, stream_url, threads=FFMPEG_INGEST_THREADS, scale=None, fps=None,
+                 low_latency=FFMPEG_INGEST_LOW_LATENCY, max_buffers=FFMPEG_INGEST_MAX_BUFFERS, max_width=None,
+                 keyframes_only=False, read_pts=FFMPEG_INGEST_PTS):
+        """
+        Probes the stream and starts FFmpeg. Check isOpened() afterwards.
+
+        Args:
+            stream_url (str): The stream URL or file path.
+            threads (int | None): Decoder threads (None or 0 lets FFmpeg decide).
+            scale (tuple | None): Output (width, height); one of them may be -1 to keep the aspect ratio.
+            fps (float | None): Output frame rate; None keeps the source rate.
+            low_latency (bool): Disable input buffering and long probing.
+            max_buffers (int): Frame buffers expected to be held at once (see FrameBufferPool).
+            max_width (int | None): Without an explicit scale, downscale frames wider than this
+                                    (keeping the aspect ratio).
+            keyframes_only (bool): Skip decoding non-key frames. The output rate then follows the
+                                   stream's GOP, so fps is ignored.
+            read_pts (bool): Report each frame's PTS (get(CAP_PROP_POS_MSEC)) from the showinfo filter.
+        """
+        self.stream_url = stream_url
+        self.threads = threads
+        self.scale = scale
+        self.output_fps = fps
+        self.low_latency = low_latency
+        self.keyframes_only = keyframes_only
+        self.read_pts = read_pts
+        self.last_pts = None  # PTS (seconds) of the last frame read, None if unknown
+        self.last_lease = None  # FrameLease of the last frame read (held by the caller)
+        self._pts_by_index = {}  # Output frame index -> PTS, filled from stderr
+        self._pts_condition = threading.Condition()
+        # Set when a frame's showinfo line was not there in time: later reads no longer wait for it
+        self._pts_late = False
+        self._frames_read = 0
+        self.dropped_frames = 0  # Frames dropped because every pooled buffer was still in use
+        self.process = None
+        self.pool = None
+        self.width = self.height = 0
+        self.fps = 0.0
+        self._stderr_tail = []
+        try:
+            source_width, source_height, source_fps = probe_stream(stream_url)
+        except RuntimeError as e:
+            logger.warning(str(e))
+            return
+
+        if not scale and max_width and source_width > max_width:
+            self.scale = scale = (int(max_width), -1)
+        if keyframes_only:
+            # The fps filter would duplicate the sparse key frames back up to a constant rate
+            self.output_fps = fps = None
+        elif fps and source_fps and fps >= source_fps:
+            # The fps filter would duplicate frames to reach a higher rate
+            self.output_fps = fps = None
+        self.width, self.height = _output_size(source_width, source_height, scale)
+        if keyframes_only:
+            self.fps = KEYFRAME_ONLY_ASSUMED_FPS
+        else:
+            self.fps = float(fps) if fps else source_fps
+        self.frame_bytes = self.width * self.height * 3
+        self.pool = FrameBufferPool((self.height, self.width, 3), max_buffers)
+        # Scratch buffer that frames are read into (and dropped from) when the pool is exhausted
+        self._scratch = None
+
+        command = self.build_command()
+        logger.info(f"Starting FFmpeg ingest: {' '.join(command)}")
+        try:
+            self.process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                            stdin=subprocess.DEVNULL, bufsize=self.frame_bytes)
+        except OSError as e:
+            logger.error(f"Failed to start FFmpeg ingest for {stream_url}: {e}")
+            self.process = None
+            return
+        # Drain stderr so FFmpeg never blocks on a full pipe; keep the last lines for error messages
+        threading.Thread(target=self._drain_stderr, daemon=True).start()
+
+    def build_command(self):
+        """Builds the FFmpeg command decoding the stream to raw BGR frames on stdout."""
+        # showinfo logs at info level; otherwise only errors are of interest
+        command = ['ffmpeg', '-hide_banner', '-loglevel', 'info' if self.read_pts else 'error', '-nostats', '-nostdin']
+        if self.low_latency:
+            command += ['-fflags', 'nobuffer', '-flags', 'low_delay', '-probesize', '32768', '-analyzeduration', '0']
+        if self.stream_url.startswith("rtsp://"):
+            command += ['-rtsp_transport', 'tcp']
+        if self.threads:
+            command += ['-threads', str(int(self.threads))]  # Before -i: decoder threads
+        if self.keyframes_only:
+            command += ['-skip_frame', 'nokey']  # Before -i: the decoder drops P/B frames unparsed
+        command += ['-i', self.stream_url, '-an', '-sn', '-dn']
+        if self.keyframes_only:
+            command += ['-vsync', '0']  # Pass the key frames through instead of duplicating them to a constant rate
+
+        filters = []
+        if self.scale:
+            filters.append(f"scale={self.width}:{self.height}")
+        if self.output_fps:
+            filters.append(f"fps={self.output_fps:g}")
+        if self.read_pts:
+            # Last in the chain, so its frame index n is the index of the frame on the pipe
+            filters.append(showinfo_filter())
+        if filters:
+            command += ['-vf', ','.join(filters)]
+        command += ['-pix_fmt', 'bgr24', '-f', 'rawvideo', 'pipe:1']
+        return command
+
+    def _drain_stderr(self):
+        process = self.process
+        for line in iter(process.stderr.readline, b""):
+            line = line.decode("utf-8", "replace").strip()
+            match = _SHOWINFO_PTS.search(line) if self.read_pts else None
+            if match:
+                index = int(match.group(1))
+                with self._pts_condition:
+                    self._pts_by_index[index] = float(match.group(2))
+                    self._pts_condition.notify_all()
+                continue
+            self._stderr_tail = (self._stderr_tail + [line])[-5:]
+        with self._pts_condition:
+            self._pts_condition.notify_all()
+
+    def _take_pts(self, index):
+        """
+        PTS of an output frame, or None. Waits briefly for its showinfo line only until the
+        first miss: after that the frame path never blocks and late frames go without PTS.
+        """
+        if not self.read_pts:
+            return None
+        with self._pts_condition:
+            if not self._pts_late:
+                self._pts_condition.wait_for(lambda: index in self._pts_by_index or not self.isOpened(), _PTS_WAIT_SECONDS)
+            pts = self._pts_by_index.pop(index, None)
+            if pts is None and not self._pts_late and self.isOpened():
+                self._pts_late = True
+                logger.info(f"FFmpeg ingest PTS for {self.stream_url} arrive late; no longer waiting for them.")
+            # Entries of frames that were never taken (e.g. lines that arrived too late)
+            for stale in [i for i in self._pts_by_index if i < index]:
+                del self._pts_by_index[stale]
+            return pts
+
+    def isOpened(self):
+        return self.process is not None and self.process.poll() is None
+
+    def _read_into(self, buffer):
+        """Fills a buffer with the next frame from the pipe; returns False at end of stream."""
+        view = memoryview(buffer).cast("B")
+        filled = 0
+        while filled < self.frame_bytes:
+            count = self.process.stdout.readinto(view[filled:])
+            if not count:
+                return False
+            filled += count
+        return True
+
+    def read(self):
+        """
+        Reads the next frame into a pooled buffer.
+
+        Returns:
+            tuple[bool, np.ndarray | None]: Like cv2.VideoCapture.read(). The frame is a pooled
+                                            buffer: it must not be modified, and the caller holds
+                                            last_lease on it until it releases the lease.
+        """
+        self.last_lease = None
+        if not self.isOpened():
+            return False, None
+        buffer, lease = self.pool.acquire()
+        while buffer is None:
+            # Every buffer is still held by the pipeline: consume and drop frames until one is free
+            if self._scratch is None:
+                self._scratch = np.empty((self.height, self.width, 3), dtype=np.uint8)
+            if not self._read_into(self._scratch):
+                return False, None
+            self._frames_read += 1
+            self.dropped_frames += 1
+            buffer, lease = self.pool.acquire()
+        if not self._read_into(buffer):
+            lease.release()
+            if self._stderr_tail:
+                logger.warning(f"FFmpeg ingest ended for {self.stream_url}: {' | '.join(self._stderr_tail)}")
+            return False, None
+        self.last_pts = self._take_pts(self._frames_read)
+        self._frames_read += 1
+        self.last_lease = lease
+        return True, buffer
+
+    def get(self, prop_id):
+        """Supports the stream properties the puller reads (width, height, fps, PTS of the last frame)."""
+        if prop_id == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.width)
+        if prop_id == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.height)
+        if prop_id == cv2.CAP_PROP_FPS:
+            return float(self.fps)
+        if prop_id == cv2.CAP_PROP_POS_MSEC:
+            return -1.0 if self.last_pts is None else self.last_pts * 1000.0
+        return 0.0
+
+    def release(self):
+        """Stops FFmpeg."""
+        if self.process is None:
+            return
+        try:
+            self.process.kill()
+            self.process.wait(timeout=5)
+        except Exception as e:
+            logger.warning(f"Error stopping FFmpeg ingest for {self.stream_url}: {e}")
+        finally:
+            self.process.stdout.close()
+            self.process = None
+
+class DecimatingCapture:
+    """
+    Wraps a cv2.VideoCapture to decode at the analysis resolution and frame
+    rate: frames above the target rate are only grab()bed (no BGR
+    conversion or copy), and the kept frames wider than max_width are
+    downscaled right after decoding, so the rest of the pipeline never
+    copies full-resolution pixels it does not need.
+    OpenCV拉流降采样：跳过的帧只grab()不retrieve()，保留的帧立即缩放到分析分辨率
+    """
+    def __init__(self, cap, max_width=None, fps=None):
+        """
+        Args:
+            cap (cv2.VideoCapture): The opened capture.
+            max_width (int | None): Frames wider than this are downscaled (keeping the aspect ratio).
+            fps (float | None): Target frame rate; None keeps every frame.
+        """
+        self.cap = cap
+        self.decimated_frames = 0  # Frames grabbed but skipped to reach the target rate
+        source_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        source_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        source_fps = cap.get(cv2.CAP_PROP_FPS)
+
+        self._size = None
+        self.width, self.height = source_width, source_height
+        if max_width and source_width > max_width and source_height > 0:
+            self.width, self.height = _output_size(source_width, source_height, (int(max_width), -1))
+            self._size = (self.width, self.height)
+
+        # Fraction of the source frames kept; a frame is retrieved whenever the accumulator reaches 1
+        self._keep_ratio = 1.0
+        self.fps = source_fps
+        if fps and source_fps > 0 and fps < source_fps:
+            self._keep_ratio = fps / source_fps
+            self.fps = float(fps)
+        self._phase = 1.0
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def read(self):
+        """Like cv2.VideoCapture.read(), returning only the kept frames at the analysis size."""
+        while True:
+            if not self.cap.grab():
+                return False, None
+            self._phase += self._keep_ratio
+            if self._phase >= 1.0:
+                self._phase -= 1.0
+                break
+            self.decimated_frames += 1
+        ret, frame = self.cap.retrieve()
+        if ret and frame is not None and self._size is not None:
+            # Same interpolation as the model's letterbox resize
+            frame = cv2.resize(frame, self._size, interpolation=cv2.INTER_LINEAR)
+        return ret, frame
+
+    def get(self, prop_id):
+        """Reports the output size and frame rate; other properties come from the capture."""
+        if prop_id == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.width)
+        if prop_id == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.height)
+        if prop_id == cv2.CAP_PROP_FPS:
+            return float(self.fps)
+        return self.cap.get(prop_id)
+
+    def release(self):
+        self.cap.release()
+
+def _output_size(source_width, source_height, scale):
+    """Output frame size for a scale option, keeping the aspect ratio for a -1 side (rounded to even)."""
+    if not scale:
+        return source_width, source_height
+    width, height = scale
+    if width == -1:
+        width = int(round(source_width * height / float(source_height) / 2.0)) * 2
+    elif height == -1:
+        height = int(round(source_height * width / float(source_width) / 2.0)) * 2
+    return max(2, int(width)), max(2, int(height))
+
+def open_capture(stream_url, backend=INGEST_OPENCV, decoder_options=None, analysis=None,
+                 max_buffers=FFMPEG_INGEST_MAX_BUFFERS):
+    """
+    Opens a stream with the given ingest backend.
+
+    Args:
+        stream_url (str): The stream URL or file path.
+        backend (str): "opencv" (cv2.VideoCapture) or "ffmpeg" (FFmpegFrameReader).
+        decoder_options (dict | None): Options from parse_decoder_options() (FFmpeg backend only).
+        analysis (dict | None): Analysis "width" and "fps" to decode at (None values keep the
+                                source's), and "keyframes_only". Explicit decoder_options take precedence.
+        max_buffers (int): Frame buffers the pipeline is expected to hold at once (FFmpeg backend only;
+                           includes the subscribers' alarm clip buffers).
+
+    Returns:
+        cv2.VideoCapture | DecimatingCapture | FFmpegFrameReader: The capture; check isOpened().
+    """
+    analysis = analysis or {}
+    options = dict(decoder_options or {})
+    keyframes_only = options.get("keyframes_only", analysis.get("keyframes_only", False))
+    if backend == INGEST_FFMPEG or keyframes_only:
+        # cv2.VideoCapture cannot skip decoding frames, so keyframe-only ingest always uses FFmpeg
+        return FFmpegFrameReader(
+            stream_url,
+            threads=options.get("threads", FFMPEG_INGEST_THREADS),
+            scale=options.get("scale"),
+            fps=options.get("fps", analysis.get("fps")),
+            low_latency=options.get("low_latency", FFMPEG_INGEST_LOW_LATENCY),
+            max_buffers=max_buffers,
+            max_width=analysis.get("width"),
+            keyframes_only=keyframes_only,
+        )
+    cap = cv2.VideoCapture(stream_url)
+    if cap.isOpened() and (analysis.get("width") or analysis.get("fps")):
+        return DecimatingCapture(cap, analysis.get("width"), analysis.get("fps"))
+    return cap
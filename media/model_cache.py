@@ -0,0 +1,196 @@
+# inference_service/model_cache.py (Standalone with SQLite)
+
+import threading
+import time
+import logging
+import collections
+
+from inference_scheduler import InferenceScheduler
+from config import (
+    INFERENCE_BATCH_MAX_SIZE, INFERENCE_BATCH_MAX_WAIT_SECONDS, THREAD_JOIN_TIMEOUT_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+class ModelCacheEntry:
+    """
+    One cached model: its replica pool, the scheduler serving it and the
+    number of active controls using it.
+    """
+    def __init__(self, key, pool, scheduler):
+        self.key = key
+        self.pool = pool
+        self.scheduler = scheduler
+        self.ref_count = 0
+        self.last_used = time.time()
+
+    @property
+    def memory_bytes(self):
+        """Estimated resident size of all loaded replicas."""
+        return self.pool.memory_bytes
+
+class ModelCache:
+    """
+    Reference-counted model cache with a RAM budget.
+    Models that no active control uses are evicted least-recently-used first
+    whenever the estimated size of the cache exceeds the budget.
+    模型缓存：按引用计数管理，超出内存预算时按LRU淘汰空闲模型
+    """
+    def __init__(self, max_bytes=None):
+        """
+        Initializes the cache.
+
+        Args:
+            max_bytes (int | None): RAM budget for all cached models in bytes.
+                                    None disables eviction.
+        """
+        self.max_bytes = max_bytes
+        self.logger = logging.getLogger(self.__class__.__name__)
+        # Ordered from least to most recently used
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        # Per-key locks held while a model loads
+        self._loading_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def acquire(self, key, loader):
+        """
+        Returns the cache entry for a key, loading it on a miss, and takes a
+        reference on it. Every acquire must be paired with a release().
+
+        Args:
+            key (str): The model cache key (model path plus class list).
+            loader (callable): Zero-argument function returning a new ModelPool.
+
+        Returns:
+            ModelCacheEntry: The entry holding the pool and scheduler.
+
+        Raises:
+            Exception: Whatever the loader raises if the model cannot be loaded.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                evicted = self._take_reference(entry, hit=True)
+            else:
+                key_lock = self._loading_locks.setdefault(key, threading.Lock())
+        if entry is not None:
+            self._stop_evicted(evicted)
+            return entry
+
+        # Load outside the cache lock so that different models can load in parallel;
+        # concurrent requests for the same key wait for the first load instead of repeating it
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    evicted = self._take_reference(entry, hit=True)
+            if entry is not None:
+                self._stop_evicted(evicted)
+                return entry
+
+            self.logger.info(f"Model cache miss: {key}")
+            pool = loader()
+            scheduler = InferenceScheduler(key, pool, INFERENCE_BATCH_MAX_SIZE, INFERENCE_BATCH_MAX_WAIT_SECONDS)
+            scheduler.start()
+            entry = ModelCacheEntry(key, pool, scheduler)
+            with self._lock:
+                self._entries[key] = entry
+                self._loading_locks.pop(key, None)
+                evicted = self._take_reference(entry, hit=False)
+            self._stop_evicted(evicted)
+            return entry
+
+    def _take_reference(self, entry, hit):
+        """
+        Counts the lookup and takes a reference on an entry. Caller holds the lock.
+
+        Returns:
+            list[ModelCacheEntry]: Entries evicted to fit the budget, to be stopped after releasing the lock.
+        """
+        if hit:
+            self.hits += 1
+            self.logger.info(f"Model cache hit: {entry.key}")
+        else:
+            self.misses += 1
+        entry.ref_count += 1
+        entry.last_used = time.time()
+        self._entries.move_to_end(entry.key)
+        return self._evict_if_needed()
+
+    def release(self, key):
+        """
+        Drops one reference on a key. Once no control uses the model it
+        becomes eligible for eviction.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.logger.warning(f"Release of unknown model cache key: {key}")
+                return
+            entry.ref_count = max(0, entry.ref_count - 1)
+            entry.last_used = time.time()
+            self._entries.move_to_end(key)
+            evicted = self._evict_if_needed()
+        self._stop_evicted(evicted)
+
+    def memory_bytes(self):
+        """Estimated resident size of all cached models."""
+        return sum(entry.memory_bytes for entry in self._entries.values())
+
+    def _evict_if_needed(self):
+        """
+        Removes idle entries, least recently used first, until the cache fits the budget. Caller holds the lock.
+
+        Returns:
+            list[ModelCacheEntry]: The removed entries. Their schedulers are still running: joining them
+                                   may take seconds, so the caller stops them via _stop_evicted() after
+                                   releasing the lock.
+        """
+        evicted = []
+        if self.max_bytes is None:
+            return evicted
+        used = self.memory_bytes()
+        for key in list(self._entries.keys()):
+            if used <= self.max_bytes:
+                break
+            entry = self._entries[key]
+            if entry.ref_count > 0:
+                continue
+            self.logger.info(f"Evicting idle model {key} (~{entry.memory_bytes / 1024 / 1024:.1f} MB) to fit budget.")
+            del self._entries[key]
+            evicted.append(entry)
+            used -= entry.memory_bytes
+            self.evictions += 1
+        if used > self.max_bytes:
+            self.logger.warning(f"Model cache uses ~{used / 1024 / 1024:.1f} MB, over budget, but every remaining model is in use.")
+        return evicted
+
+    def _stop_evicted(self, evicted):
+        """Stops the schedulers of evicted entries. Called without the lock held."""
+        for entry in evicted:
+            entry.scheduler.stop(timeout=THREAD_JOIN_TIMEOUT_SECONDS)
+
+    def get_stats(self):
+        """
+        Returns cache counters and per-model details for the status API.
+        """
+        with self._lock:
+            models = [{
+                "key": entry.key,
+                "refCount": entry.ref_count,
+                "replicas": entry.pool.replica_count,
+                "memoryBytes": entry.memory_bytes,
+                "lastUsed": entry.last_used
+            } for entry in self._entries.values()]
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "loadedModels": len(self._entries),
+                "memoryBytes": self.memory_bytes(),
+                "maxBytes": self.max_bytes,
+                "models": models
+            }
@@ -0,0 +1,191 @@
+# inference_service/model_pool.py (Standalone with SQLite)
+
+import os
+import threading
+import logging
+import queue
+import contextlib
+from ultralytics import YOLO
+
+from backends import resolve_model_source, BACKEND_PYTORCH
+from text_embeddings import set_classes_cached
+from config import (
+    BEHAVIOR_CLASSES_MAP,
+    MODEL_POOL_SIZE, MODEL_POOL_MAX_REPLICAS, MODEL_POOL_CORES_PER_REPLICA
+)
+
+logger = logging.getLogger(__name__)
+
+def load_behavior_model(behavior_code):
+    """
+    加载behavior_code对应的YOLO模型，并设置检测类别（用于创建模型副本或在检测进程中加载模型）
+    根据该behavior配置的推理后端加载PyTorch权重、ONNX模型或OpenVINO IR，三者返回相同格式的Results
+
+    Args:
+        behavior_code (str): 行为代码
+
+    Returns:
+        YOLO: 新加载的YOLO模型实例
+
+    Raises:
+        Exception: 如果模型加载失败
+    """
+    classes = BEHAVIOR_CLASSES_MAP.get(behavior_code)
+    model_path, backend = resolve_model_source(behavior_code)
+
+    logger.info(f"Loading YOLO model for behavior {behavior_code} with {backend} backend: {model_path}")
+    if backend != BACKEND_PYTORCH:
+        # 导出的模型已包含检测类别，无需再次设置
+        return YOLO(model_path, task="detect")
+
+    model = YOLO(model_path)
+
+    # 如果该behavior配置了特定类别，设置模型检测类别
+    if classes:
+        logger.info(f"Setting model classes for behavior {behavior_code}: {classes}")
+        try:
+            # 类别文本向量优先从磁盘缓存读取，避免每次加载都运行CLIP文本编码器
+            set_classes_cached(model, model_path, classes)
+            logger.info(f"Successfully set model classes: {classes}")
+        except Exception as e:
+            logger.warning(f"Failed to set classes for model {model_path}: {e}")
+            logger.warning("Model will use default classes")
+    return model
+
+def get_default_pool_size():
+    """
+    Returns the number of model replicas to keep per cache key.
+    Uses MODEL_POOL_SIZE when configured, otherwise sizes the pool from the
+    available CPU cores (one replica per MODEL_POOL_CORES_PER_REPLICA cores).
+    """
+    if MODEL_POOL_SIZE:
+        return max(1, int(MODEL_POOL_SIZE))
+    cpu_count = os.cpu_count() or 1
+    return max(1, min(MODEL_POOL_MAX_REPLICAS, cpu_count // max(1, MODEL_POOL_CORES_PER_REPLICA)))
+
+def limit_torch_threads(replicas):
+    """
+    Limits torch's intra-op thread pool so that `replicas` concurrently running
+    replicas share the CPU cores instead of each using all of them (the in-process
+    counterpart of the detector workers' _init_worker). The limit is process-wide
+    and only ever lowered, so the largest pool decides.
+    """
+    threads = max(1, (os.cpu_count() or 1) // max(1, int(replicas)))
+    try:
+        import torch
+        if torch.get_num_threads() > threads:
+            torch.set_num_threads(threads)
+            logger.info(f"Limited torch intra-op threads to {threads} for {replicas} model replica(s).")
+    except Exception as e:
+        logger.warning(f"Failed to limit torch threads for model replicas: {e}")
+
+def estimate_model_bytes(model):
+    """
+    Estimates the resident size of one loaded model from its parameters and
+    buffers, falling back to the size of the weights file, or for exported
+    ONNX/OpenVINO models (whose model.model is the artifact path) to the size
+    of the exported file or directory.
+    """
+    try:
+        module = model.model
+        tensors = list(module.parameters()) + list(module.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    except Exception:
+        pass
+    for path in (getattr(model, "ckpt_path", None), getattr(model, "model", None)):
+        if isinstance(path, (str, os.PathLike)) and os.path.exists(path):
+            return _path_bytes(path)
+    return 0
+
+def _path_bytes(path):
+    """Size of a file, or the total size of the files in a directory (e.g. an OpenVINO IR)."""
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path) for name in names
+    )
+
+class ModelPool:
+    """
+    Thread-safe pool of model replicas for one (model_path, classes) key.
+    Each inference checks a replica out, so no two threads ever call the
+    same YOLO object (and its predictor state) at the same time.
+    同一模型的多个副本，每次推理独占一个副本
+    """
+    def __init__(self, name, factory, size):
+        """
+        Initializes the pool and loads the first replica immediately so that
+        loading errors surface to the caller. Further replicas are loaded on
+        demand, only when every existing replica is busy.
+
+        Args:
+            name (str): Name used in log messages (usually the model cache key).
+            factory (callable): Zero-argument function returning a new, ready-to-use model replica.
+            size (int): Maximum number of replicas held by the pool.
+        """
+        self.name = name
+        self.size = max(1, int(size))
+        self._factory = factory
+        self.logger = logging.getLogger(f"[{self.name}] {self.__class__.__name__}")
+
+        self._available = queue.Queue()
+        self._lock = threading.Lock()
+        self._replicas = []
+        if self.size > 1:
+            limit_torch_threads(self.size)
+        self._add_replica()
+        self.replica_bytes = estimate_model_bytes(self._replicas[0])
+        self.logger.info(f"Model pool created with up to {self.size} replica(s).")
+
+    @property
+    def replica_count(self):
+        """Number of replicas loaded so far."""
+        return len(self._replicas)
+
+    @property
+    def memory_bytes(self):
+        """Estimated resident size of all loaded replicas."""
+        return self.replica_bytes * len(self._replicas)
+
+    @property
+    def names(self):
+        """Class names of the model (identical for every replica)."""
+        return getattr(self._replicas[0], "names", {})
+
+    def _add_replica(self):
+        """Loads one more replica and makes it available."""
+        replica = self._factory()
+        self._replicas.append(replica)
+        self._available.put(replica)
+        self.logger.info(f"Loaded model replica {len(self._replicas)}/{self.size}.")
+
+    @contextlib.contextmanager
+    def checkout(self, timeout=None):
+        """
+        Checks out a replica for exclusive use.
+
+        Args:
+            timeout (float | None): How long to wait for a free replica.
+
+        Yields:
+            The model replica. It is returned to the pool on exit.
+
+        Raises:
+            queue.Empty: If no replica became free within the timeout.
+        """
+        try:
+            replica = self._available.get_nowait()
+        except queue.Empty:
+            # All replicas busy: grow the pool if allowed, then wait for a free one
+            with self._lock:
+                if len(self._replicas) < self.size:
+                    try:
+                        self._add_replica()
+                    except Exception as e:
+                        self.logger.warning(f"Failed to load additional model replica: {e}")
+            replica = self._available.get(timeout=timeout)
+        try:
+            yield replica
+        finally:
+            self._available.put(replica)
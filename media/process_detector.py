@@ -0,0 +1,303 @@
+# inference_service/process_detector.py (Standalone with SQLite)
+
+import logging
+import queue
+import threading
+import collections
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from config import DETECTOR_PROCESS_THREADS_PER_WORKER
+
+logger = logging.getLogger(__name__)
+
+# --- Worker process side ---
+
+# Models loaded inside this worker process, keyed by behavior code
+_worker_models = {}
+# Shared memory blocks attached by this worker process, keyed by name (least recently used first)
+_worker_blocks = collections.OrderedDict()
+# Most blocks kept attached per worker (two per control ring); older ones are closed
+_WORKER_MAX_BLOCKS = 32
+
+def _init_worker():
+    """Initializer for detector worker processes."""
+    if DETECTOR_PROCESS_THREADS_PER_WORKER:
+        try:
+            import torch
+            torch.set_num_threads(DETECTOR_PROCESS_THREADS_PER_WORKER)
+        except Exception as e:
+            logger.warning(f"Failed to limit torch threads in detector worker: {e}")
+
+def _get_worker_model(behavior_code):
+    """Returns the model for a behavior, loading it once per worker process."""
+    model = _worker_models.get(behavior_code)
+    if model is None:
+        # Imported here so the parent process does not need ultralytics loaded for this module
+        from model_pool import load_behavior_model
+        model = load_behavior_model(behavior_code)
+        _worker_models[behavior_code] = model
+    return model
+
+def _attach_block(name):
+    """Returns the shared memory block with the given name, attaching it once per worker process."""
+    block = _worker_blocks.get(name)
+    if block is not None:
+        _worker_blocks.move_to_end(name)
+        return block
+    block = shared_memory.SharedMemory(name=name)
+    _worker_blocks[name] = block
+    while len(_worker_blocks) > _WORKER_MAX_BLOCKS:
+        # Mostly blocks of replaced or closed rings, whose memory is only freed once every process detaches
+        _, stale = _worker_blocks.popitem(last=False)
+        try:
+            stale.close()
+        except Exception as e:
+            logger.warning(f"Error detaching shared memory block {stale.name}: {e}")
+    return block
+
+def _detect_in_worker(behavior_code, input_name, output_name, offset, shapes, annotate=True, predict_kwargs=None):
+    """
+    Runs detection on the images stored back to back in a shared memory slot
+    (e.g. the ROI crops or tiles of one frame) in a single model call, and
+    writes the annotated images into the matching output slot.
+
+    Args:
+        behavior_code (str): Selects the model used by this worker.
+        input_name (str): Name of the shared memory block holding input frames.
+        output_name (str): Name of the shared memory block receiving annotated frames.
+        offset (int): Byte offset of the slot in both blocks.
+        shapes (list[tuple]): Shapes of the uint8 BGR images, in the order they are stored in the slot.
+        annotate (bool): Whether to draw the detections into the output slot.
+        predict_kwargs (dict | None): Extra model call arguments (e.g. classes, conf, iou).
+
+    Returns:
+        tuple[list, dict]: Raw detections [x1, y1, x2, y2, confidence, class_id] for each image,
+                           and the model's class id to name mapping.
+    """
+    model = _get_worker_model(behavior_code)
+    # Attachments are cached: mapping the blocks on every frame costs two syscalls and a page-table setup each
+    input_shm = _attach_block(input_name)
+    output_shm = _attach_block(output_name)
+
+    # Copy out of shared memory so the model (which keeps references to its
+    # last input) never holds a view that would block closing the block
+    images = []
+    for shape, image_offset in zip(shapes, _image_offsets(offset, shapes)):
+        slot = np.ndarray(shape, dtype=np.uint8, buffer=input_shm.buf, offset=image_offset)
+        images.append(slot.copy())
+        del slot
+
+    results = model(images, verbose=False, **(predict_kwargs or {}))
+    outputs = []
+    for i, (shape, image_offset) in enumerate(zip(shapes, _image_offsets(offset, shapes))):
+        result = results[i] if results is not None and i < len(results) else None
+        # A NumPy array pickles back to the parent much faster than nested lists
+        outputs.append(result.boxes.data.cpu().numpy() if result else [])
+        if annotate:
+            annotated_image = result.plot() if result else images[i]
+            annotated = np.ndarray(shape, dtype=np.uint8, buffer=output_shm.buf, offset=image_offset)
+            annotated[:] = annotated_image
+            del annotated
+    return outputs, dict(model.names)
+
+def _image_offsets(offset, shapes):
+    """Byte offsets of images stored back to back from offset."""
+    offsets = []
+    for shape in shapes:
+        offsets.append(offset)
+        offset += int(np.prod(shape))
+    return offsets
+
+# --- Parent process side ---
+
+class SharedFrameRing:
+    """
+    Ring of fixed-size shared memory slots used to hand frames to detector
+    worker processes (input block) and get annotated frames back (output block)
+    without pickling pixel data.
+    """
+    def __init__(self, slot_count, slot_bytes):
+        """
+        Args:
+            slot_count (int): Number of slots in the ring.
+            slot_bytes (int): Size of one slot in bytes (large enough for one frame).
+        """
+        self.slot_count = max(1, int(slot_count))
+        self.slot_bytes = int(slot_bytes)
+        self.input_shm = shared_memory.SharedMemory(create=True, size=self.slot_count * self.slot_bytes)
+        self.output_shm = shared_memory.SharedMemory(create=True, size=self.slot_count * self.slot_bytes)
+        self._free_slots = queue.Queue()
+        for index in range(self.slot_count):
+            self._free_slots.put(index)
+        self._lock = threading.Lock()
+        self._busy = 0  # Slots acquired and not yet released (possibly still written by a worker)
+        self._closing = False
+        self._closed = False
+
+    def acquire(self, timeout=None):
+        """Returns the index of a free slot. Raises queue.Empty on timeout."""
+        index = self._free_slots.get(timeout=timeout)
+        with self._lock:
+            self._busy += 1
+        return index
+
+    def release(self, index):
+        """Returns a slot to the ring; the last one returned closes a ring marked by close_when_idle()."""
+        with self._lock:
+            self._busy -= 1
+            close = self._closing and self._busy == 0
+        self._free_slots.put(index)
+        if close:
+            self.close()
+
+    def close_when_idle(self):
+        """
+        Closes the ring once no slot is in use: a worker whose result timed out may
+        still be writing into its slot, and keeps it until its future completes.
+        """
+        with self._lock:
+            self._closing = True
+            close = self._busy == 0
+        if close:
+            self.close()
+
+    def offset(self, index):
+        """Byte offset of a slot in both shared memory blocks."""
+        return index * self.slot_bytes
+
+    def input_view(self, index, shape, image_offset=0):
+        """NumPy view on (an image at image_offset bytes into) the input slot (caller must drop it before close())."""
+        return np.ndarray(shape, dtype=np.uint8, buffer=self.input_shm.buf, offset=self.offset(index) + image_offset)
+
+    def output_view(self, index, shape, image_offset=0):
+        """NumPy view on (an image at image_offset bytes into) the output slot (caller must drop it before close())."""
+        return np.ndarray(shape, dtype=np.uint8, buffer=self.output_shm.buf, offset=self.offset(index) + image_offset)
+
+    def close(self):
+        """Closes and unlinks both shared memory blocks."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        for shm in (self.input_shm, self.output_shm):
+            try:
+                shm.close()
+                shm.unlink()
+            except Exception as e:
+                logger.warning(f"Error releasing shared memory block {shm.name}: {e}")
+
+class ProcessDetectorPool:
+    """
+    Pool of detector worker processes. Frames are passed through per-control
+    shared memory rings; only detections come back through the result pipe,
+    while the annotated frame is written into the ring's output slot.
+    Opt-in alternative to the threaded InferenceScheduler for using more
+    than one core for inference, NMS and plotting.
+    多进程检测池：帧通过共享内存传递，规避GIL限制
+    """
+    def __init__(self, max_workers, ring_slots):
+        """
+        Args:
+            max_workers (int): Number of detector worker processes.
+            ring_slots (int): Number of shared memory slots per control ring.
+        """
+        self.max_workers = max(1, int(max_workers))
+        self.ring_slots = ring_slots
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._executor = None
+        self._lock = threading.Lock()
+        # Class names reported by the workers, keyed by behavior code
+        self.names = {}
+
+    def _get_executor(self):
+        """Starts the worker processes on first use."""
+        with self._lock:
+            if self._executor is None:
+                # spawn avoids forking a process that already runs many threads
+                context = multiprocessing.get_context("spawn")
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context, initializer=_init_worker)
+                self.logger.info(f"Detector process pool started with {self.max_workers} worker(s).")
+            return self._executor
+
+    def ensure_ring(self, ring, images):
+        """
+        Returns a ring whose slots fit the images stored back to back, replacing
+        the given ring (which may be None) if it is missing or too small.
+        """
+        slot_bytes = sum(image.nbytes for image in images)
+        if ring is not None and slot_bytes <= ring.slot_bytes:
+            return ring
+        if ring is not None:
+            # Timed-out requests may still be running on the old ring's slots
+            ring.close_when_idle()
+        return SharedFrameRing(self.ring_slots, slot_bytes)
+
+    def detect(self, ring, behavior_code, frame, timeout=None, annotate=True, predict_kwargs=None):
+        """
+        Runs detection for one frame in a worker process; see detect_many().
+
+        Returns:
+            tuple[np.ndarray | None, np.ndarray | list]: The annotated frame and the raw detections.
+        """
+        return self.detect_many(ring, behavior_code, [frame], timeout, annotate, predict_kwargs)[0]
+
+    def detect_many(self, ring, behavior_code, images, timeout=None, annotate=True, predict_kwargs=None):
+        """
+        Runs detection for a group of images (e.g. the ROI crops or tiles of one
+        frame) in one worker call and one model call. The images share one ring
+        slot, stored back to back.
+
+        Args:
+            ring (SharedFrameRing): The calling control's shared memory ring (see ensure_ring()).
+            behavior_code (str): Selects the model used in the worker.
+            images (list[np.ndarray]): The uint8 BGR images.
+            timeout (float | None): How long to wait for a free slot and for the result.
+            annotate (bool): Whether the worker should draw the detections. When False
+                             the returned images are None (e.g. for ROI crops).
+            predict_kwargs (dict | None): Extra model call arguments (e.g. classes, conf, iou).
+
+        Returns:
+            list[tuple[np.ndarray | None, np.ndarray | list]]: The annotated image and the raw
+                                                               detections of each image.
+        """
+        shapes = [image.shape for image in images]
+        index = ring.acquire(timeout=timeout)
+        future = None
+        try:
+            offsets = _image_offsets(0, shapes)
+            for image, image_offset in zip(images, offsets):
+                slot = ring.input_view(index, image.shape, image_offset)
+                np.copyto(slot, image)
+                del slot
+
+            future = self._get_executor().submit(
+                _detect_in_worker, behavior_code,
+                ring.input_shm.name, ring.output_shm.name, ring.offset(index), shapes, annotate, predict_kwargs
+            )
+            detections, self.names[behavior_code] = future.result(timeout=timeout)
+            if not annotate:
+                return [(None, image_detections) for image_detections in detections]
+
+            # The slot is reused for the next frame, so take the annotated images out of it
+            outputs = []
+            for shape, image_offset, image_detections in zip(shapes, offsets, detections):
+                annotated_view = ring.output_view(index, shape, image_offset)
+                outputs.append((annotated_view.copy(), image_detections))
+                del annotated_view
+            return outputs
+        finally:
+            if future is not None and not future.done():
+                # The worker still owns the slot (we timed out); free it once the worker is done
+                future.add_done_callback(lambda _: ring.release(index))
+            else:
+                ring.release(index)
+
+    def shutdown(self):
+        """Stops the worker processes."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
@@ -0,0 +1,270 @@
+# inference_service/quantization.py (Standalone with SQLite)
+
+import sys
+import time
+import logging
+import argparse
+import cv2
+import numpy as np
+
+from config import (
+    BEHAVIOR_MODEL_MAP, BEHAVIOR_CLASSES_MAP, DEFAULT_MODEL_PATH, INFERENCE_IMGSZ,
+    INT8_CALIBRATION_VIDEO, INT8_CALIBRATION_FRAMES
+)
+from tracker import box_iou
+
+logger = logging.getLogger(__name__)
+
+def read_video_frames(video_path, frame_count):
+    """
+    Reads up to frame_count frames spread evenly over a local video file.
+
+    Args:
+        video_path (str): Path to the video (e.g. data/test.mp4).
+        frame_count (int): Number of frames to read.
+
+    Returns:
+        list[np.ndarray]: The BGR frames (empty if the video cannot be read).
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        logger.warning(f"Cannot open video {video_path}")
+        return []
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    step = max(1, total // frame_count) if total > 0 else 1
+    frames = []
+    index = 0
+    try:
+        while len(frames) < frame_count:
+            ret, frame = cap.read()
+            if not ret or frame is None:
+                break
+            if index % step == 0:
+                frames.append(frame)
+            index += 1
+    finally:
+        cap.release()
+    return frames
+
+def preprocess_for_onnx(frame, imgsz=INFERENCE_IMGSZ):
+    """
+    Letterboxes a BGR frame the way ultralytics feeds exported models:
+    imgsz x imgsz, gray padding, RGB, NCHW float32 in 0-1.
+    """
+    height, width = frame.shape[:2]
+    scale = min(imgsz / height, imgsz / width)
+    resized = cv2.resize(frame, (int(round(width * scale)), int(round(height * scale))), interpolation=cv2.INTER_LINEAR)
+    canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    top = (imgsz - resized.shape[0]) // 2
+    left = (imgsz - resized.shape[1]) // 2
+    canvas[top:top + resized.shape[0], left:left + resized.shape[1]] = resized
+    return np.ascontiguousarray(canvas[:, :, ::-1].transpose(2, 0, 1)[None], dtype=np.float32) / 255.0
+
+class _VideoCalibrationReader:
+    """ONNX Runtime calibration data reader over frames of a local clip."""
+    def __init__(self, input_name, frames):
+        self._inputs = iter([{input_name: preprocess_for_onnx(frame)} for frame in frames])
+
+    def get_next(self):
+        return next(self._inputs, None)
+
+def quantize_onnx_model(fp32_path, int8_path, calibration_video=INT8_CALIBRATION_VIDEO,
+                        calibration_frames=INT8_CALIBRATION_FRAMES):
+    """
+    Produces an INT8 ONNX model from an exported FP32 ONNX model.
+    Uses static quantization calibrated on frames of a local clip when it is
+    available, otherwise dynamic (weight-only) quantization.
+
+    Args:
+        fp32_path (str): The exported FP32 .onnx model.
+        int8_path (str): Where to write the INT8 .onnx model.
+        calibration_video (str): Local clip used for calibration.
+        calibration_frames (int): Number of calibration frames.
+
+    Returns:
+        str: "static" or "dynamic", the quantization method used.
+
+    Raises:
+        Exception: If quantization fails.
+    """
+    # Imported here so that only processes that actually quantize need onnxruntime
+    import onnxruntime
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_dynamic, quantize_static
+
+    frames = read_video_frames(calibration_video, calibration_frames) if calibration_video else []
+    if not frames:
+        logger.warning(f"No calibration frames from {calibration_video}, using dynamic quantization for {fp32_path}")
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QUInt8)
+        return "dynamic"
+
+    input_name = onnxruntime.InferenceSession(fp32_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    logger.info(f"Calibrating INT8 quantization of {fp32_path} on {len(frames)} frame(s) from {calibration_video}")
+    quantize_static(
+        fp32_path, int8_path, _VideoCalibrationReader(input_name, frames),
+        quant_format=QuantFormat.QDQ, activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8, per_channel=True
+    )
+    return "static"
+
+def _average_precision(scores, true_positives, reference_count):
+    """All-points interpolated AP of predictions (scores, TP flags) against reference_count references."""
+    if reference_count == 0:
+        return 1.0 if len(scores) == 0 else 0.0
+    order = np.argsort(-np.asarray(scores))
+    tp = np.asarray(true_positives, dtype=np.float64)[order]
+    cumulative_tp = np.cumsum(tp)
+    recall = cumulative_tp / reference_count
+    precision = cumulative_tp / np.arange(1, len(tp) + 1)
+    recall = np.concatenate([[0.0], recall, [1.0]])
+    precision = np.concatenate([[1.0], precision, [0.0]])
+    precision = np.maximum.accumulate(precision[::-1])[::-1]
+    return float(np.sum((recall[1:] - recall[:-1]) * precision[1:]))
+
+def compare_detections(reference, candidate, iou_threshold=0.5):
+    """
+    Matches candidate detections against reference detections of the same frame.
+
+    Args:
+        reference (list): FP32 detections ([x1, y1, x2, y2, confidence, class_id] each).
+        candidate (list): INT8 detections in the same format.
+        iou_threshold (float): Minimum IoU for a match.
+
+    Returns:
+        tuple[list, list, list]: Candidate scores, their true-positive flags, and the IoUs of the matches.
+    """
+    ref = np.asarray([det[:6] for det in reference], dtype=np.float64).reshape(-1, 6)
+    cand = np.asarray([det[:6] for det in candidate], dtype=np.float64).reshape(-1, 6)
+    iou = box_iou(cand[:, :4], ref[:, :4])
+    if iou.size:
+        iou[cand[:, 5][:, None] != ref[:, 5][None, :]] = 0.0
+
+    order = np.argsort(-cand[:, 4])
+    matched_refs = set()
+    flags, matched_ious = [], []
+    for i in order:
+        best = -1
+        if iou.size:
+            for j in np.argsort(-iou[i]):
+                if iou[i, j] < iou_threshold:
+                    break
+                if j not in matched_refs:
+                    best = j
+                    break
+        if best >= 0:
+            matched_refs.add(best)
+            matched_ious.append(float(iou[i, best]))
+        flags.append(bool(best >= 0))
+    return cand[order, 4].tolist(), flags, matched_ious
+
+def _time_inference(model, frames):
+    """Runs a model on each frame; returns detections per frame and latencies in milliseconds."""
+    model(frames[0], verbose=False)  # Warm-up, not timed
+    detections, latencies = [], []
+    for frame in frames:
+        started = time.perf_counter()
+        results = model(frame, verbose=False)
+        latencies.append((time.perf_counter() - started) * 1000.0)
+        detections.append(results[0].boxes.data.tolist() if results and results[0] else [])
+    return detections, latencies
+
+def build_quantization_report(behavior_code, video_path=INT8_CALIBRATION_VIDEO, frame_count=100):
+    """
+    Compares the INT8 model of a behavior with its FP32 PyTorch model on the
+    same frames: agreement with the FP32 detections (AP50 with the FP32 boxes
+    as reference, precision, recall, mean IoU) and per-frame latency.
+
+    Args:
+        behavior_code (str): 行为代码
+        video_path (str): Local clip to evaluate on.
+        frame_count (int): Number of frames evaluated.
+
+    Returns:
+        dict: The report.
+    """
+    from ultralytics import YOLO
+    from backends import BACKEND_ONNX_INT8, ensure_exported_model
+    from text_embeddings import set_classes_cached
+
+    frames = read_video_frames(video_path, frame_count)
+    if not frames:
+        raise RuntimeError(f"No frames could be read from {video_path}")
+
+    model_path = BEHAVIOR_MODEL_MAP.get(behavior_code, DEFAULT_MODEL_PATH)
+    classes = BEHAVIOR_CLASSES_MAP.get(behavior_code)
+    fp32_model = YOLO(model_path)
+    if classes:
+        set_classes_cached(fp32_model, model_path, classes)
+    int8_path = ensure_exported_model(model_path, BACKEND_ONNX_INT8, classes)
+    int8_model = YOLO(int8_path, task="detect")
+
+    fp32_detections, fp32_latencies = _time_inference(fp32_model, frames)
+    int8_detections, int8_latencies = _time_inference(int8_model, frames)
+
+    scores, flags, ious = [], [], []
+    for reference, candidate in zip(fp32_detections, int8_detections):
+        frame_scores, frame_flags, frame_ious = compare_detections(reference, candidate)
+        scores.extend(frame_scores)
+        flags.extend(frame_flags)
+        ious.extend(frame_ious)
+    reference_count = sum(len(dets) for dets in fp32_detections)
+    true_positives = sum(flags)
+
+    def latency_stats(latencies):
+        return {
+            "meanMs": float(np.mean(latencies)),
+            "p50Ms": float(np.percentile(latencies, 50)),
+            "p95Ms": float(np.percentile(latencies, 95)),
+        }
+
+    return {
+        "behaviorCode": behavior_code,
+        "fp32Model": model_path,
+        "int8Model": int8_path,
+        "video": video_path,
+        "frames": len(frames),
+        "fp32Detections": reference_count,
+        "int8Detections": len(flags),
+        "ap50VsFp32": _average_precision(scores, flags, reference_count),
+        "precisionVsFp32": true_positives / len(flags) if flags else 1.0,
+        "recallVsFp32": true_positives / reference_count if reference_count else 1.0,
+        "meanMatchedIou": float(np.mean(ious)) if ious else 0.0,
+        "fp32Latency": latency_stats(fp32_latencies),
+        "int8Latency": latency_stats(int8_latencies),
+        "speedup": float(np.mean(fp32_latencies) / max(np.mean(int8_latencies), 1e-6)),
+    }
+
+if __name__ == "__main__":
+    # INT8量化：生成/缓存量化模型，并与FP32模型对比检测一致性和单帧延迟
+    # Usage: python quantization.py build [--behavior CODE ...]
+    #        python quantization.py report --behavior CODE [--video data/test.mp4] [--frames 100]
+    parser = argparse.ArgumentParser(description="Build INT8 ONNX models and compare them with FP32.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="Export and quantize the INT8 model of each behavior")
+    build_parser.add_argument("--behavior", action="append", help="Behavior code (repeatable, default: all in BEHAVIOR_MODEL_MAP)")
+    report_parser = subparsers.add_parser("report", help="Compare INT8 with FP32 accuracy and latency on a local clip")
+    report_parser.add_argument("--behavior", action="append", help="Behavior code (repeatable, default: all in BEHAVIOR_MODEL_MAP)")
+    report_parser.add_argument("--video", default=INT8_CALIBRATION_VIDEO, help="Local clip to evaluate on")
+    report_parser.add_argument("--frames", type=int, default=100, help="Number of frames evaluated")
+    args = parser.parse_args()
+
+    from backends import BACKEND_ONNX_INT8, ensure_exported_model
+
+    failed = False
+    for behavior_code in args.behavior or list(BEHAVIOR_MODEL_MAP.keys()):
+        try:
+            if args.command == "build":
+                model_path = BEHAVIOR_MODEL_MAP.get(behavior_code, DEFAULT_MODEL_PATH)
+                int8_path = ensure_exported_model(model_path, BACKEND_ONNX_INT8, BEHAVIOR_CLASSES_MAP.get(behavior_code))
+                print(f"  - {behavior_code}: {int8_path}")
+            else:
+                report = build_quantization_report(behavior_code, args.video, args.frames)
+                print(f"{behavior_code}: {report['frames']} frames from {report['video']}")
+                print(f"  AP50 vs FP32: {report['ap50VsFp32']:.3f}  precision: {report['precisionVsFp32']:.3f}  "
+                      f"recall: {report['recallVsFp32']:.3f}  mean IoU: {report['meanMatchedIou']:.3f}")
+                print(f"  FP32 latency: {report['fp32Latency']['meanMs']:.1f} ms (p95 {report['fp32Latency']['p95Ms']:.1f} ms)")
+                print(f"  INT8 latency: {report['int8Latency']['meanMs']:.1f} ms (p95 {report['int8Latency']['p95Ms']:.1f} ms)")
+                print(f"  Speedup: {report['speedup']:.2f}x")
+        except Exception as e:
+            failed = True
+            print(f"  - {behavior_code}: error: {e}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,187 @@
+# inference_service/regions.py (Standalone with SQLite)
+
+import math
+import logging
+import functools
+import cv2
+import numpy as np
+from behaviors.detections import Detections
+
+logger = logging.getLogger(__name__)
+
+def parse_rois(raw_rois):
+    """
+    Parses the regions of interest of a control.
+    Each ROI is either a rectangle [x1, y1, x2, y2] or a polygon
+    [[x, y], [x, y], [x, y], ...], with coordinates normalized to 0-1 of the
+    frame width/height so they do not depend on the stream resolution.
+
+    Args:
+        raw_rois (list | None): ROI definitions as received from the API.
+
+    Returns:
+        list: One polygon per ROI, each a list of normalized (x, y) tuples.
+              Empty if no ROI is configured (whole frame is analyzed).
+
+    Raises:
+        ValueError: If an ROI is malformed.
+    """
+    if not raw_rois:
+        return []
+    if not isinstance(raw_rois, list):
+        raise ValueError("roi must be a list of rectangles or polygons")
+
+    polygons = []
+    for roi in raw_rois:
+        if isinstance(roi, list) and len(roi) == 4 and all(isinstance(v, (int, float)) for v in roi):
+            x1, y1, x2, y2 = (float(v) for v in roi)
+            points = [(x1, y1), (x2, y1), (x2, y2), (x1, y2)]
+        elif isinstance(roi, list) and len(roi) >= 3 and all(isinstance(p, list) and len(p) == 2 for p in roi):
+            points = [(float(p[0]), float(p[1])) for p in roi]
+        else:
+            raise ValueError(f"Invalid roi {roi}: expected [x1, y1, x2, y2] or [[x, y], ...]")
+
+        if not all(0.0 <= v <= 1.0 for point in points for v in point):
+            raise ValueError(f"Invalid roi {roi}: coordinates must be normalized to 0-1")
+        xs = [p[0] for p in points]
+        ys = [p[1] for p in points]
+        if max(xs) <= min(xs) or max(ys) <= min(ys):
+            raise ValueError(f"Invalid roi {roi}: region has no area")
+        polygons.append(points)
+    return polygons
+
+class RoiLayout:
+    """
+    Pixel layout of a control's ROIs for one frame size: the padded crop
+    rectangle of each ROI and its polygon for filtering detections.
+    """
+    def __init__(self, polygons, width, height, padding=0):
+        """
+        Args:
+            polygons (list): Normalized ROI polygons from parse_rois().
+            width (int): Frame width in pixels.
+            height (int): Frame height in pixels.
+            padding (int): Pixels added around each crop so objects on the ROI edge are not cut.
+        """
+        self.crops = []
+        self.polygons = []
+        for points in polygons:
+            pixel_points = np.array([(x * width, y * height) for x, y in points], dtype=np.float32)
+            x1 = max(0, int(np.floor(pixel_points[:, 0].min())) - padding)
+            y1 = max(0, int(np.floor(pixel_points[:, 1].min())) - padding)
+            x2 = min(width, int(np.ceil(pixel_points[:, 0].max())) + padding)
+            y2 = min(height, int(np.ceil(pixel_points[:, 1].max())) + padding)
+            self.crops.append((x1, y1, x2, y2))
+            self.polygons.append(pixel_points)
+
+    def draw(self, frame, color=(0, 200, 255)):
+        """Draws the ROI outlines on a frame in place."""
+        for polygon in self.polygons:
+            cv2.polylines(frame, [polygon.astype(np.int32)], True, color, 2)
+        return frame
+
+def _tile_starts(length, tile_size, overlap_pixels):
+    """Evenly spaced tile start positions covering [0, length) with at least overlap_pixels overlap."""
+    if length <= tile_size:
+        return [0]
+    count = math.ceil((length - overlap_pixels) / float(tile_size - overlap_pixels))
+    count = max(2, count)
+    step = (length - tile_size) / float(count - 1)
+    return [int(round(i * step)) for i in range(count)]
+
+@functools.lru_cache(maxsize=64)
+def get_tile_layout(width, height, tile_size, overlap):
+    """
+    Returns the overlapping tiles covering an image of the given size.
+    Cached per (resolution, tile size, overlap) so the layout is computed
+    once per stream instead of on every frame.
+
+    Args:
+        width (int): Image width in pixels.
+        height (int): Image height in pixels.
+        tile_size (int): Tile edge length in pixels (usually the model input size).
+        overlap (float): Overlap between neighbouring tiles as a fraction of tile_size (0-1).
+
+    Returns:
+        tuple: (x1, y1, x2, y2) tile rectangles, row by row.
+    """
+    tile_size = max(1, int(tile_size))
+    overlap_pixels = int(tile_size * min(max(float(overlap), 0.0), 0.9))
+    tile_width = min(tile_size, width)
+    tile_height = min(tile_size, height)
+    return tuple(
+        (x, y, x + tile_width, y + tile_height)
+        for y in _tile_starts(height, tile_height, overlap_pixels)
+        for x in _tile_starts(width, tile_width, overlap_pixels)
+    )
+
+def as_detection_array(detections):
+    """
+    Raw detections as an (N, 6) or (N, 7) float32 array ([x1, y1, x2, y2, confidence, class_id],
+    plus track_id when tracking). Arrays that already are float32 are returned without a copy.
+    """
+    array = np.asarray(detections, dtype=np.float32)
+    return array.reshape(-1, array.shape[-1] if array.ndim == 2 else 6)
+
+def offset_detections(detections, dx, dy):
+    """
+    Maps detections from crop coordinates back to full-frame coordinates.
+
+    Args:
+        detections (np.ndarray | list): Raw detections ([x1, y1, x2, y2, confidence, class_id] each) in crop coordinates.
+        dx (int): X offset of the crop in the frame.
+        dy (int): Y offset of the crop in the frame.
+
+    Returns:
+        np.ndarray: The detections in frame coordinates (a new array).
+    """
+    shifted = np.array(as_detection_array(detections))
+    shifted[:, [0, 2]] += dx
+    shifted[:, [1, 3]] += dy
+    return shifted
+
+def filter_detections_in_polygons(detections, polygons):
+    """Keeps the detections (rows of an array) whose box center lies inside at least one polygon."""
+    detections = Detections(as_detection_array(detections))
+    inside = np.zeros(len(detections), dtype=bool)
+    for polygon in polygons:
+        inside |= detections.centers_in_polygon(polygon)
+    return detections.data[inside]
+
+def nms_detections(detections, iou_threshold, metric="iou"):
+    """
+    Class-aware non-maximum suppression over detections gathered from several
+    crops or tiles, removing duplicates of objects seen in overlapping regions.
+
+    Args:
+        detections (np.ndarray | list): Raw detections ([x1, y1, x2, y2, confidence, class_id] each).
+        iou_threshold (float): Boxes of the same class overlapping more than this are suppressed.
+        metric (str): "iou" (intersection over union) or "ios" (intersection over the smaller box).
+                      "ios" also removes the partial boxes of objects cut by a tile edge.
+
+    Returns:
+        np.ndarray: The kept detections, highest confidence first.
+    """
+    boxes = as_detection_array(detections)
+    if len(boxes) < 2:
+        return boxes
+    areas = (boxes[:, 2] - boxes[:, 0]).clip(min=0) * (boxes[:, 3] - boxes[:, 1]).clip(min=0)
+    order = boxes[:, 4].argsort()[::-1]
+
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        xx1 = np.maximum(boxes[i, 0], boxes[rest, 0])
+        yy1 = np.maximum(boxes[i, 1], boxes[rest, 1])
+        xx2 = np.minimum(boxes[i, 2], boxes[rest, 2])
+        yy2 = np.minimum(boxes[i, 3], boxes[rest, 3])
+        intersection = (xx2 - xx1).clip(min=0) * (yy2 - yy1).clip(min=0)
+        if metric == "ios":
+            iou = intersection / np.maximum(np.minimum(areas[i], areas[rest]), 1e-6)
+        else:
+            iou = intersection / np.maximum(areas[i] + areas[rest] - intersection, 1e-6)
+        same_class = boxes[rest, 5] == boxes[i, 5]
+        order = rest[~(same_class & (iou > iou_threshold))]
+    return boxes[keep]
@@ -0,0 +1,78 @@
+# inference_service/stage_stats.py (Standalone with SQLite)
+
+import time
+import threading
+import contextlib
+import numpy as np
+
+# Pipeline stages timed per control
+STAGE_READ = "read"              # cap.read() in the puller (network + decode)
+STAGE_QUEUE_WAIT = "queueWait"   # Time a frame waited between the puller and the detector
+STAGE_INFERENCE = "inference"    # Model call(s) for one frame, including crop/tile merging and tracking
+STAGE_BEHAVIOR = "behavior"      # Behavior logic (evaluate / process_frame)
+STAGE_ANNOTATION = "annotation"  # Drawing the annotations of a frame
+STAGE_PUSH_WRITE = "pushWrite"   # Writing one frame to the FFmpeg push process
+STAGES = (STAGE_READ, STAGE_QUEUE_WAIT, STAGE_INFERENCE, STAGE_BEHAVIOR, STAGE_ANNOTATION, STAGE_PUSH_WRITE)
+
+class LatencyWindow:
+    """Rolling window of the last `size` latencies of one stage, kept in a fixed NumPy ring."""
+    def __init__(self, size):
+        self._samples = np.zeros(max(1, int(size)), dtype=np.float64)
+        self._index = 0
+        self.count = 0  # Total samples recorded (not only those still in the window)
+
+    def record(self, milliseconds):
+        self._samples[self._index] = milliseconds
+        self._index = (self._index + 1) % len(self._samples)
+        self.count += 1
+
+    def summary(self):
+        """Count and mean/p50/p95/p99/max latency in milliseconds over the window."""
+        samples = self._samples[:min(self.count, len(self._samples))]
+        if len(samples) == 0:
+            return {"count": 0, "meanMs": 0.0, "p50Ms": 0.0, "p95Ms": 0.0, "p99Ms": 0.0, "maxMs": 0.0}
+        p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+        return {
+            "count": self.count,
+            "meanMs": float(samples.mean()),
+            "p50Ms": float(p50),
+            "p95Ms": float(p95),
+            "p99Ms": float(p99),
+            "maxMs": float(samples.max()),
+        }
+
+class PipelineStats:
+    """
+    Per-stage latency statistics of one control. Stages are recorded from the
+    puller, detector and pusher threads and read by the API, hence the lock.
+    按阶段统计每个布控的延迟（p50/p95/p99），用于判断瓶颈在解码、模型还是编码推流
+    """
+    def __init__(self, window=1000):
+        """
+        Args:
+            window (int): Number of most recent samples kept per stage.
+        """
+        self._windows = {stage: LatencyWindow(window) for stage in STAGES}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        """Records one latency of a stage, in seconds."""
+        with self._lock:
+            self._windows[stage].record(seconds * 1000.0)
+
+    @contextlib.contextmanager
+    def time(self, stage):
+        """Context manager recording the duration of its block as one sample of a stage."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+    def summary(self):
+        """
+        Returns:
+            dict: Stage name -> {"count", "meanMs", "p50Ms", "p95Ms", "p99Ms", "maxMs"}.
+        """
+        with self._lock:
+            return {stage: window.summary() for stage, window in self._windows.items()}
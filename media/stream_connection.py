@@ -0,0 +1,169 @@
+# inference_service/stream_connection.py (Standalone with SQLite)
+
+import time
+import random
+import threading
+
+from config import (
+    STREAM_RECONNECT_BASE_DELAY_SECONDS, STREAM_RECONNECT_MAX_DELAY_SECONDS, STREAM_RECONNECT_JITTER,
+    STREAM_CONNECTION_STABLE_SECONDS, STREAM_CIRCUIT_BREAKER_FAILURES, STREAM_CIRCUIT_BREAKER_COOLDOWN_SECONDS,
+    STAGE_STATS_WINDOW
+)
+from stage_stats import LatencyWindow
+
+# Connection states
+STATE_CONNECTING = "connecting"  # Opening the stream, waiting for its first frame
+STATE_CONNECTED = "connected"    # Frames are arriving
+STATE_BACKOFF = "backoff"        # Waiting before the next attempt
+STATE_STOPPED = "stopped"
+
+# Circuit breaker states
+CIRCUIT_CLOSED = "closed"        # Retrying with backoff
+CIRCUIT_OPEN = "open"            # Too many consecutive failures: waiting out the cooldown
+CIRCUIT_HALF_OPEN = "halfOpen"   # Cooldown over: one probe attempt
+
+class ConnectionStateMachine:
+    """
+    Reconnect policy and state of one stream source. The first failure of a
+    healthy connection is retried at once (most read failures are one-off
+    glitches); further consecutive failures back off exponentially with
+    jitter, and after STREAM_CIRCUIT_BREAKER_FAILURES of them the circuit
+    opens: no attempts for the cooldown, then a single half-open probe.
+    The time from losing the stream to its next frame is recorded as the
+    reconnect duration.
+    拉流重连状态机：首次失败立即重试，之后指数退避加随机抖动，连续失败过多时熔断
+    """
+    def __init__(self, base_delay=STREAM_RECONNECT_BASE_DELAY_SECONDS, max_delay=STREAM_RECONNECT_MAX_DELAY_SECONDS,
+                 jitter=STREAM_RECONNECT_JITTER, stable_after=STREAM_CONNECTION_STABLE_SECONDS,
+                 breaker_failures=STREAM_CIRCUIT_BREAKER_FAILURES, breaker_cooldown=STREAM_CIRCUIT_BREAKER_COOLDOWN_SECONDS):
+        """
+        Args:
+            base_delay (float): Delay before the second attempt in seconds (doubled per further failure).
+            max_delay (float): Longest backoff delay in seconds.
+            jitter (float): Largest random fraction (0-1) cut from each delay.
+            stable_after (float): Seconds a connection must deliver frames before its failures are forgotten.
+            breaker_failures (int): Consecutive failures that open the circuit.
+            breaker_cooldown (float): Seconds the circuit stays open before the half-open probe.
+        """
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = min(max(jitter, 0.0), 1.0)
+        self.stable_after = stable_after
+        self.breaker_failures = max(1, int(breaker_failures))
+        self.breaker_cooldown = breaker_cooldown
+        # Own generator: sources started together still draw different delays
+        self._random = random.Random()
+        self._lock = threading.Lock()
+
+        self.state = STATE_CONNECTING
+        self.circuit = CIRCUIT_CLOSED
+        self.consecutive_failures = 0
+        self.connected_at = None  # time.monotonic() of the first frame of the current connection
+        self.disconnected_at = None  # time.monotonic() an established stream was lost (None while connected)
+        self.retry_at = None  # time.monotonic() of the next attempt while backing off
+        self.last_error = None
+
+        self.reconnects = 0  # Successful reconnects after losing the stream
+        self.failed_attempts = 0
+        self.circuit_opens = 0
+        self.downtime = 0.0  # Total seconds without frames after the first connection
+        self.last_reconnect_duration = None
+        self._reconnect_durations = LatencyWindow(STAGE_STATS_WINDOW)
+
+    def on_attempt(self):
+        """Called before opening the stream."""
+        with self._lock:
+            self.state = STATE_CONNECTING
+            self.retry_at = None
+
+    def on_frame(self):
+        """Called for every frame read; the first one after an attempt completes the (re)connect."""
+        if self.state == STATE_CONNECTED:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if self.disconnected_at is not None:
+                duration = now - self.disconnected_at
+                self.reconnects += 1
+                self.downtime += duration
+                self.last_reconnect_duration = duration
+                self._reconnect_durations.record(duration * 1000.0)
+                self.disconnected_at = None
+            if self.circuit == CIRCUIT_HALF_OPEN:
+                # The probe succeeded: the next failure starts over instead of reopening the circuit
+                self.consecutive_failures = 0
+            self.state = STATE_CONNECTED
+            self.circuit = CIRCUIT_CLOSED
+            self.connected_at = now
+            self.last_error = None
+
+    def on_failure(self, error=None):
+        """
+        Called when opening the stream or reading a frame failed.
+
+        Args:
+            error (str | None): What failed, for the status.
+
+        Returns:
+            float: Seconds to wait before the next attempt (0 for an immediate retry).
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.state == STATE_CONNECTED:
+                # Lost a working connection: a long-lived one starts over with a clean slate
+                if self.connected_at is not None and now - self.connected_at >= self.stable_after:
+                    self.consecutive_failures = 0
+                self.disconnected_at = now
+            self.connected_at = None
+            self.consecutive_failures += 1
+            self.failed_attempts += 1
+            self.last_error = error
+
+            if self.circuit == CIRCUIT_HALF_OPEN or self.consecutive_failures >= self.breaker_failures:
+                if self.circuit != CIRCUIT_OPEN:
+                    self.circuit_opens += 1
+                self.circuit = CIRCUIT_OPEN
+                delay = self._jittered(self.breaker_cooldown)
+            elif self.consecutive_failures == 1:
+                delay = 0.0
+            else:
+                delay = self._jittered(min(self.max_delay, self.base_delay * 2 ** (self.consecutive_failures - 2)))
+            self.state = STATE_BACKOFF
+            self.retry_at = now + delay
+            return delay
+
+    def on_backoff_elapsed(self):
+        """Called when the delay returned by on_failure() has passed; an open circuit turns half-open."""
+        with self._lock:
+            if self.circuit == CIRCUIT_OPEN:
+                self.circuit = CIRCUIT_HALF_OPEN
+
+    def on_stop(self):
+        with self._lock:
+            self.state = STATE_STOPPED
+            self.retry_at = None
+
+    def _jittered(self, delay):
+        return delay * (1.0 - self.jitter * self._random.random())
+
+    def summary(self):
+        """
+        Returns:
+            dict: State, circuit state, failure and reconnect counters, and reconnect durations.
+        """
+        with self._lock:
+            now = time.monotonic()
+            return {
+                "state": self.state,
+                "circuit": self.circuit,
+                "consecutiveFailures": 0 if self.state == STATE_CONNECTED else self.consecutive_failures,
+                "failedAttempts": self.failed_attempts,
+                "circuitOpens": self.circuit_opens,
+                "reconnects": self.reconnects,
+                "retryInSeconds": max(0.0, self.retry_at - now) if self.retry_at is not None else None,
+                "disconnectedForSeconds": now - self.disconnected_at if self.disconnected_at is not None else 0.0,
+                "downtimeSeconds": self.downtime,
+                "lastReconnectMs": self.last_reconnect_duration * 1000.0 if self.last_reconnect_duration is not None else None,
+                "reconnectDuration": self._reconnect_durations.summary(),
+                "lastError": self.last_error,
+            }
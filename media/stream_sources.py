@@ -0,0 +1,408 @@
+# inference_service/stream_sources.py (Standalone with SQLite)
+
+import time
+import queue
+import logging
+import threading
+import cv2
+
+from config import THREAD_JOIN_TIMEOUT_SECONDS, KEYFRAME_ONLY_ASSUMED_FPS, FFMPEG_INGEST_MAX_BUFFERS
+from ingest import open_capture, FFmpegFrameReader, DecimatingCapture, INGEST_OPENCV, INGEST_FFMPEG
+from stage_stats import STAGE_READ
+from frame_timing import FrameClock
+from stream_connection import ConnectionStateMachine
+
+logger = logging.getLogger(__name__)
+
+class _Subscription:
+    """A control subscribed to a StreamSource, with its own frame-rate decimation."""
+    def __init__(self, code, control):
+        self.code = code
+        self.control = control
+        self.target_fps = _target_fps(control)
+        self.keep_ratio = 1.0
+        self.phase = 1.0
+        # Smoothed interval between delivered frames, reported as the control's analysis rate
+        self.last_received = None
+        self.mean_frame_interval = None
+        # Set once the subscriber has the properties of a capture opened with its settings;
+        # until then it gets no frames (they may be of another size than it was told)
+        self.ready = False
+        # Frames the subscriber's alarm clip buffer holds (pooled ingest buffers it pins)
+        self.clip_frames = 0
+
+    def reset_timing(self):
+        """Forgets the last delivered frame, so a reconnect does not count as a gap."""
+        self.last_received = None
+        self.control["arrival_stats"].reset()
+
+class StreamSource:
+    """
+    One decoder per stream URL. A single puller thread opens the stream and
+    puts every decoded frame into the frame queue of each subscribed control
+    as (frame, FrameTime, FrameLease | None); the same array is shared by all
+    of them (the pipeline never modifies raw frames), so two behaviors on one
+    camera cost one connection and one decode. Frames of the FFmpeg backend
+    are pooled buffers: each queued frame carries a hold on its lease that the
+    consumer must release.
+    The decoder runs at the union of the subscribers' needs (the largest
+    analysis width and frame rate, keyframe-only only if all want it) and is
+    reopened when that changes; each subscriber then drops the frames above
+    its own target rate. Lost streams are reopened by a ConnectionStateMachine
+    (immediate retry, then exponential backoff with jitter and a circuit breaker).
+    共享拉流源：同一路视频流只拉流解码一次，帧分发给所有订阅的布控
+    """
+    def __init__(self, stream_url):
+        """
+        Args:
+            stream_url (str): The stream URL or file path.
+        """
+        self.stream_url = stream_url
+        self.logger = logging.getLogger(f"[{stream_url}] {self.__class__.__name__}")
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._reopen_event = threading.Event()
+        self._thread = None
+        self._properties = None  # (width, height, fps, keyframes_only) of the open capture
+        self._open_settings = None  # Merged decode settings the capture was opened with
+        self._buffers_changed = False  # A subscriber's clip buffer length changed since the pool was sized
+        self.clock = FrameClock()  # Maps the source PTS onto the monotonic clock
+        self.connection = ConnectionStateMachine()  # Reconnect backoff / circuit breaker state
+
+    # --- Subscriptions ---
+
+    def subscribe(self, code, control):
+        """
+        Starts delivering frames to a control's frame_queue (and starts the puller on first use).
+
+        Args:
+            code (str): The control code.
+            control (dict): The control state (stream properties and ingest counters are written to it).
+        """
+        subscription = _Subscription(code, control)
+        with self._lock:
+            self._subscriptions[code] = subscription
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            # The decoder may have to widen its resolution or frame rate for the new subscriber:
+            # then it waits for the reopened capture's properties instead of taking the current ones
+            elif not self._check_settings() and self._properties is not None:
+                self._apply_properties(subscription, *self._properties)
+                subscription.ready = True
+
+    def unsubscribe(self, code):
+        """
+        Stops delivering frames to a control.
+
+        Returns:
+            int: The number of remaining subscribers.
+        """
+        with self._lock:
+            self._subscriptions.pop(code, None)
+            remaining = len(self._subscriptions)
+            if remaining:
+                self._check_settings()
+        return remaining
+
+    def reserve_clip_frames(self, code, clip_frames):
+        """
+        Tells the source how many frames a subscriber's alarm clip buffer holds,
+        so the ingest buffer pool expects them instead of logging its growth.
+
+        Args:
+            code (str): The control code.
+            clip_frames (int): Maximum length of the subscriber's clip buffer.
+        """
+        with self._lock:
+            subscription = self._subscriptions.get(code)
+            if subscription is not None:
+                subscription.clip_frames = int(clip_frames)
+                self._buffers_changed = True
+
+    def _expected_buffers(self):
+        """Pooled buffers the subscribers may hold at once: queued and in-flight frames plus every clip buffer (lock held)."""
+        return FFMPEG_INGEST_MAX_BUFFERS + sum(s.clip_frames for s in self._subscriptions.values())
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscriptions)
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def stop(self, timeout=THREAD_JOIN_TIMEOUT_SECONDS):
+        """Stops the puller thread and releases the capture."""
+        self._stop_event.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=timeout)
+            if self._thread.is_alive():
+                self.logger.warning("Puller thread did not join within timeout.")
+
+    # --- Decoding ---
+
+    def _decode_settings(self, subscriptions):
+        """
+        Merges the subscribers' ingest settings into the settings of the one decoder.
+
+        Returns:
+            tuple[str, dict, dict]: Backend, decoder options and analysis options for open_capture().
+        """
+        controls = [s.control for s in subscriptions]
+        if not controls:
+            return INGEST_OPENCV, {}, {}
+        backend = INGEST_FFMPEG if any(c.get("ingest_backend") == INGEST_FFMPEG for c in controls) else INGEST_OPENCV
+        # Threads / low latency come from the first subscriber; the frame geometry is merged
+        options = dict(controls[0].get("decoder_options") or {})
+        for key in ("fps", "keyframes_only"):
+            options.pop(key, None)
+        scales = {(c.get("decoder_options") or {}).get("scale") for c in controls}
+        if len(scales) != 1:
+            options.pop("scale", None)
+
+        widths = [None if c.get("full_resolution") else (c.get("analysis") or {}).get("width") for c in controls]
+        keyframes_only = all(c.get("keyframes_only") for c in controls)
+        rates = [KEYFRAME_ONLY_ASSUMED_FPS if s.target_fps is None and s.control.get("keyframes_only") else s.target_fps
+                 for s in subscriptions]
+        analysis = {
+            "width": None if None in widths else max(widths),
+            "fps": None if keyframes_only or None in rates else max(rates),
+            "keyframes_only": keyframes_only,
+        }
+        return backend, options, analysis
+
+    def _check_settings(self):
+        """
+        Asks the puller to reopen the stream if the merged decode settings changed (lock held).
+
+        Returns:
+            bool: True if a reopen was requested.
+        """
+        if self._open_settings is not None and self._decode_settings(self._subscriptions.values()) != self._open_settings:
+            self._reopen_event.set()
+            return True
+        return False
+
+    def _open(self):
+        with self._lock:
+            subscriptions = list(self._subscriptions.values())
+            self._open_settings = self._decode_settings(subscriptions)
+            self._properties = None  # Known again once the new capture is open
+            max_buffers = self._expected_buffers()
+            self._buffers_changed = False
+        backend, options, analysis = self._open_settings
+        self.logger.info(f"Opening stream for {len(subscriptions)} subscriber(s) ({backend}, {analysis}).")
+        capture = open_capture(self.stream_url, backend, options, analysis, max_buffers)
+        return capture, analysis, {s.code for s in subscriptions}
+
+    def _apply_properties(self, subscription, width, height, fps, keyframes_only):
+        """Writes the stream properties to a subscriber and sets up its decimation."""
+        control = subscription.control
+        control["width"] = width
+        control["height"] = height
+        subscription.keep_ratio = 1.0
+        control["input_fps"] = fps
+        target_fps = subscription.target_fps
+        if keyframes_only:
+            target_fps = None  # Already as sparse as the decoder can make it
+        elif target_fps is None and control.get("keyframes_only"):
+            # Shares a fully decoded stream: thin it out to the assumed keyframe rate
+            target_fps = KEYFRAME_ONLY_ASSUMED_FPS
+        if target_fps and target_fps < fps:
+            subscription.keep_ratio = target_fps / fps
+            control["input_fps"] = target_fps
+
+    def _run(self):
+        """Puller thread: opens (and reopens) the stream and fans the frames out."""
+        cap = None
+        self.logger.info("Puller thread started.")
+        try:
+            while not self._stop_event.is_set():
+                if self._reopen_event.is_set() and cap is not None:
+                    self._reopen_event.clear()
+                    cap.release()
+                    cap = None
+                if cap is None or not cap.isOpened():
+                    self._reopen_event.clear()
+                    self.logger.info("Puller attempting to open stream.")
+                    self.connection.on_attempt()
+                    cap, analysis, opened_for = self._open()
+                    if not cap.isOpened():
+                        cap.release()
+                        cap = None
+                        self._back_off("Failed to open stream")
+                        continue
+                    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+                    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+                    fps = cap.get(cv2.CAP_PROP_FPS)
+                    if fps <= 0:
+                        self.logger.warning(f"Puller could not get input stream FPS ({fps}), defaulting to 25.0.")
+                        fps = 25.0  # Default if FPS is zero or negative
+                    keyframes_only = analysis["keyframes_only"]
+                    self.clock.reset()
+                    with self._lock:
+                        self._properties = (width, height, fps, keyframes_only)
+                        # Subscribers that joined during the open only fit this capture if they did not ask for a reopen
+                        reopen_pending = self._reopen_event.is_set()
+                        for subscription in self._subscriptions.values():
+                            if subscription.code in opened_for or not reopen_pending:
+                                self._apply_properties(subscription, width, height, fps, keyframes_only)
+                                subscription.reset_timing()
+                                subscription.ready = True
+                    self.logger.info(f"Puller stream properties: {width}x{height} @ {fps:.2f} fps")
+
+                pooled = isinstance(cap, FFmpegFrameReader)
+                if pooled and self._buffers_changed:
+                    with self._lock:
+                        cap.pool.reserve(self._expected_buffers())
+                        self._buffers_changed = False
+
+                started = time.monotonic()
+                ret, frame = cap.read()
+                received = time.monotonic()
+                if not ret or frame is None:
+                    cap.release()
+                    cap = None
+                    self._back_off("Empty frame or stream ended")
+                    continue
+                # The puller's own hold on a pooled frame, released once the frame is fanned out
+                lease = cap.last_lease if pooled else None
+                try:
+                    self.connection.on_frame()
+                    # Source PTS (OpenCV: position of the last frame; FFmpeg reader: from showinfo)
+                    pts_msec = cap.get(cv2.CAP_PROP_POS_MSEC)
+                    frame_time = self.clock.stamp(pts_msec / 1000.0 if pts_msec >= 0 else None, received)
+                    self._fan_out(cap, frame, frame_time, lease, received - started)
+                finally:
+                    if lease is not None:
+                        lease.release()
+
+        except Exception as e:
+            self.logger.exception(f"Exception in puller thread: {e}")
+            with self._lock:
+                subscriptions = list(self._subscriptions.values())
+            for subscription in subscriptions:
+                subscription.control["error_event"].set()
+                subscription.control["error"] = subscription.control.get("error") or f"Exception in puller thread: {e}"
+
+        finally:
+            self.connection.on_stop()
+            if cap is not None:
+                cap.release()
+                self.logger.info("Puller released video capture.")
+            self.logger.info("Puller thread exited.")
+
+    def _back_off(self, error):
+        """Records a failed attempt and waits as long as the reconnect state machine says."""
+        delay = self.connection.on_failure(error)
+        self.logger.warning(f"{error}; retrying in {delay:.2f}s "
+                            f"(failure {self.connection.consecutive_failures}, circuit {self.connection.circuit}).")
+        if delay > 0 and self._stop_event.wait(delay):
+            return
+        self.connection.on_backoff_elapsed()
+
+    def _fan_out(self, cap, frame, frame_time, lease, read_seconds):
+        """
+        Puts one frame (the same array, no copies) with its FrameTime into the queue of every
+        subscriber that wants it. Each queued frame gets its own hold on the lease of a pooled frame.
+        """
+        with self._lock:
+            subscriptions = list(self._subscriptions.values())
+        for subscription in subscriptions:
+            if not subscription.ready:
+                continue
+            control = subscription.control
+            control["stage_stats"].record(STAGE_READ, read_seconds)
+            if isinstance(cap, FFmpegFrameReader):
+                control["ingest_dropped_frames"] = cap.dropped_frames
+                control["ingest_buffers"] = cap.pool.size
+            elif isinstance(cap, DecimatingCapture):
+                control["decimated_frames"] = cap.decimated_frames
+
+            subscription.phase += subscription.keep_ratio
+            if subscription.phase < 1.0:
+                continue
+            subscription.phase -= 1.0
+
+            if subscription.last_received is not None:
+                interval = frame_time.received - subscription.last_received
+                mean = subscription.mean_frame_interval
+                subscription.mean_frame_interval = interval if mean is None else 0.9 * mean + 0.1 * interval
+                if subscription.mean_frame_interval > 0:
+                    control["analysis_rate"] = 1.0 / subscription.mean_frame_interval
+            subscription.last_received = frame_time.received
+            input_fps = control.get("input_fps") or 0.0
+            control["arrival_stats"].record(frame_time, 1.0 / input_fps if input_fps > 0 else None)
+            control["pts_discontinuities"] = self.clock.discontinuities
+
+            if lease is not None:
+                lease.retain()
+            try:
+                replaced = control["frame_queue"].put_nowait((frame, frame_time, lease))
+            except queue.Full:
+                # Dropping frames is acceptable under load, no need to log excessively
+                control["dropped_frames"] = control.get("dropped_frames", 0) + 1
+                replaced = (frame, frame_time, lease)
+            # A frame the queue dropped (full FIFO, or overwritten in the mailbox) gives back its hold
+            if replaced is not None and replaced[2] is not None:
+                replaced[2].release()
+
+class StreamSourceRegistry:
+    """
+    Reference-counted registry of StreamSources keyed by stream URL: the first
+    control on a URL starts its source, later ones subscribe to it, and the
+    source stops when its last control releases it.
+    拉流源注册表：按地址共享拉流源，按订阅数管理生命周期
+    """
+    def __init__(self):
+        self._sources = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, code, control):
+        """
+        Subscribes a control to the source of its stream_url, starting the source if needed.
+        Every acquire must be paired with a release().
+
+        Args:
+            code (str): The control code.
+            control (dict): The control state (stream_url, frame_queue, ingest settings).
+
+        Returns:
+            StreamSource: The shared source.
+        """
+        key = control["stream_url"].strip()
+        with self._lock:
+            source = self._sources.get(key)
+            if source is None or not source.is_alive():
+                # A source whose puller died keeps serving its old subscribers until they release it
+                source = StreamSource(key)
+                self._sources[key] = source
+            source.subscribe(code, control)
+            control["stream_source"] = source
+            return source
+
+    def release(self, code, control):
+        """Unsubscribes a control; stops the source when it was the last subscriber."""
+        source = control.pop("stream_source", None)
+        if source is None:
+            return
+        with self._lock:
+            remaining = source.unsubscribe(code)
+            if remaining == 0 and self._sources.get(source.stream_url) is source:
+                del self._sources[source.stream_url]
+        if remaining == 0:
+            source.stop()
+
+    def stats(self):
+        """Subscriber count of every active source."""
+        with self._lock:
+            return {url: source.subscriber_count for url, source in self._sources.items()}
+
+def _target_fps(control):
+    """The frame rate a control wants delivered (None for every frame)."""
+    fps = (control.get("decoder_options") or {}).get("fps")
+    if fps is None:
+        fps = (control.get("analysis") or {}).get("fps")
+    return fps
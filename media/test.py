@@ -2,6 +2,7 @@ import os
 import logging
 from ultralytics import YOLO
 from config import BEHAVIOR_MODEL_MAP, BEHAVIOR_CLASSES_MAP, DEFAULT_MODEL_PATH
+from text_embeddings import set_classes_cached
 
 logger = logging.getLogger(__name__)
 
@@ -45,8 +46,8 @@ def test_open_vocabulary_models():
             logger.info(f"Testing model {model_path} with classes {classes}")
             model = YOLO(model_path)
             
-            # 测试设置类别
-            model.set_classes(classes)
+            # 测试设置类别（使用类别文本向量缓存）
+            set_classes_cached(model, model_path, classes)
             logger.info(f"✓ Successfully set classes for {behavior}: {classes}")
             
             # 如果可能，显示模型的当前类别信息
@@ -78,7 +79,7 @@ def preload_all_models():
                     classes = BEHAVIOR_CLASSES_MAP[behavior]
                     logger.info(f"Setting classes for {behavior}: {classes}")
                     try:
-                        model.set_classes(classes)
+                        set_classes_cached(model, model_path, classes)
                         logger.info(f"✓ Classes set successfully")
                     except Exception as e:
                         logger.warning(f"⚠ Failed to set classes: {e}")
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from behaviors.detections import Detections
+
+NAMES = {0: "person", 1: "car", 2: "dog"}
+
+@pytest.fixture
+def detections():
+    return Detections([
+        [0, 0, 10, 10, 0.9, 0],
+        [20, 20, 40, 40, 0.8, 1],
+        [50, 50, 60, 60, 0.7, 0],
+        [100, 0, 110, 20, 0.6, 2],
+    ], NAMES)
+
+def test_array_input_is_wrapped_without_copy():
+    data = np.zeros((2, 6), dtype=np.float32)
+    assert np.shares_memory(Detections(data).data, data)
+
+def test_empty_detections():
+    empty = Detections([], NAMES)
+    assert len(empty) == 0
+    assert empty.count() == 0
+    assert empty.filter_classes(["person"]).data.shape == (0, 6)
+    assert empty.centers_in_polygon([[0, 0], [10, 0], [10, 10]]).shape == (0,)
+
+def test_filter_classes_by_id_and_name(detections):
+    people = detections.filter_classes(["person"])
+    assert len(people) == 2
+    assert set(people.class_id) == {0}
+    assert people.names == NAMES
+
+    mixed = detections.filter_classes([1, "DOG"])
+    assert sorted(mixed.class_id.tolist()) == [1, 2]
+
+    assert len(detections.filter_classes(["unknown"])) == 0
+
+def test_count(detections):
+    assert detections.count() == 4
+    assert detections.count(["person"]) == 2
+    assert detections.count([1, 2]) == 2
+    assert detections.count(["cat"]) == 0
+
+def test_iou_with(detections):
+    iou = detections.iou_with([0, 0, 10, 10])
+    assert iou.shape == (4,)
+    assert iou[0] == pytest.approx(1.0)
+    assert iou[1] == pytest.approx(0.0)
+    # [0, 0, 20, 20] covers the first box: IoU = 100 / 400
+    assert detections.iou_with([0, 0, 20, 20])[0] == pytest.approx(0.25)
+
+def test_area_in(detections):
+    fractions = detections.area_in([0, 0, 5, 10])
+    assert fractions[0] == pytest.approx(0.5)
+    assert fractions[1] == pytest.approx(0.0)
+    assert detections.area_in([0, 0, 1000, 1000]) == pytest.approx(np.ones(4))
+
+def test_centers_in_polygon(detections):
+    # Triangle containing the centers (5, 5) and (30, 30) but not (55, 55) or (105, 10)
+    triangle = [[0, 0], [80, 0], [0, 80]]
+    np.testing.assert_array_equal(detections.centers_in_polygon(triangle), [True, True, False, False])
+
+    # Concave polygon: the square around the first three centers, with a notch cut out around (55, 55)
+    notched = [[0, 0], [70, 0], [70, 70], [35, 25], [0, 70]]
+    np.testing.assert_array_equal(detections.centers_in_polygon(notched), [True, True, False, False])
+
+def test_centers_in_degenerate_polygon(detections):
+    assert not detections.centers_in_polygon([[0, 0], [100, 100]]).any()
+
+def test_list_compatibility(detections):
+    rows = list(detections)
+    assert len(rows) == 4
+    assert rows[0][:4] == [0, 0, 10, 10]
+    assert detections.tolist()[1][5] == 1
@@ -0,0 +1,42 @@
+import queue
+import threading
+import time
+
+import pytest
+
+from frame_mailbox import FrameMailbox
+from frame_timing import FrameTime
+
+def test_latest_frame_wins():
+    mailbox = FrameMailbox()
+    assert mailbox.put_nowait("first") is None
+    assert mailbox.put_nowait("second") == "first"
+    assert mailbox.put_nowait("third") == "second"
+    assert mailbox.qsize() == 1
+    assert mailbox.get_nowait() == "third"
+    assert mailbox.dropped == 2
+    assert mailbox.empty()
+
+def test_get_times_out_when_empty():
+    mailbox = FrameMailbox()
+    with pytest.raises(queue.Empty):
+        mailbox.get_nowait()
+    with pytest.raises(queue.Empty):
+        mailbox.get(timeout=0.01)
+
+def test_get_wakes_up_on_put():
+    mailbox = FrameMailbox()
+    threading.Timer(0.05, mailbox.put_nowait, args=("frame",)).start()
+    assert mailbox.get(timeout=2.0) == "frame"
+
+def test_frame_older_than_max_age_is_stale():
+    mailbox = FrameMailbox()
+    mailbox.put_nowait(("old", FrameTime(time.monotonic() - 2.0)))
+    mailbox.put_nowait(("new", FrameTime(time.monotonic())))
+    frame, frame_time = mailbox.get_nowait()
+    assert frame == "new"
+    assert not frame_time.is_older_than(1.0)
+    assert FrameTime(time.monotonic() - 2.0).is_older_than(1.0)
+
+def test_frames_never_go_stale_without_max_age():
+    assert not FrameTime(time.monotonic() - 3600.0).is_older_than(None)
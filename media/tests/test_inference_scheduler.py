@@ -0,0 +1,98 @@
+import contextlib
+import threading
+import time
+
+import pytest
+
+from inference_scheduler import InferenceScheduler
+
+class StubPool:
+    """Replica pool with one replica whose model records every call."""
+    size = 1
+
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def model(self, frames, verbose=False, **predict_kwargs):
+        with self.lock:
+            self.calls.append((list(frames), predict_kwargs))
+        return [("result", frame, predict_kwargs) for frame in frames]
+
+    @contextlib.contextmanager
+    def checkout(self, timeout=None):
+        yield self.model
+
+@pytest.fixture
+def pool():
+    return StubPool()
+
+def start(scheduler):
+    scheduler.start()
+    return scheduler
+
+def test_batches_group_frames_by_predict_kwargs(pool):
+    scheduler = InferenceScheduler("stub", pool, max_batch_size=8, max_wait_seconds=0.05)
+    people = {"classes": [0], "conf": 0.5}
+    cars = {"classes": [2]}
+    # Queued before the batching thread starts, so the grouping does not depend on timing
+    futures = scheduler.submit_many(["a1", "a2", "a3"], people)
+    futures += scheduler.submit_many(["b1", "b2"], cars)
+    futures += scheduler.submit_many(["a4"], {"conf": 0.5, "classes": [0]})
+    start(scheduler)
+    try:
+        results = [future.result(timeout=5) for future in futures]
+    finally:
+        scheduler.stop(timeout=5)
+
+    assert pool.calls == [(["a1", "a2", "a3", "a4"], people), (["b1", "b2"], cars)]
+    # Every frame gets its own result, computed with its own arguments
+    assert [result[1] for result in results] == ["a1", "a2", "a3", "b1", "b2", "a4"]
+    assert results[3][2] == cars
+
+def test_batch_never_exceeds_max_batch_size_or_splits_a_group(pool):
+    scheduler = InferenceScheduler("stub", pool, max_batch_size=3, max_wait_seconds=0.05)
+    futures = scheduler.submit_many(["a", "b"])
+    futures += scheduler.submit_many(["c", "d"])
+    futures += scheduler.submit_many(["e"])
+    start(scheduler)
+    try:
+        for future in futures:
+            future.result(timeout=5)
+    finally:
+        scheduler.stop(timeout=5)
+    # A group is never split, so the first batch takes both groups ([a, b] did not fill it)
+    assert [frames for frames, _ in pool.calls] == [["a", "b", "c", "d"], ["e"]]
+
+def test_single_client_is_dispatched_without_waiting(pool):
+    scheduler = start(InferenceScheduler("stub", pool, max_batch_size=8, max_wait_seconds=5.0))
+    try:
+        started = time.monotonic()
+        scheduler.submit("frame").result(timeout=5)
+        assert time.monotonic() - started < 1.0
+    finally:
+        scheduler.stop(timeout=5)
+
+def test_batch_deadline_ignores_wall_clock_steps(pool, monkeypatch):
+    scheduler = InferenceScheduler("stub", pool, max_batch_size=8, max_wait_seconds=0.2)
+    # Frequent submissions: batches wait for partners up to max_wait_seconds
+    for _ in range(3):
+        scheduler.submit("warm-up")
+    # A wall clock stepping back an hour must not stall the batch
+    monkeypatch.setattr(time, "time", lambda: 0.0)
+    start(scheduler)
+    try:
+        started = time.monotonic()
+        scheduler.submit("frame").result(timeout=5)
+        assert time.monotonic() - started < 2.0
+    finally:
+        scheduler.stop(timeout=5)
+
+def test_stop_fails_pending_requests(pool):
+    scheduler = InferenceScheduler("stub", pool, max_batch_size=8, max_wait_seconds=0.0)
+    future = scheduler.submit("frame")
+    scheduler.stop(timeout=5)
+    with pytest.raises(RuntimeError):
+        future.result(timeout=5)
+    with pytest.raises(RuntimeError):
+        scheduler.submit("late").result(timeout=5)
@@ -0,0 +1,117 @@
+import pytest
+
+import model_cache
+from model_cache import ModelCache
+
+class StubPool:
+    size = 1
+    replica_count = 1
+
+    def __init__(self, memory_bytes):
+        self.memory_bytes = memory_bytes
+
+class StubScheduler:
+    """Records start/stop, and whether the cache lock was held when stopped."""
+    cache = None
+
+    def __init__(self, name, pool, max_batch_size, max_wait_seconds):
+        self.name = name
+        self.started = False
+        self.stopped = False
+        self.stopped_under_lock = None
+
+    def start(self):
+        self.started = True
+
+    def stop(self, timeout=None):
+        self.stopped = True
+        self.stopped_under_lock = StubScheduler.cache._lock.locked()
+
+@pytest.fixture
+def make_cache(monkeypatch):
+    monkeypatch.setattr(model_cache, "InferenceScheduler", StubScheduler)
+
+    def make(max_bytes=None):
+        cache = ModelCache(max_bytes)
+        StubScheduler.cache = cache
+        return cache
+    return make
+
+def loader(memory_bytes=100, calls=None):
+    def load():
+        if calls is not None:
+            calls.append(1)
+        return StubPool(memory_bytes)
+    return load
+
+def test_reference_counting(make_cache):
+    cache = make_cache()
+    calls = []
+    first = cache.acquire("a", loader(calls=calls))
+    second = cache.acquire("a", loader(calls=calls))
+    assert first is second
+    assert len(calls) == 1
+    assert first.ref_count == 2
+    assert first.scheduler.started
+
+    cache.release("a")
+    assert first.ref_count == 1
+    cache.release("a")
+    cache.release("a")
+    assert first.ref_count == 0
+
+def test_lru_eviction_under_byte_budget(make_cache):
+    cache = make_cache(max_bytes=250)
+    a = cache.acquire("a", loader())
+    cache.acquire("b", loader())
+    cache.release("a")
+    cache.release("b")
+    # "a" is the least recently used idle model: loading "c" evicts it to fit 250 bytes
+    cache.acquire("c", loader())
+    stats = cache.get_stats()
+    assert [model["key"] for model in stats["models"]] == ["b", "c"]
+    assert stats["memoryBytes"] == 200
+    assert a.scheduler.stopped
+
+def test_models_in_use_are_never_evicted(make_cache):
+    cache = make_cache(max_bytes=150)
+    for key in ("a", "b", "c"):
+        cache.acquire(key, loader())
+    assert cache.get_stats()["loadedModels"] == 3
+    assert cache.evictions == 0
+
+    # Released models are evicted, least recently used first, until the cache fits
+    cache.release("b")
+    cache.release("a")
+    assert [model["key"] for model in cache.get_stats()["models"]] == ["c"]
+    assert cache.evictions == 2
+
+def test_evicted_schedulers_are_stopped_without_the_lock(make_cache):
+    cache = make_cache(max_bytes=100)
+    a = cache.acquire("a", loader())
+    cache.release("a")
+    b = cache.acquire("b", loader())
+    assert a.scheduler.stopped
+    assert a.scheduler.stopped_under_lock is False
+    cache.release("b")
+    cache.acquire("a", loader())
+    assert b.scheduler.stopped_under_lock is False
+
+def test_hit_miss_and_eviction_stats(make_cache):
+    cache = make_cache(max_bytes=100)
+    cache.acquire("a", loader())
+    cache.acquire("a", loader())
+    cache.release("a")
+    cache.release("a")
+    cache.acquire("b", loader())
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (1, 2, 1)
+    assert stats["maxBytes"] == 100
+    assert stats["models"][0]["refCount"] == 1
+
+def test_no_budget_never_evicts(make_cache):
+    cache = make_cache()
+    for key in ("a", "b", "c"):
+        cache.acquire(key, loader(memory_bytes=10 ** 12))
+        cache.release(key)
+    assert cache.get_stats()["loadedModels"] == 3
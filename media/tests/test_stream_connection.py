@@ -0,0 +1,92 @@
+from stream_connection import (
+    ConnectionStateMachine, STATE_CONNECTED, STATE_BACKOFF, CIRCUIT_CLOSED, CIRCUIT_OPEN, CIRCUIT_HALF_OPEN
+)
+
+def make_machine(**kwargs):
+    options = dict(base_delay=1.0, max_delay=8.0, jitter=0.0, stable_after=60.0,
+                   breaker_failures=5, breaker_cooldown=30.0)
+    options.update(kwargs)
+    return ConnectionStateMachine(**options)
+
+def fail(machine, times):
+    """Fails `times` consecutive attempts, returning the delays."""
+    delays = []
+    for _ in range(times):
+        machine.on_attempt()
+        delays.append(machine.on_failure("open failed"))
+        machine.on_backoff_elapsed()
+    return delays
+
+def connect(machine):
+    machine.on_attempt()
+    machine.on_frame()
+
+def test_first_failure_retries_at_once_then_backs_off_exponentially():
+    machine = make_machine(breaker_failures=10)
+    assert fail(machine, 6) == [0.0, 1.0, 2.0, 4.0, 8.0, 8.0]
+    assert machine.state == STATE_BACKOFF
+    assert machine.circuit == CIRCUIT_CLOSED
+
+def test_jitter_only_shortens_delays():
+    machine = make_machine(jitter=0.5, breaker_failures=10)
+    delays = fail(machine, 4)
+    assert delays[0] == 0.0
+    for delay, full in zip(delays[1:], [1.0, 2.0, 4.0]):
+        assert full * 0.5 <= delay <= full
+
+def test_circuit_opens_after_consecutive_failures():
+    machine = make_machine(breaker_failures=3)
+    delays = []
+    for _ in range(3):
+        machine.on_attempt()
+        delays.append(machine.on_failure("open failed"))
+    assert delays[-1] == 30.0
+    assert machine.circuit == CIRCUIT_OPEN
+    assert machine.circuit_opens == 1
+
+    machine.on_backoff_elapsed()
+    assert machine.circuit == CIRCUIT_HALF_OPEN
+
+def test_half_open_probe_success_closes_circuit_and_resets_failures():
+    machine = make_machine(breaker_failures=3)
+    fail(machine, 3)
+    assert machine.circuit == CIRCUIT_HALF_OPEN
+
+    connect(machine)
+    assert machine.state == STATE_CONNECTED
+    assert machine.circuit == CIRCUIT_CLOSED
+    assert machine.consecutive_failures == 0
+    assert machine.summary()["consecutiveFailures"] == 0
+
+    # The next failure starts over with an immediate retry instead of reopening the circuit
+    assert machine.on_failure("read failed") == 0.0
+    assert machine.circuit == CIRCUIT_CLOSED
+
+def test_half_open_probe_failure_reopens_circuit():
+    machine = make_machine(breaker_failures=3)
+    fail(machine, 3)
+    assert machine.circuit == CIRCUIT_HALF_OPEN
+
+    machine.on_attempt()
+    assert machine.on_failure("probe failed") == 30.0
+    assert machine.circuit == CIRCUIT_OPEN
+    assert machine.circuit_opens == 2
+
+def test_reconnect_is_counted_once_frames_arrive_again():
+    machine = make_machine()
+    connect(machine)
+    machine.on_failure("read failed")
+    assert machine.summary()["disconnectedForSeconds"] >= 0.0
+    connect(machine)
+    summary = machine.summary()
+    assert summary["reconnects"] == 1
+    assert summary["lastReconnectMs"] is not None
+    assert summary["disconnectedForSeconds"] == 0.0
+
+def test_stable_connection_forgets_earlier_failures():
+    machine = make_machine(stable_after=0.0, breaker_failures=3)
+    fail(machine, 2)
+    connect(machine)
+    # Only the failure of the stable connection counts: immediate retry
+    assert machine.on_failure("read failed") == 0.0
+    assert machine.consecutive_failures == 1
@@ -0,0 +1,66 @@
+import numpy as np
+
+from tracker import BoxTracker
+
+def detection(x, y, conf=0.9, class_id=0, size=40):
+    return [x, y, x + size, y + size, conf, class_id]
+
+def test_track_id_persists_across_skipped_frames():
+    tracker = BoxTracker(high_threshold=0.25, low_threshold=0.1)
+    first = tracker.update([detection(100, 100)])
+    assert first.shape == (1, 7)
+    track_id = first[0, 6]
+
+    # Frames between two inferences only get predicted boxes, with the same id
+    for _ in range(3):
+        predicted = tracker.predict()
+        assert predicted.shape == (1, 7)
+        assert predicted[0, 6] == track_id
+
+    moved = tracker.update([detection(104, 102)])
+    assert moved[0, 6] == track_id
+    assert tracker.active_count == 1
+
+def test_track_id_persists_while_object_is_briefly_missed():
+    tracker = BoxTracker(max_lost_frames=5)
+    track_id = tracker.update([detection(100, 100)])[0, 6]
+    for _ in range(3):
+        assert len(tracker.update([])) == 0
+    assert tracker.active_count == 0
+    assert tracker.update([detection(100, 100)])[0, 6] == track_id
+
+def test_lost_track_is_dropped_after_max_lost_frames():
+    tracker = BoxTracker(max_lost_frames=2)
+    track_id = tracker.update([detection(100, 100)])[0, 6]
+    for _ in range(3):
+        tracker.update([])
+    assert tracker.update([detection(100, 100)])[0, 6] != track_id
+
+def test_low_confidence_detection_continues_existing_track():
+    tracker = BoxTracker(high_threshold=0.5, low_threshold=0.1)
+    track_id = tracker.update([detection(100, 100, conf=0.9)])[0, 6]
+
+    # Second stage: below the high threshold, but matches the leftover track
+    continued = tracker.update([detection(101, 101, conf=0.2)])
+    assert continued.shape == (1, 7)
+    assert continued[0, 6] == track_id
+    np.testing.assert_allclose(continued[0, 4], 0.2, rtol=1e-6)
+
+def test_low_confidence_detection_never_starts_a_track():
+    tracker = BoxTracker(high_threshold=0.5, low_threshold=0.1)
+    tracker.update([detection(100, 100, conf=0.9)])
+    result = tracker.update([detection(100, 100, conf=0.9), detection(400, 400, conf=0.2)])
+    assert len(result) == 1
+    assert result[0, 0] == 100
+
+def test_detections_below_low_threshold_are_ignored():
+    tracker = BoxTracker(high_threshold=0.5, low_threshold=0.1)
+    track_id = tracker.update([detection(100, 100, conf=0.9)])[0, 6]
+    assert len(tracker.update([detection(100, 100, conf=0.05)])) == 0
+    assert tracker.update([detection(100, 100, conf=0.9)])[0, 6] == track_id
+
+def test_tracks_only_match_their_own_class():
+    tracker = BoxTracker()
+    track_id = tracker.update([detection(100, 100, class_id=0)])[0, 6]
+    other = tracker.update([detection(100, 100, class_id=1)])
+    assert other[0, 6] != track_id
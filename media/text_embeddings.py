@@ -0,0 +1,214 @@
+# inference_service/text_embeddings.py (Standalone with SQLite)
+
+import os
+import re
+import sys
+import hashlib
+import logging
+import argparse
+import threading
+
+from config import (
+    BEHAVIOR_MODEL_MAP, BEHAVIOR_CLASSES_MAP, DEFAULT_MODEL_PATH, TEXT_EMBEDDING_CACHE_DIR
+)
+
+logger = logging.getLogger(__name__)
+
+# Weights file hashes keyed by (path, mtime, size), so each file is hashed once per process
+_model_hashes = {}
+_model_hashes_lock = threading.Lock()
+
+def get_model_hash(model_path):
+    """
+    Returns the MD5 hash of a weights file (cached while the file is unchanged).
+
+    Args:
+        model_path (str): Path to the .pt weights.
+
+    Returns:
+        str | None: Hex digest, or None if the file does not exist.
+    """
+    if not os.path.exists(model_path):
+        return None
+    stat = os.stat(model_path)
+    key = (os.path.abspath(model_path), stat.st_mtime, stat.st_size)
+    with _model_hashes_lock:
+        if key in _model_hashes:
+            return _model_hashes[key]
+    digest = hashlib.md5()
+    with open(model_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    with _model_hashes_lock:
+        _model_hashes[key] = digest.hexdigest()
+    return _model_hashes[key]
+
+def get_text_embedding_cache_path(model_path, classes):
+    """
+    Returns the cache file of the text embeddings of a class list for a model,
+    keyed by (weights hash, class list).
+
+    Args:
+        model_path (str): Path to the .pt weights.
+        classes (list): Detection classes.
+
+    Returns:
+        str | None: Path of the cache file, or None if the weights file does not exist.
+    """
+    model_hash = get_model_hash(model_path)
+    if model_hash is None:
+        return None
+    classes_hash = hashlib.md5("\n".join(classes).encode("utf-8")).hexdigest()
+    return os.path.join(TEXT_EMBEDDING_CACHE_DIR, f"{model_hash[:16]}_{classes_hash[:16]}.pt")
+
+# Background class YOLOWorld.set_classes accepts in the class list: embedded, but not a named class
+_BACKGROUND_CLASS = " "
+# ultralytics releases (major, minor; inclusive) whose YOLOWorld.set_classes _apply_text_embeddings
+# mirrors. Other releases bypass the cache and run set_classes, since the attributes it writes are private
+_VERIFIED_ULTRALYTICS = ((8, 1), (8, 3))
+
+def _cache_bypass_reason(model):
+    """
+    Checks that cached embeddings can be applied to a model: the installed ultralytics
+    release is one _apply_text_embeddings was verified against, and the model still has
+    the private attributes it writes (WorldModel.txt_feats, the head's nc, names).
+
+    Returns:
+        str | None: Why the cache must be bypassed, or None if it can be used.
+    """
+    try:
+        from ultralytics import __version__ as version
+    except ImportError:
+        return "ultralytics version unknown"
+    release = tuple(int(part) for part in re.findall(r"\d+", version)[:2])
+    if not _VERIFIED_ULTRALYTICS[0] <= release <= _VERIFIED_ULTRALYTICS[1]:
+        return f"ultralytics {version} is not a release the cache was verified against"
+    world_model = getattr(model, "model", None)
+    layers = getattr(world_model, "model", None)
+    head = layers[-1] if layers is not None and len(layers) else None
+    if getattr(world_model, "txt_feats", None) is None or not hasattr(head, "nc") or not hasattr(world_model, "names"):
+        return f"{type(world_model).__name__} lacks the txt_feats/nc/names attributes set_classes writes"
+    return None
+
+def _apply_text_embeddings(model, classes, txt_feats):
+    """
+    Does exactly what YOLOWorld.set_classes (and WorldModel.set_classes) does, with
+    precomputed text embeddings instead of running CLIP: the head keeps one output per
+    embedded class, the background class included, while names drop the background.
+
+    Raises:
+        ValueError: If the embeddings do not match the class list.
+    """
+    classes = list(classes)
+    world_model = model.model
+    embedding_dim = world_model.txt_feats.shape[-1]
+    if txt_feats.ndim != 3 or txt_feats.shape[1] != len(classes) or txt_feats.shape[2] != embedding_dim:
+        raise ValueError(f"cached embeddings have shape {tuple(txt_feats.shape)}, "
+                         f"expected {len(classes)} classes of dimension {embedding_dim}")
+    world_model.txt_feats = txt_feats
+    world_model.model[-1].nc = len(classes)
+    if _BACKGROUND_CLASS in classes:
+        classes.remove(_BACKGROUND_CLASS)
+    world_model.names = classes
+    if model.predictor:
+        model.predictor.model.names = classes
+
+def set_classes_cached(model, model_path, classes):
+    """
+    Sets the detection classes of an open-vocabulary (YOLO-World) model,
+    reusing the text embeddings cached on disk for this weights file and
+    class list, and filling the cache on a miss. On an ultralytics release
+    or model the cache was not verified against, it runs model.set_classes.
+
+    Args:
+        model (YOLO): The loaded model.
+        model_path (str): Path to the .pt weights the model was loaded from.
+        classes (list): Detection classes.
+
+    Returns:
+        bool: True if the embeddings came from the cache.
+
+    Raises:
+        Exception: If setting the classes fails.
+    """
+    # Imported here so that only processes that actually load models pay for torch
+    import torch
+
+    bypass_reason = _cache_bypass_reason(model)
+    if bypass_reason:
+        logger.warning(f"Text embedding cache bypassed for classes {classes}: {bypass_reason}.")
+        model.set_classes(list(classes))
+        return False
+
+    cache_path = get_text_embedding_cache_path(model_path, classes)
+    if cache_path and os.path.exists(cache_path):
+        try:
+            # The cache holds a bare tensor: never unpickle arbitrary objects from disk
+            txt_feats = torch.load(cache_path, map_location="cpu", weights_only=True)
+            _apply_text_embeddings(model, classes, txt_feats)
+            logger.info(f"Loaded cached text embeddings for classes {classes}: {cache_path}")
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to use cached text embeddings {cache_path}, recomputing: {e}")
+
+    model.set_classes(list(classes))
+
+    txt_feats = getattr(model.model, "txt_feats", None)
+    if cache_path and txt_feats is not None:
+        try:
+            os.makedirs(TEXT_EMBEDDING_CACHE_DIR, exist_ok=True)
+            # Write to a temporary file first so a concurrent reader never sees a partial file
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            torch.save(txt_feats.detach().cpu(), tmp_path)
+            os.replace(tmp_path, cache_path)
+            logger.info(f"Cached text embeddings for classes {classes}: {cache_path}")
+        except Exception as e:
+            logger.warning(f"Failed to cache text embeddings for classes {classes}: {e}")
+    return False
+
+def warm_text_embedding_cache(behavior_codes=None, force=False):
+    """
+    Fills the text embedding cache for every behavior in BEHAVIOR_CLASSES_MAP.
+
+    Args:
+        behavior_codes (list | None): Only warm these behaviors (default: all configured).
+        force (bool): Recompute embeddings that are already cached.
+
+    Returns:
+        dict: Behavior code -> "cached", "computed", "skipped" or an error message.
+    """
+    from ultralytics import YOLO
+
+    results = {}
+    for behavior_code, classes in BEHAVIOR_CLASSES_MAP.items():
+        if behavior_codes and behavior_code not in behavior_codes:
+            continue
+        model_path = BEHAVIOR_MODEL_MAP.get(behavior_code, DEFAULT_MODEL_PATH)
+        if not os.path.exists(model_path):
+            logger.warning(f"Model not found for behavior {behavior_code}: {model_path}")
+            results[behavior_code] = "skipped"
+            continue
+
+        cache_path = get_text_embedding_cache_path(model_path, classes)
+        if force and os.path.exists(cache_path):
+            os.remove(cache_path)
+        try:
+            from_cache = set_classes_cached(YOLO(model_path), model_path, classes)
+            results[behavior_code] = "cached" if from_cache else "computed"
+        except Exception as e:
+            logger.error(f"Failed to warm text embeddings for behavior {behavior_code}: {e}")
+            results[behavior_code] = f"error: {e}"
+    return results
+
+if __name__ == "__main__":
+    # 预先计算并缓存所有开放词汇模型的类别文本向量，避免布控启动时运行CLIP文本编码器
+    # Usage: python text_embeddings.py [--behavior RENSHUTONGJI ...] [--force]
+    parser = argparse.ArgumentParser(description="Warm the YOLO-World text embedding cache for BEHAVIOR_CLASSES_MAP.")
+    parser.add_argument("--behavior", action="append", help="Behavior code to warm (repeatable, default: all)")
+    parser.add_argument("--force", action="store_true", help="Recompute embeddings that are already cached")
+    args = parser.parse_args()
+
+    results = warm_text_embedding_cache(args.behavior, args.force)
+    for behavior_code, result in results.items():
+        print(f"  - {behavior_code}: {result}")
+    sys.exit(0 if all(not r.startswith("error") for r in results.values()) else 1)
@@ -0,0 +1,241 @@
+# inference_service/tracker.py (Standalone with SQLite)
+
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Kalman noise weights relative to the box height (as in ByteTrack / DeepSORT)
+_STD_WEIGHT_POSITION = 1.0 / 20
+_STD_WEIGHT_VELOCITY = 1.0 / 160
+
+# Constant-velocity model over [cx, cy, w, h, vcx, vcy, vw, vh], one step per frame
+_TRANSITION = np.eye(8)
+_TRANSITION[:4, 4:] = np.eye(4)
+
+def box_iou(boxes_a, boxes_b):
+    """
+    Pairwise IoU between two sets of [x1, y1, x2, y2] boxes.
+
+    Args:
+        boxes_a (np.ndarray): (N, 4) boxes.
+        boxes_b (np.ndarray): (M, 4) boxes.
+
+    Returns:
+        np.ndarray: (N, M) IoU matrix.
+    """
+    if len(boxes_a) == 0 or len(boxes_b) == 0:
+        return np.zeros((len(boxes_a), len(boxes_b)), dtype=np.float32)
+    a = boxes_a[:, None, :]
+    b = boxes_b[None, :, :]
+    inter_w = (np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0])).clip(min=0)
+    inter_h = (np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1])).clip(min=0)
+    intersection = inter_w * inter_h
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return intersection / np.maximum(area_a + area_b - intersection, 1e-6)
+
+def _greedy_match(iou, min_iou):
+    """Matches rows to columns by descending IoU; returns (row, col) pairs with IoU >= min_iou."""
+    matches = []
+    if iou.size == 0:
+        return matches
+    rows, cols = np.nonzero(iou >= min_iou)
+    order = np.argsort(-iou[rows, cols])
+    used_rows, used_cols = set(), set()
+    for index in order:
+        row, col = rows[index], cols[index]
+        if row in used_rows or col in used_cols:
+            continue
+        used_rows.add(row)
+        used_cols.add(col)
+        matches.append((row, col))
+    return matches
+
+def _to_xyxy(means):
+    """[cx, cy, w, h, ...] states to [x1, y1, x2, y2] boxes."""
+    cx, cy, w, h = means[:, 0], means[:, 1], means[:, 2], means[:, 3]
+    return np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+
+def _to_cxcywh(boxes):
+    """[x1, y1, x2, y2] boxes to [cx, cy, w, h] measurements."""
+    w = boxes[:, 2] - boxes[:, 0]
+    h = boxes[:, 3] - boxes[:, 1]
+    return np.stack([boxes[:, 0] + w / 2, boxes[:, 1] + h / 2, w, h], axis=1)
+
+class BoxTracker:
+    """
+    Lightweight ByteTrack-style multi-object tracker for one control.
+    Every track has a constant-velocity Kalman filter; all tracks are
+    predicted and updated together with vectorized NumPy operations.
+    Detections are associated by IoU in two stages: confident detections
+    first, then low-confidence ones against the tracks left over, so
+    briefly occluded objects keep their id. On frames where inference
+    was skipped the tracker predicts the boxes of the visible tracks.
+    轻量级多目标跟踪：为检测框分配稳定的track_id，并在跳过推理的帧上预测目标位置
+    """
+    def __init__(self, high_threshold=0.25, low_threshold=0.1, match_iou_threshold=0.3, max_lost_frames=30):
+        """
+        Args:
+            high_threshold (float): Detections at or above this confidence are matched first and may start new tracks.
+            low_threshold (float): Detections below this confidence are ignored.
+            match_iou_threshold (float): Minimum IoU between a predicted track box and a detection to match them.
+            max_lost_frames (int): How many inferred frames an unmatched track is kept for re-association.
+        """
+        self.high_threshold = float(high_threshold)
+        self.low_threshold = float(low_threshold)
+        self.match_iou_threshold = float(match_iou_threshold)
+        self.max_lost_frames = int(max_lost_frames)
+        self._next_id = 1
+
+        self.means = np.zeros((0, 8))
+        self.covariances = np.zeros((0, 8, 8))
+        self.track_ids = np.zeros(0, dtype=np.int64)
+        self.class_ids = np.zeros(0)
+        self.confidences = np.zeros(0)
+        # Inferred frames since each track was last matched (0 = seen on the last inferred frame)
+        self.lost_frames = np.zeros(0, dtype=np.int64)
+
+    @property
+    def active_count(self):
+        """Number of tracks matched on the last inferred frame."""
+        return int(np.count_nonzero(self.lost_frames == 0))
+
+    def _predict_tracks(self):
+        """Advances every track by one frame."""
+        if len(self.means) == 0:
+            return
+        heights = self.means[:, 3]
+        std = np.concatenate([
+            np.repeat((_STD_WEIGHT_POSITION * heights)[:, None], 4, axis=1),
+            np.repeat((_STD_WEIGHT_VELOCITY * heights)[:, None], 4, axis=1),
+        ], axis=1)
+        noise = np.zeros_like(self.covariances)
+        diagonal = np.arange(8)
+        noise[:, diagonal, diagonal] = std ** 2
+
+        self.means = self.means @ _TRANSITION.T
+        self.covariances = _TRANSITION @ self.covariances @ _TRANSITION.T + noise
+        # Keep boxes from collapsing when the size velocity overshoots
+        self.means[:, 2:4] = self.means[:, 2:4].clip(min=1.0)
+
+    def _correct_tracks(self, track_indices, boxes):
+        """Kalman update of the given tracks with their matched [x1, y1, x2, y2] boxes."""
+        measurements = _to_cxcywh(boxes)
+        means = self.means[track_indices]
+        covariances = self.covariances[track_indices]
+
+        std = np.stack([_STD_WEIGHT_POSITION * measurements[:, 3]] * 4, axis=1)
+        innovation_cov = covariances[:, :4, :4].copy()
+        diagonal = np.arange(4)
+        innovation_cov[:, diagonal, diagonal] += std ** 2
+        gain = covariances[:, :, :4] @ np.linalg.inv(innovation_cov)
+
+        innovation = measurements - means[:, :4]
+        self.means[track_indices] = means + np.einsum("nij,nj->ni", gain, innovation)
+        self.covariances[track_indices] = covariances - gain @ covariances[:, :4, :]
+
+    def _start_tracks(self, boxes, confidences, class_ids):
+        """Creates a new track for each box."""
+        measurements = _to_cxcywh(boxes)
+        count = len(measurements)
+        means = np.concatenate([measurements, np.zeros((count, 4))], axis=1)
+        heights = measurements[:, 3]
+        std = np.concatenate([
+            np.repeat((2 * _STD_WEIGHT_POSITION * heights)[:, None], 4, axis=1),
+            np.repeat((10 * _STD_WEIGHT_VELOCITY * heights)[:, None], 4, axis=1),
+        ], axis=1)
+        covariances = np.zeros((count, 8, 8))
+        diagonal = np.arange(8)
+        covariances[:, diagonal, diagonal] = std ** 2
+
+        self.means = np.concatenate([self.means, means])
+        self.covariances = np.concatenate([self.covariances, covariances])
+        self.track_ids = np.concatenate([self.track_ids, np.arange(self._next_id, self._next_id + count)])
+        self.class_ids = np.concatenate([self.class_ids, class_ids])
+        self.confidences = np.concatenate([self.confidences, confidences])
+        self.lost_frames = np.concatenate([self.lost_frames, np.zeros(count, dtype=np.int64)])
+        self._next_id += count
+
+    def _keep_tracks(self, mask):
+        self.means = self.means[mask]
+        self.covariances = self.covariances[mask]
+        self.track_ids = self.track_ids[mask]
+        self.class_ids = self.class_ids[mask]
+        self.confidences = self.confidences[mask]
+        self.lost_frames = self.lost_frames[mask]
+
+    def _visible_detections(self):
+        """Current boxes of the tracks matched on the last inferred frame, with their track ids."""
+        visible = self.lost_frames == 0
+        return np.column_stack([
+            _to_xyxy(self.means[visible]).reshape(-1, 4), self.confidences[visible],
+            self.class_ids[visible], self.track_ids[visible],
+        ]).astype(np.float32)
+
+    def update(self, detections):
+        """
+        Associates the detections of an inferred frame with the tracks.
+
+        Args:
+            detections (np.ndarray | list): Raw detections, (N, 6) ([x1, y1, x2, y2, confidence, class_id] each).
+
+        Returns:
+            np.ndarray: The tracked detections, (M, 7) float32 ([x1, y1, x2, y2, confidence, class_id, track_id] each).
+                        Low-confidence detections that match no track are dropped.
+        """
+        self._predict_tracks()
+        dets = np.asarray(detections, dtype=np.float64)
+        dets = dets.reshape(-1, dets.shape[-1] if dets.ndim == 2 else 6)[:, :6]
+        dets = dets[dets[:, 4] >= self.low_threshold]
+        high = np.nonzero(dets[:, 4] >= self.high_threshold)[0]
+        low = np.nonzero(dets[:, 4] < self.high_threshold)[0]
+
+        track_boxes = _to_xyxy(self.means)
+        matched_tracks, matched_dets = [], []
+        unmatched_tracks = np.arange(len(self.means))
+        # Stage 1 matches confident detections, stage 2 gives the leftover tracks a chance
+        # with low-confidence detections (e.g. partially occluded objects)
+        for candidates in (high, low):
+            if len(unmatched_tracks) == 0 or len(candidates) == 0:
+                continue
+            iou = box_iou(track_boxes[unmatched_tracks], dets[candidates, :4])
+            # Only associate detections of the track's own class
+            iou[self.class_ids[unmatched_tracks][:, None] != dets[candidates, 5][None, :]] = 0.0
+            matches = _greedy_match(iou, self.match_iou_threshold)
+            matched_tracks.extend(unmatched_tracks[row] for row, _ in matches)
+            matched_dets.extend(candidates[col] for _, col in matches)
+            matched_rows = {row for row, _ in matches}
+            unmatched_tracks = np.array([t for i, t in enumerate(unmatched_tracks) if i not in matched_rows], dtype=np.int64)
+
+        self.lost_frames += 1
+        if matched_tracks:
+            track_indices = np.array(matched_tracks, dtype=np.int64)
+            det_indices = np.array(matched_dets, dtype=np.int64)
+            self._correct_tracks(track_indices, dets[det_indices, :4])
+            self.confidences[track_indices] = dets[det_indices, 4]
+            self.lost_frames[track_indices] = 0
+        track_by_det = {det: self.track_ids[track] for track, det in zip(matched_tracks, matched_dets)}
+
+        self._keep_tracks(self.lost_frames <= self.max_lost_frames)
+
+        new = [i for i in high if i not in track_by_det]
+        if new:
+            track_by_det.update({det: self._next_id + i for i, det in enumerate(new)})
+            self._start_tracks(dets[new, :4], dets[new, 4], dets[new, 5])
+
+        # Report the detector's own boxes for this frame, tagged with their track ids
+        indices = np.array(sorted(track_by_det), dtype=np.int64)
+        track_ids = np.array([track_by_det[i] for i in indices], dtype=np.float64)
+        return np.column_stack([dets[indices], track_ids]).astype(np.float32)
+
+    def predict(self):
+        """
+        Advances the tracks on a frame where inference was skipped.
+
+        Returns:
+            np.ndarray: Predicted boxes of the tracks seen on the last inferred frame,
+                        (N, 7) float32 ([x1, y1, x2, y2, confidence, class_id, track_id] each).
+        """
+        self._predict_tracks()
+        return self._visible_detections()
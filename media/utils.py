@@ -9,6 +9,7 @@ import numpy as np
 import sqlite3  # Import standard sqlite3 library
 import time  # Import time for timestamps
 
+from annotation import render_frame
 from config import (
     FFMPEG_TIMEOUT_SECONDS, VIDEO_SAVE_FULL_PATH, SQLITE_DB_PATH,
     ALARM_TABLE_NAME, VIDEO_SAVE_DIR, VIDEO_SAVE_SUB_DIR
@@ -116,7 +117,8 @@ def save_buffered_video(code, frames, fps, width, height, behavior_code, alarm_d
 
     Args:
         code (str): The control code associated with the video.
-        frames (list): A list of numpy arrays representing video frames.
+        frames (list): A list of numpy arrays or LazyAnnotatedFrames representing video frames.
+                       Lazy frames are rendered here, in the saving thread.
         fps (float): The frames per second for the video.
         width (int): The width of the video frames.
         height (int): The height of the video frames.
@@ -170,10 +172,17 @@ def save_buffered_video(code, frames, fps, width, height, behavior_code, alarm_d
         if not out.isOpened():
             raise IOError(f"Failed to open VideoWriter for {temp_video_path}")
 
+        skipped = 0
         for frame in frames:
             if frame is not None:
-                out.write(frame)
+                # VideoWriter silently drops frames of another size
+                if frame.shape[:2] != (height, width):
+                    skipped += 1
+                    continue
+                out.write(render_frame(frame))
         out.release()
+        if skipped:
+            logger.warning(f"[{code}] Skipped {skipped} buffered frames not matching the clip size {width}x{height}.")
         logger.info(f"[{code}] Temp AVI video saved successfully.")
     except Exception as e:
         logger.exception(f"[{code}] Error saving temp AVI video: {e}")
@@ -319,3 +328,40 @@ def build_ffmpeg_push_command(push_stream_url, width, height, input_fps):
         return command
     else:
         return None  # Unsupported protocol
+
+
+def draw_detections(frame, detections, names=None, inplace=False):
+    """
+    Draws detection boxes and labels on a copy of a frame (or on the frame itself).
+    Used when there is no ultralytics Results object to plot, e.g. for
+    merged crop/tile detections, tracked detections or detections reused
+    for a frame that skipped inference.
+
+    Args:
+        frame (np.ndarray): The BGR frame.
+        detections (list): Raw detections ([x1, y1, x2, y2, confidence, class_id] each,
+                           optionally followed by a track_id).
+        names (dict | None): Mapping of class id to class name.
+        inplace (bool): Draw on frame itself instead of a copy.
+
+    Returns:
+        np.ndarray: The annotated frame.
+    """
+    annotated_frame = frame if inplace else frame.copy()
+    for det in detections:
+        x1, y1, x2, y2, confidence, class_id = det[:6]
+        class_id = int(class_id)
+        label = (names or {}).get(class_id, str(class_id))
+        # Deterministic color per class
+        color = ((class_id * 67) % 256, (class_id * 137 + 80) % 256, (class_id * 211 + 160) % 256)
+        p1, p2 = (int(x1), int(y1)), (int(x2), int(y2))
+        cv2.rectangle(annotated_frame, p1, p2, color, 2)
+        text = f"{label} {confidence:.2f}"
+        if len(det) > 6:
+            text = f"#{int(det[6])} {text}"
+        text_size = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)[0]
+        text_top = max(p1[1] - text_size[1] - 4, 0)
+        cv2.rectangle(annotated_frame, (p1[0], text_top), (p1[0] + text_size[0] + 2, text_top + text_size[1] + 4), color, -1)
+        cv2.putText(annotated_frame, text, (p1[0] + 1, text_top + text_size[1] + 1),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+    return annotated_frame
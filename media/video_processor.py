@@ -7,22 +7,50 @@ import queue
 import subprocess
 import numpy as np
 import cv2
-from ultralytics import YOLO
 import collections
+import functools
 import os
 import datetime # Import standard datetime
+from concurrent.futures import ThreadPoolExecutor
 
 from config import (
     BEHAVIOR_MODEL_MAP, BEHAVIOR_CLASSES_MAP, DEFAULT_MODEL_PATH, VIDEO_SAVE_DURATION_SECONDS, 
     FRAME_QUEUE_MAXSIZE, ANNOTATED_FRAME_QUEUE_MAXSIZE, THREAD_JOIN_TIMEOUT_SECONDS,
-    STREAM_RECONNECT_DELAY_SECONDS, DETECTOR_QUEUE_GET_TIMEOUT,
+    DETECTOR_QUEUE_GET_TIMEOUT,
     PUSHER_QUEUE_GET_TIMEOUT, MANAGER_CHECK_INTERVAL_SECONDS,
-    DETECTOR_FPS_UPDATE_INTERVAL
+    DETECTOR_FPS_UPDATE_INTERVAL, INFERENCE_RESULT_TIMEOUT_SECONDS,
+    MODEL_CACHE_MAX_BYTES, DETECTOR_PROCESS_POOL_ENABLED, DETECTOR_PROCESS_POOL_WORKERS,
+    DETECTOR_SHM_RING_SLOTS, ADAPTIVE_SAMPLING_ENABLED, ADAPTIVE_IDLE_AFTER_SECONDS,
+    DEFAULT_DETECTION_INTERVAL, BEHAVIOR_MOTION_GATE_MAP, MOTION_GATE_METHOD,
+    MOTION_GATE_DOWNSCALE_WIDTH, MOTION_GATE_PIXEL_THRESHOLD, MOTION_GATE_MAX_SKIP_SECONDS,
+    ROI_CROP_PADDING, ROI_MERGE_IOU_THRESHOLD, BEHAVIOR_TILING_MAP, TILED_INFERENCE_INCLUDE_FULL_FRAME,
+    TILE_MERGE_METRIC, TILE_MERGE_IOU_THRESHOLD, TRACKER_ENABLED, TRACKER_DETECT_EVERY_N_FRAMES,
+    TRACKER_HIGH_THRESHOLD, TRACKER_LOW_THRESHOLD, TRACKER_MATCH_IOU_THRESHOLD, TRACKER_MAX_LOST_FRAMES,
+    INFERENCE_IMGSZ, MODEL_PRELOAD_WORKERS, FRAME_QUEUE_MODE, FRAME_MAX_AGE_SECONDS, STAGE_STATS_WINDOW,
+    DUPLICATE_FRAME_CACHE_ENABLED, DUPLICATE_FRAME_THUMBNAIL_WIDTH, DUPLICATE_FRAME_MAX_PIXEL_DIFF,
+    DUPLICATE_FRAME_MAX_AGE_SECONDS, DEFAULT_INGEST_BACKEND, BEHAVIOR_ANALYSIS_MAP
 )
 # Import utility functions (which now use sqlite3)
-from utils import save_buffered_video, build_ffmpeg_push_command
+from utils import save_buffered_video, build_ffmpeg_push_command, draw_detections
 # Import the function to get behavior handlers
-from behaviors import get_behavior_handler
+from behaviors import get_behavior_handler, Detections
+from model_cache import ModelCache
+from model_pool import ModelPool, get_default_pool_size, load_behavior_model
+from process_detector import ProcessDetectorPool, SharedFrameRing
+from backends import get_backend_for_behavior, resolve_model_source, BACKEND_PYTORCH
+from frame_filters import AdaptiveSampler, MotionGate, DuplicateFrameCache
+from frame_mailbox import FrameMailbox
+from ingest import INGEST_FFMPEG
+from stream_sources import StreamSourceRegistry
+from frame_timing import ArrivalStats
+from annotation import LazyAnnotatedFrame, render_frame
+from stage_stats import (
+    PipelineStats, STAGE_QUEUE_WAIT, STAGE_INFERENCE, STAGE_BEHAVIOR, STAGE_ANNOTATION, STAGE_PUSH_WRITE
+)
+from tracker import BoxTracker
+from regions import (
+    RoiLayout, get_tile_layout, as_detection_array, offset_detections, filter_detections_in_polygons, nms_detections
+)
 
 logger = logging.getLogger(__name__)
 
@@ -40,77 +68,214 @@ class VideoProcessor:
         self.logger = logging.getLogger(self.__class__.__name__)
         self.logger.info("VideoProcessor initializing...")
         
-        # 存储已加载的模型，避免重复加载
-        self.loaded_models = {}
+        # 已加载模型的缓存（引用计数 + 内存预算内按LRU淘汰空闲模型），避免重复加载
+        # 每个缓存条目包含模型副本池和所有使用该模型的布控共享的批量推理调度器
+        self.model_cache = ModelCache(MODEL_CACHE_MAX_BYTES)
+
+        # 可选的多进程检测模式：检测在工作进程中执行，帧通过共享内存传递
+        self.process_detector = None
+        if DETECTOR_PROCESS_POOL_ENABLED:
+            workers = DETECTOR_PROCESS_POOL_WORKERS or max(1, (os.cpu_count() or 2) // 2)
+            self.process_detector = ProcessDetectorPool(workers, DETECTOR_SHM_RING_SLOTS)
+            self.logger.info(f"Process-pool detector mode enabled with {workers} worker process(es).")
         
+        # 启动预加载状态：预加载完成（或未启用预加载）前服务报告未就绪
+        self.ready_event = threading.Event()
+        self.ready_event.set()
+        self.preload_status = {}
+        self.pinned_model_keys = []  # 预加载的模型常驻缓存（持有引用，不会被淘汰）
+
+        # Shared stream sources: one puller / decoder per stream URL, fanned out to its controls
+        self.stream_sources = StreamSourceRegistry()
+
         # Dictionary to hold control objects for each stream
         self.controls = {}
         logger.info("VideoProcessor initialized.")
 
+    def start_preload(self, behavior_codes):
+        """
+        Starts loading and warming up the models of the given behaviors in the
+        background. The processor reports not ready until every model is done.
+
+        Args:
+            behavior_codes (list): Behavior codes whose models are preloaded.
+
+        Returns:
+            threading.Thread: The preload thread.
+        """
+        self.ready_event.clear()
+        self.preload_status = {behavior_code: "pending" for behavior_code in behavior_codes}
+        thread = threading.Thread(target=self._preload_models, args=(list(behavior_codes),), daemon=True)
+        thread.start()
+        return thread
+
+    def _preload_models(self, behavior_codes):
+        """Preload thread: loads and warms up one model per cache key in parallel."""
+        started = time.time()
+        # Behaviors sharing a model (same cache key) are loaded once
+        behaviors_by_key = {}
+        for behavior_code in behavior_codes:
+            behaviors_by_key.setdefault(self._get_model_cache_key(behavior_code), []).append(behavior_code)
+
+        def preload(behavior_codes_for_key):
+            behavior_code = behavior_codes_for_key[0]
+            for code in behavior_codes_for_key:
+                self.preload_status[code] = "loading"
+            try:
+                self._warm_up_model(behavior_code)
+                result = "ready"
+            except Exception as e:
+                self.logger.error(f"Failed to preload model for behavior {behavior_code}: {e}")
+                result = f"error: {e}"
+            for code in behavior_codes_for_key:
+                self.preload_status[code] = result
+
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, MODEL_PRELOAD_WORKERS), thread_name_prefix="preload") as executor:
+                list(executor.map(preload, behaviors_by_key.values()))
+        finally:
+            self.ready_event.set()
+            self.logger.info(f"Model preload finished in {time.time() - started:.1f}s: {self.preload_status}")
+
+    def _warm_up_model(self, behavior_code):
+        """
+        Loads the model of a behavior and runs one dummy inference at the
+        configured input size so the first real frame does not pay for lazy
+        initialization. In thread mode the model stays pinned in the cache.
+        """
+        dummy_frame = np.zeros((INFERENCE_IMGSZ, INFERENCE_IMGSZ, 3), dtype=np.uint8)
+        if self.process_detector is not None:
+            # Loads (and warms) the model in one worker process
+            resolve_model_source(behavior_code)
+            ring = SharedFrameRing(1, dummy_frame.nbytes)
+            try:
+                self.process_detector.detect(ring, behavior_code, dummy_frame, timeout=None, annotate=False)
+            finally:
+                ring.close()
+            return
+
+        model_entry = self._get_model_for_behavior(behavior_code)
+        if model_entry is None:
+            raise RuntimeError(f"Failed to load YOLO model for behavior: {behavior_code}")
+        self.pinned_model_keys.append(model_entry.key)
+        model_entry.scheduler.submit(dummy_frame).result(timeout=None)
+        self.logger.info(f"Model for behavior {behavior_code} preloaded and warmed up.")
+
+    @property
+    def is_ready(self):
+        """False while startup preloading is still running."""
+        return self.ready_event.is_set()
+
     def _get_model_for_behavior(self, behavior_code):
         """
-        根据behavior_code获取对应的YOLO模型，并设置检测类别
-        
+        根据behavior_code从模型缓存中获取对应的模型（副本池及其批量推理调度器），并增加引用计数。
+        每次成功获取都必须在布控结束时调用 self.model_cache.release(cache_key)
+
         Args:
             behavior_code (str): 行为代码
-            
+
         Returns:
-            YOLO: 对应的YOLO模型实例，如果加载失败返回None
+            ModelCacheEntry: 对应的模型缓存条目，如果加载失败返回None
         """
         # 确定使用哪个模型路径
         model_path = BEHAVIOR_MODEL_MAP.get(behavior_code, DEFAULT_MODEL_PATH)
-        
-        # 创建包含类别信息的缓存key
-        classes = BEHAVIOR_CLASSES_MAP.get(behavior_code)
-        cache_key = f"{model_path}_{str(classes)}" if classes else model_path
-        
-        # 如果模型已经加载过，直接返回
-        if cache_key in self.loaded_models:
-            self.logger.info(f"Using cached model for behavior {behavior_code}: {model_path}")
-            return self.loaded_models[cache_key]
-        
-        # 加载新模型
-        try:
-            self.logger.info(f"Loading YOLO model for behavior {behavior_code}: {model_path}")
-            model = YOLO(model_path)
-            
-            # 如果该behavior配置了特定类别，设置模型检测类别
-            if classes:
-                self.logger.info(f"Setting model classes for behavior {behavior_code}: {classes}")
-                try:
-                    model.set_classes(classes)
-                    self.logger.info(f"Successfully set model classes: {classes}")
-                except Exception as e:
-                    self.logger.warning(f"Failed to set classes for model {model_path}: {e}")
-                    self.logger.warning("Model will use default classes")
-            
-            self.loaded_models[cache_key] = model
+        cache_key = self._get_model_cache_key(behavior_code)
+
+        # 缓存未命中时加载新模型（首个副本立即加载，其余副本按需加载）
+        def load_pool():
+            pool = ModelPool(cache_key, lambda: load_behavior_model(behavior_code), get_default_pool_size())
             self.logger.info(f"YOLO model loaded successfully for behavior {behavior_code}")
-            return model
+            return pool
+
+        try:
+            return self.model_cache.acquire(cache_key, load_pool)
         except Exception as e:
             self.logger.error(f"Failed to load YOLO model for behavior {behavior_code} from {model_path}: {e}")
             return None
 
-    def start_detection(self, code, behavior_code, stream_url, push_stream=False, push_stream_url=None):
+    def _get_model_cache_key(self, behavior_code):
+        """
+        Returns the model cache key for a behavior (model path plus class list,
+        plus the inference backend when it is not PyTorch).
+        """
+        model_path = BEHAVIOR_MODEL_MAP.get(behavior_code, DEFAULT_MODEL_PATH)
+        # 创建包含类别信息的缓存key
+        classes = BEHAVIOR_CLASSES_MAP.get(behavior_code)
+        cache_key = f"{model_path}_{str(classes)}" if classes else model_path
+        backend = get_backend_for_behavior(behavior_code)
+        return cache_key if backend == BACKEND_PYTORCH else f"{cache_key}_{backend}"
+
+    def start_detection(self, code, behavior_code, stream_url, push_stream=False, push_stream_url=None, interval=None,
+                        motion_threshold=None, rois=None, sensitivity=None, overlap_thresh=None,
+                        ingest_backend=None, decoder_options=None, analysis=None):
         """
         Start detection on a video stream with a threaded pipeline.
+
+        Args:
+            interval (int | None): Detection interval of the behavior. While the scene is idle
+                                   the model runs on one frame per `interval` input frames.
+                                   None uses DEFAULT_DETECTION_INTERVAL.
+            motion_threshold (float | None): Fraction of changed pixels below which inference is
+                                             skipped. None uses BEHAVIOR_MOTION_GATE_MAP, 0 disables the gate.
+            rois (list | None): Normalized ROI polygons from regions.parse_rois(). When given, only
+                                the crops around the ROIs are run through the model.
+            sensitivity (float | None): Confidence threshold (conf) of the model call, or of the tracker when tracking
+                                        is enabled. None keeps the model default.
+            overlap_thresh (float | None): IoU threshold of the model's NMS (iou). None keeps the model default.
+            ingest_backend (str | None): "opencv" or "ffmpeg". None uses DEFAULT_INGEST_BACKEND; keyframe-only
+                                         decoding (decoder option or BEHAVIOR_ANALYSIS_MAP) always uses "ffmpeg".
+            decoder_options (dict | None): FFmpeg decoder options from ingest.parse_decoder_options().
+            analysis (dict | None): Analysis width/fps from ingest.parse_analysis_options(), overriding
+                                    BEHAVIOR_ANALYSIS_MAP.
         """
         if code in self.controls and self.controls[code]["manager_thread"].is_alive():
             return False, f"Detection already running for code: {code}"
 
-        # 验证behavior并获取对应模型
-        model = self._get_model_for_behavior(behavior_code)
-        if model is None:
-            return False, f"Failed to load YOLO model for behavior: {behavior_code}"
-
         # Validate behavior code by attempting to get a handler
-        if get_behavior_handler(behavior_code, code) is None:
+        behavior_handler = get_behavior_handler(behavior_code, code)
+        if behavior_handler is None:
              return False, f"Unsupported behavior code: {behavior_code}"
 
+        # Class subset and thresholds are applied inside the model's postprocessing,
+        # so unused classes never reach NMS, tracking or annotation
+        predict_kwargs = {}
+        if behavior_handler.detection_classes:
+            predict_kwargs["classes"] = list(behavior_handler.detection_classes)
+        sensitivity = float(sensitivity) if sensitivity is not None else None
+        if TRACKER_ENABLED:
+            # The tracker applies the control's conf (its high threshold) itself; the model also
+            # returns the weaker boxes down to the low threshold, which can only continue tracks
+            high_threshold = TRACKER_HIGH_THRESHOLD if sensitivity is None else sensitivity
+            predict_kwargs["conf"] = min(TRACKER_LOW_THRESHOLD, high_threshold)
+        elif sensitivity is not None:
+            predict_kwargs["conf"] = sensitivity
+        if overlap_thresh is not None:
+            predict_kwargs["iou"] = float(overlap_thresh)
+
+        # Analysis resolution/fps applied in the decoder. Full-resolution frames are only kept
+        # when the pusher or the alarm clip recorder needs them
+        analysis = {**(BEHAVIOR_ANALYSIS_MAP.get(behavior_code) or {}), **(analysis or {})}
+        full_resolution = bool(push_stream) or behavior_handler.records_clips
+        # Keyframe-only decoding needs the FFmpeg backend (cv2.VideoCapture decodes every frame)
+        decoder_options = decoder_options or {}
+        keyframes_only = bool(decoder_options.get("keyframes_only", analysis.get("keyframes_only", False)))
+        ingest_backend = INGEST_FFMPEG if keyframes_only else (ingest_backend or DEFAULT_INGEST_BACKEND)
+
+        # 获取对应模型（增加模型缓存引用计数，布控清理时释放）
+        # 多进程检测模式下模型由工作进程加载，本进程只预先导出所需的ONNX/OpenVINO模型
+        model_entry = None
+        if self.process_detector is not None:
+            resolve_model_source(behavior_code)
+        else:
+            model_entry = self._get_model_for_behavior(behavior_code)
+            if model_entry is None:
+                return False, f"Failed to load YOLO model for behavior: {behavior_code}"
+
         logger.info(f"[{code}] Attempting to start detection for stream: {stream_url} with behavior: {behavior_code}")
 
         # ...existing code for creating queues and events...
-        frame_queue = queue.Queue(maxsize=FRAME_QUEUE_MAXSIZE)
+        # 最新帧优先邮箱（检测线程总是处理最新帧）或传统的FIFO队列
+        frame_queue = FrameMailbox() if FRAME_QUEUE_MODE == "mailbox" else queue.Queue(maxsize=FRAME_QUEUE_MAXSIZE)
         annotated_frame_queue = queue.Queue(maxsize=ANNOTATED_FRAME_QUEUE_MAXSIZE)
         stop_event = threading.Event()
         error_event = threading.Event()
@@ -118,10 +283,40 @@ class VideoProcessor:
         # Initialize control with behavior-specific model
         self.controls[code] = {
             "behavior_code": behavior_code,
-            "model": model,  # 为每个control分配特定的模型
+            "model": model_entry.pool if model_entry else None,  # 该behavior对应的模型副本池
+            "scheduler": model_entry.scheduler if model_entry else None,  # 共享该模型的批量推理调度器
+            "model_cache_key": model_entry.key if model_entry else None,  # 用于在清理时释放模型缓存引用
+            "frame_ring": None,  # 多进程检测模式下与工作进程交换帧的共享内存环
             "stream_url": stream_url,
+            "ingest_backend": ingest_backend,  # 拉流解码方式：opencv 或 ffmpeg
+            "decoder_options": decoder_options,  # FFmpeg解码参数（线程数、缩放、帧率、低延迟、仅关键帧）
+            "ingest_dropped_frames": 0,  # FFmpeg拉流时因缓冲区全部占用而丢弃的帧
+            "ingest_buffers": 0,  # FFmpeg拉流已分配的帧缓冲区数量
+            "analysis": analysis,  # 解码时应用的分析分辨率（width）和帧率（fps）
+            "full_resolution": full_resolution,  # 推流或告警录像需要原始分辨率时不在解码时缩放
+            "decimated_frames": 0,  # OpenCV拉流时只grab()不retrieve()而跳过的帧
+            "keyframes_only": keyframes_only,  # 仅解码关键帧（I帧）
+            "analysis_rate": 0.0,  # 实测进入流水线的帧率（仅关键帧模式下取决于GOP）
             "push_stream": push_stream,
             "push_stream_url": push_stream_url,
+            "interval": interval,
+            "sampling_mode": AdaptiveSampler.MODE_ACTIVE,
+            "skipped_frames": 0,
+            "motion_threshold": motion_threshold,
+            "motion_gate_hit_rate": 0.0,
+            "motion_score": 0.0,
+            "duplicate_cache_hits": 0,  # 与上一次推理帧几乎相同、直接复用检测结果的帧数
+            "duplicate_cache_hit_ratio": 0.0,
+            "last_detections": [],
+            "tracked_objects": 0,
+            "dropped_frames": 0,  # 检测线程来不及处理而被丢弃的帧
+            "stale_frames": 0,  # 超过FRAME_MAX_AGE_SECONDS而在推理前被丢弃的帧
+            "class_names": None,
+            "predict_kwargs": predict_kwargs,  # 推理参数：行为需要的类别子集及置信度/IoU阈值
+            "sensitivity": sensitivity,  # 布控的置信度阈值（None为模型默认值；开启跟踪时由跟踪器应用）
+            "rois": rois or [],  # 检测区域（归一化坐标多边形），为空时检测整帧
+            "tiling": BEHAVIOR_TILING_MAP.get(behavior_code),  # 切片推理配置（tile_size, overlap），None表示不切片
+            "inference_regions": None,  # 按当前帧尺寸缓存的推理区域（ROI裁剪区域及切片）
             "frame_queue": frame_queue,
             "annotated_frame_queue": annotated_frame_queue,
             "stop_event": stop_event,
@@ -132,13 +327,17 @@ class VideoProcessor:
             "status": "starting",
             "error": None,
             "manager_thread": None,
-            "puller_thread": None,
             "detector_thread": None,
             "pusher_thread": None,
             "width": 0,
             "height": 0,
             "input_fps": 0.0,
             "frame_buffer": collections.deque(maxlen=1),
+            "latest_annotated_frame": None,  # 最新一帧（延迟标注），供截图接口使用
+            "stage_stats": PipelineStats(STAGE_STATS_WINDOW),  # 各处理阶段的延迟统计
+            "arrival_stats": ArrivalStats(STAGE_STATS_WINDOW),  # 帧到达间隔、抖动、断流和突发统计
+            "pts_discontinuities": 0,  # 源PTS回退或跳变（重新对齐时间轴）的次数
+            "frame_time": None,  # 当前帧按PTS换算的呈现时间（单调时钟），供行为计时使用
             "is_saving_video": False,
             "save_video_thread_active": False
         }
@@ -238,14 +437,70 @@ class VideoProcessor:
             "pushStream": control.get("push_stream"),
             "pushStreamUrl": control.get("push_stream_url"),
             "checkFps": control.get("fps", 0.0),
+            "ingestBackend": control.get("ingest_backend"),
+            "ingestDroppedFrames": control.get("ingest_dropped_frames", 0),
+            "ingestBuffers": control.get("ingest_buffers", 0),
+            "sourceSubscribers": control["stream_source"].subscriber_count if control.get("stream_source") else 0,
+            "connection": control["stream_source"].connection.summary() if control.get("stream_source") else None,
+            "analysisWidth": None if control.get("full_resolution") else (control.get("analysis") or {}).get("width"),
+            "analysisFps": (control.get("analysis") or {}).get("fps"),
+            "fullResolution": control.get("full_resolution"),
+            "decimatedFrames": control.get("decimated_frames", 0),
+            "keyframesOnly": control.get("keyframes_only", False),
+            "analysisRate": round(control.get("analysis_rate", 0.0), 2),
             "status": status,
             "uptime": uptime,
             "error": control.get("error", None),
             "width": control.get("width", 0),
             "height": control.get("height", 0),
-            "inputFps": control.get("input_fps", 0.0)
+            "inputFps": control.get("input_fps", 0.0),
+            "detectorMode": "process" if self.process_detector is not None else "thread",
+            "samplingMode": control.get("sampling_mode"),
+            "skippedFrames": control.get("skipped_frames", 0),
+            "motionGateHitRate": control.get("motion_gate_hit_rate", 0.0),
+            "motionScore": control.get("motion_score", 0.0),
+            "duplicateCacheHits": control.get("duplicate_cache_hits", 0),
+            "duplicateCacheHitRatio": control.get("duplicate_cache_hit_ratio", 0.0),
+            "roiCount": len(control.get("rois") or []),
+            "inferenceRegions": len(control["inference_regions"][1]) if control.get("inference_regions") else 1,
+            "trackedObjects": control.get("tracked_objects", 0),
+            "frameQueueMode": FRAME_QUEUE_MODE,
+            "droppedFrames": control["frame_queue"].dropped if isinstance(control.get("frame_queue"), FrameMailbox) else control.get("dropped_frames", 0),
+            "staleFrames": control.get("stale_frames", 0),
+            "sensitivity": control.get("sensitivity"),
+            "overlapThresh": control["predict_kwargs"].get("iou"),
+            "detectionClasses": control["predict_kwargs"].get("classes"),
+            "stageLatency": control["stage_stats"].summary(),
+            "arrival": dict(control["arrival_stats"].summary(), ptsDiscontinuities=control.get("pts_discontinuities", 0))
         }
 
+    def get_stage_stats(self, code=None):
+        """
+        Get the per-stage latency statistics (p50/p95/p99 in milliseconds) of one
+        or all controls, to tell whether a pipeline is decode-, model- or encoder-bound.
+
+        Args:
+            code (str | None): The unique code for the control instance, or None for all controls.
+
+        Returns:
+            dict | None: Control code -> {"checkFps", "inputFps", "stages"}
+                         (None if the given control does not exist).
+        """
+        codes = [code] if code is not None else list(self.controls.keys())
+        stats = {}
+        for control_code in codes:
+            control = self.controls.get(control_code)
+            if control is None:
+                if code is not None:
+                    return None
+                continue
+            stats[control_code] = {
+                "checkFps": control.get("fps", 0.0),
+                "inputFps": control.get("input_fps", 0.0),
+                "stages": control["stage_stats"].summary()
+            }
+        return stats
+
     def get_all_controls(self):
         """
         Get status of all active controls.
@@ -260,6 +515,44 @@ class VideoProcessor:
             controls_list.append(self.get_status(code))
         return controls_list
 
+    def get_snapshot(self, code):
+        """
+        Renders the latest frame of a control with its annotations (drawn now if
+        no pusher or alarm save has rendered it yet) and encodes it as JPEG.
+
+        Args:
+            code (str): The unique code for the control instance.
+
+        Returns:
+            bytes | None: The JPEG image, or None if the control is unknown or has no frame yet.
+        """
+        control = self.controls.get(code)
+        if not control:
+            return None
+        # Hold the frame's pooled buffer while rendering; if the detector replaced and released
+        # the frame in the meantime, take the newer one
+        while True:
+            latest = control.get("latest_annotated_frame")
+            if latest is None:
+                return None
+            if latest.retain():
+                break
+        try:
+            image = render_frame(latest)
+        finally:
+            latest.release()
+        ok, encoded = cv2.imencode(".jpg", image)
+        return encoded.tobytes() if ok else None
+
+    def get_model_cache_stats(self):
+        """
+        Get model cache counters (hits, misses, evictions) and the models currently loaded.
+
+        Returns:
+            dict: The model cache statistics.
+        """
+        return self.model_cache.get_stats()
+
     def _manage_pipeline(self, code):
         """Manages the stream processing pipeline threads for a single control."""
         control = self.controls.get(code)
@@ -268,27 +561,21 @@ class VideoProcessor:
              return
 
         # ...existing code...
-        stream_url = control["stream_url"]
         push_stream = control["push_stream"]
         push_stream_url = control["push_stream_url"]
         frame_queue = control["frame_queue"]
         annotated_frame_queue = control["annotated_frame_queue"]
         stop_event = control["stop_event"]
         error_event = control["error_event"]
-        model = control["model"]  # 使用control专属的模型
+        scheduler = control["scheduler"]  # 使用该模型共享的批量推理调度器
 
         logger.info(f"[{code}] Pipeline manager started.")
         control["status"] = "running"
 
-        # 传递模型给detector线程
-        puller_thread = threading.Thread(
-            target=self._pull_stream,
-            args=(code, stream_url, frame_queue, stop_event, error_event, control),
-            daemon=True
-        )
+        # 传递推理调度器给detector线程
         detector_thread = threading.Thread(
             target=self._detect_frames,
-            args=(code, frame_queue, annotated_frame_queue, stop_event, error_event, model, control),
+            args=(code, frame_queue, annotated_frame_queue, stop_event, error_event, scheduler, control),
             daemon=True
         )
         pusher_thread = threading.Thread(
@@ -298,24 +585,25 @@ class VideoProcessor:
         )
 
         # ...existing code for thread management...
-        control["puller_thread"] = puller_thread
         control["detector_thread"] = detector_thread
         control["pusher_thread"] = pusher_thread
 
-        puller_thread.start()
+        # Frames come from the shared source of the stream URL: controls on the same camera
+        # share one connection and one decoder, each getting the frames in its own queue
+        source = self.stream_sources.acquire(code, control)
         detector_thread.start()
         if push_stream:
             pusher_thread.start()
 
-        logger.info(f"[{code}] Puller, Detector, Pusher threads started with behavior-specific model.")
+        logger.info(f"[{code}] Subscribed to stream source ({source.subscriber_count} subscriber(s)); Detector, Pusher threads started with behavior-specific model.")
 
         # ...existing code for monitoring and cleanup...
         try:
             while not stop_event.is_set() and not error_event.is_set():
-                if not puller_thread.is_alive():
-                    logger.error(f"[{code}] Puller thread died unexpectedly.")
+                if not source.is_alive():
+                    logger.error(f"[{code}] Stream source puller died unexpectedly.")
                     error_event.set()
-                    control["error"] = control.get("error", "Puller thread died unexpectedly.")
+                    control["error"] = control.get("error") or "Puller thread died unexpectedly."
                     break
                 if not detector_thread.is_alive():
                     logger.error(f"[{code}] Detector thread died unexpectedly.")
@@ -342,9 +630,8 @@ class VideoProcessor:
             stop_event.set()
 
             timeout = THREAD_JOIN_TIMEOUT_SECONDS
-            puller_thread.join(timeout=timeout)
-            if puller_thread.is_alive():
-                logger.warning(f"[{code}] Puller thread did not join within timeout.")
+            # Stops the source's puller if this was its last subscriber
+            self.stream_sources.release(code, control)
             detector_thread.join(timeout=timeout)
             if detector_thread.is_alive():
                 logger.warning(f"[{code}] Detector thread did not join within timeout.")
@@ -357,72 +644,12 @@ class VideoProcessor:
             logger.info(f"[{code}] Manager finished cleanup and exited.")
 
 
-    def _pull_stream(self, code, stream_url, frame_queue, stop_event, error_event, control):
-        """Thread to pull frames from the video stream using OpenCV."""
-        cap = None
-        logger.info(f"[{code}] Puller thread started.")
-        try:
-            while not stop_event.is_set() and not error_event.is_set():
-                if cap is None or not cap.isOpened():
-                    logger.info(f"[{code}] Puller attempting to open stream: {stream_url}")
-                    # Add configurations for specific stream types if needed (e.g., RTSP options)
-                    # cap = cv2.VideoCapture(stream_url, cv2.CAP_FFMPEG) # Example using FFmpeg backend
-                    cap = cv2.VideoCapture(stream_url)
-                    if not cap.isOpened():
-                        logger.warning(f"[{code}] Puller failed to open stream. Retrying in {STREAM_RECONNECT_DELAY_SECONDS} seconds.")
-                        time.sleep(STREAM_RECONNECT_DELAY_SECONDS) # Wait before re-opening
-                        continue # Try opening again
-                    else:
-                        logger.info(f"[{code}] Puller successfully opened stream.")
-                        # Get stream properties once opened
-                        control["width"] = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-                        control["height"] = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-                        control["input_fps"] = cap.get(cv2.CAP_PROP_FPS)
-                        if control["input_fps"] <= 0:
-                             logger.warning(f"[{code}] Puller could not get input stream FPS ({control['input_fps']}), defaulting to 25.0.")
-                             control["input_fps"] = 25.0 # Default if FPS is zero or negative
-                        logger.info(f"[{code}] Puller stream properties: {control['width']}x{control['height']} @ {control['input_fps']:.2f} fps")
-
-                ret, frame = cap.read()
-                if not ret or frame is None:
-                    logger.warning(f"[{code}] Puller received empty frame or stream ended (ret={ret}, frame is None={frame is None}). Attempting to re-open.")
-                    if cap:
-                        cap.release() # Release the old capture object
-                    cap = None # Set cap to None to trigger re-opening in the next iteration
-                    time.sleep(STREAM_RECONNECT_DELAY_SECONDS) # Wait a bit before trying to reconnect
-                    continue # Continue loop to attempt re-opening
-
-                # Put frame and timestamp into the queue (non-blocking if queue is full)
-                try:
-                    # Store raw frame and timestamp
-                    frame_queue.put_nowait((frame, time.time()))
-                except queue.Full:
-                    # logger.warning(f"[{code}] Puller frame queue is full. Dropping frame.")
-                    # Dropping frames is acceptable under load, no need to log excessively
-                    pass # Drop the frame if the queue is full
-
-        except Exception as e:
-            logger.exception(f"[{code}] Exception in puller thread: {e}")
-            error_event.set() # Signal error
-            control["error"] = control.get("error", f"Exception in puller thread: {e}")
-
-        finally:
-            logger.info(f"[{code}] Puller thread cleaning up.")
-            if cap:
-                cap.release()
-                logger.info(f"[{code}] Puller released video capture.")
-            # Clear the queue on exit to prevent blocking consumers
-            while not frame_queue.empty():
-                try:
-                    frame_queue.get_nowait()
-                except queue.Empty:
-                    pass # Queue is empty
-            logger.info(f"[{code}] Puller thread exited.")
-
-
-    def _detect_frames(self, code, frame_queue, annotated_frame_queue, stop_event, error_event, model, control):
+    def _detect_frames(self, code, frame_queue, annotated_frame_queue, stop_event, error_event, scheduler, control):
         """
         Thread to perform object detection on frames and delegate to behavior logic.
+        Inference is submitted to the model's shared scheduler, which batches
+        frames from every control using the same model, or, in process-pool
+        mode, to a detector worker process through shared memory.
         """
         logger.info(f"[{code}] Detector thread started.")
         frames_processed_interval = 0
@@ -438,16 +665,24 @@ class VideoProcessor:
              time.sleep(0.1) # Short sleep while waiting
 
         input_fps = control.get("input_fps", 25.0) # Default if still not available or invalid
-        # Set buffer maxlen based on input_fps and desired save duration
-        buffer_maxlen = int(input_fps * VIDEO_SAVE_DURATION_SECONDS * 1.5) # Buffer a bit more than needed
-        # Initialize or re-initialize frame_buffer with the correct maxlen
-        control["frame_buffer"] = collections.deque(maxlen=max(1, buffer_maxlen)) # Ensure maxlen is at least 1
-        logger.info(f"[{code}] Detector buffer maxlen set to {control['frame_buffer'].maxlen} frames (based on {input_fps:.2f} FPS).")
 
         # Instantiate the correct behavior handler based on behavior_code
         behavior_code = control["behavior_code"]
         behavior_handler = get_behavior_handler(behavior_code, code)
 
+        # Set buffer maxlen based on input_fps and desired save duration; behaviors that never
+        # record a clip keep only the latest frame (buffered frames pin ingest buffers)
+        if behavior_handler is None or behavior_handler.records_clips:
+            buffer_maxlen = int(input_fps * VIDEO_SAVE_DURATION_SECONDS * 1.5) # Buffer a bit more than needed
+        else:
+            buffer_maxlen = 1
+        # Initialize or re-initialize frame_buffer with the correct maxlen
+        control["frame_buffer"] = collections.deque(maxlen=max(1, buffer_maxlen)) # Ensure maxlen is at least 1
+        logger.info(f"[{code}] Detector buffer maxlen set to {control['frame_buffer'].maxlen} frames (based on {input_fps:.2f} FPS).")
+        # The clip buffer pins that many pooled ingest buffers: size the source's pool for it
+        if control.get("stream_source") is not None:
+            control["stream_source"].reserve_clip_frames(code, control["frame_buffer"].maxlen)
+
         if behavior_handler:
             behavior_handler.on_detection_start(control) # Call optional start method
             logger.info(f"[{code}] Loaded behavior handler: {behavior_handler.__class__.__name__}")
@@ -458,12 +693,53 @@ class VideoProcessor:
             control["error"] = control.get("error", f"Unsupported behavior code: {behavior_code}")
             return # Exit thread if behavior handler is critical and not found
 
+        # Adaptive inference rate: full input FPS while the scene is active, input FPS / interval
+        # once nothing has been detected for ADAPTIVE_IDLE_AFTER_SECONDS
+        interval = max(1, int(control.get("interval") or DEFAULT_DETECTION_INTERVAL))
+        if ADAPTIVE_SAMPLING_ENABLED:
+            sampler = AdaptiveSampler(input_fps, input_fps / interval, ADAPTIVE_IDLE_AFTER_SECONDS)
+        else:
+            sampler = AdaptiveSampler(input_fps, input_fps, float("inf"))
+        logger.info(f"[{code}] Detector inference rate: {sampler.max_fps:.2f} fps active, {sampler.min_fps:.2f} fps idle (interval={interval}).")
+
+        # Optional motion gate: skip inference on frames without motion and reuse the last detections
+        motion_gate = None
+        motion_threshold = control.get("motion_threshold")
+        if motion_threshold is None:
+            motion_threshold = BEHAVIOR_MOTION_GATE_MAP.get(behavior_code)
+        if motion_threshold:
+            motion_gate = MotionGate(motion_threshold, MOTION_GATE_METHOD, MOTION_GATE_DOWNSCALE_WIDTH,
+                                     MOTION_GATE_PIXEL_THRESHOLD, MOTION_GATE_MAX_SKIP_SECONDS)
+            logger.info(f"[{code}] Motion gate enabled ({MOTION_GATE_METHOD}, threshold={motion_threshold}).")
+
+        # Near-duplicate frames (frozen sources) reuse the cached detections of the last inferred frame
+        duplicate_cache = None
+        if DUPLICATE_FRAME_CACHE_ENABLED:
+            duplicate_cache = DuplicateFrameCache(DUPLICATE_FRAME_THUMBNAIL_WIDTH, DUPLICATE_FRAME_MAX_PIXEL_DIFF,
+                                                  DUPLICATE_FRAME_MAX_AGE_SECONDS)
+
+        # Optional tracker: stable track ids, and predicted boxes on frames that skip inference
+        tracker = None
+        detect_every = 1
+        frames_since_inference = 0
+        if TRACKER_ENABLED:
+            # The control's conf (sensitivity) decides which boxes start tracks; the model was called
+            # with the lower conf of the second association stage (see start_detection)
+            sensitivity = control.get("sensitivity")
+            high_threshold = TRACKER_HIGH_THRESHOLD if sensitivity is None else sensitivity
+            low_threshold = (control.get("predict_kwargs") or {}).get("conf", min(TRACKER_LOW_THRESHOLD, high_threshold))
+            tracker = BoxTracker(high_threshold, low_threshold, TRACKER_MATCH_IOU_THRESHOLD, TRACKER_MAX_LOST_FRAMES)
+            detect_every = max(1, int(TRACKER_DETECT_EVERY_N_FRAMES))
+            logger.info(f"[{code}] Tracker enabled (inference on every {detect_every} frame(s)).")
+
+        # The detector's hold on the pooled buffer of the frame being processed (None for unpooled frames)
+        lease = None
         try:
             while not stop_event.is_set() and not error_event.is_set():
                 try:
-                    # Get frame and timestamp from the queue with a timeout
+                    # Get frame, timestamp and buffer lease from the queue with a timeout
                     # Use configured timeout
-                    frame, frame_timestamp = frame_queue.get(timeout=DETECTOR_QUEUE_GET_TIMEOUT)
+                    frame, frame_time, lease = frame_queue.get(timeout=DETECTOR_QUEUE_GET_TIMEOUT)
                 except queue.Empty:
                     # If queue is empty, check stop event and continue if not set
                     if stop_event.is_set() or error_event.is_set():
@@ -471,27 +747,85 @@ class VideoProcessor:
                     # No sleep needed here, timeout in get() handles waiting
                     continue # Try getting frame again
 
-                # Run model on frame
-                try:
-                    # results is a list of Results objects
-                    results = model(frame, verbose=False)
-                    # results[0] contains the results for the first image (our frame)
-                    # .plot() draws bounding boxes, masks, etc.
-                    # .boxes.data.tolist() gives raw detection data [x1, y1, x2, y2, confidence, class_id]
-                    annotated_frame = results[0].plot() if results and results[0] else frame.copy() # Use a copy if no results
-                    detections = results[0].boxes.data.tolist() if results and results[0] else []
-                except Exception as e:
-                    logger.error(f"[{code}] Error during model inference or initial annotation: {str(e)}")
-                    annotated_frame = frame.copy() # Use original frame copy if annotation fails
-                    detections = [] # No valid detections
-
+                frame_age = frame_time.age
+                control["stage_stats"].record(STAGE_QUEUE_WAIT, frame_age)
+
+                # Discard frames that waited too long; alarms on stale frames are worse than skipping them
+                if frame_time.is_older_than(FRAME_MAX_AGE_SECONDS):
+                    control["stale_frames"] = control.get("stale_frames", 0) + 1
+                    lease = self._release_lease(lease)
+                    frame_queue.task_done()
+                    continue
+
+                # Run model on frame, unless the scene is idle and the adaptive sampler
+                # says this frame falls between two low-rate inferences, the tracker only
+                # needs every Nth frame, or the motion gate finds the scene unchanged
+                # since the last inferred frame. Skipped frames get the tracker's
+                # predicted boxes (or, without a tracker, the last detections).
+                # Near-duplicates of the last inferred frame get its cached detections.
+                # Timing uses the frame's PTS-based stream time, not when it happened to arrive
+                frame_timestamp = frame_time.stream_time
+                control["frame_time"] = frame_timestamp
+                if not sampler.should_infer(frame_timestamp):
+                    # Only reached in idle mode, i.e. the last inference found nothing
+                    detections = tracker.predict() if tracker is not None else []
+                elif frames_since_inference < detect_every - 1:
+                    detections = tracker.predict()
+                elif motion_gate is not None and not motion_gate.should_infer(frame, frame_timestamp):
+                    # Static scene: reuse the last detections on the current frame
+                    detections = tracker.predict() if tracker is not None else control["last_detections"]
+                else:
+                    # A frame identical to the last inferred one gets that frame's raw detections
+                    # (cached before tracking, so the tracker still advances on cache hits)
+                    detections = duplicate_cache.lookup(frame, frame_timestamp) if duplicate_cache is not None else None
+                    if detections is None:
+                        with control["stage_stats"].time(STAGE_INFERENCE):
+                            detections = self._run_inference(code, control, scheduler, frame)
+                        if detections is None:
+                            # Inference failed: nothing detected on this frame, and nothing cached
+                            detections = []
+                        elif duplicate_cache is not None:
+                            duplicate_cache.store(detections, frame_timestamp)
+                    if tracker is not None:
+                        detections = tracker.update(detections)
+                    sampler.update(frame_timestamp, len(detections) > 0)
+                    if motion_gate is not None:
+                        motion_gate.mark_inferred(frame_timestamp)
+                    control["last_detections"] = detections
+                    frames_since_inference = -1
+                frames_since_inference += 1
+                if tracker is not None:
+                    control["tracked_objects"] = tracker.active_count
+                control["sampling_mode"] = sampler.mode
+                control["skipped_frames"] = sampler.skipped_frames
+                if duplicate_cache is not None:
+                    control["duplicate_cache_hits"] = duplicate_cache.hits
+                    control["duplicate_cache_hit_ratio"] = duplicate_cache.hit_ratio
+                if motion_gate is not None:
+                    control["motion_gate_hit_rate"] = motion_gate.hit_rate
+                    control["motion_score"] = motion_gate.last_score
+
+
+                # Annotations are only drawn when the pusher, an alarm save or a snapshot needs the frame
+                annotated_frame = self._annotate_lazily(control, frame, detections, lease)
 
                 # --- Delegate Behavior Logic ---
                 event_triggered = False
                 if behavior_handler:
-                     # The behavior_handler processes the frame, potentially adds its own annotations,
-                     # updates control_state, and signals if an event was triggered.
-                    annotated_frame, event_triggered = behavior_handler.process_frame(annotated_frame, detections, control)
+                     # The behavior_handler updates control_state and signals if an event was triggered;
+                     # its own annotations are added as a deferred drawing step. Behaviors that only
+                     # implement process_frame draw on the rendered frame right away.
+                    behavior_detections = Detections(detections, control.get("class_names"))
+                    if behavior_handler.draws_lazily:
+                        with control["stage_stats"].time(STAGE_BEHAVIOR):
+                            event_triggered = behavior_handler.evaluate(behavior_detections, control)
+                        annotated_frame.add_renderer(functools.partial(behavior_handler.draw_overlay, detections=behavior_detections))
+                    else:
+                        with control["stage_stats"].time(STAGE_ANNOTATION):
+                            general_frame = annotated_frame.render()
+                        with control["stage_stats"].time(STAGE_BEHAVIOR):
+                            behavior_frame, event_triggered = behavior_handler.process_frame(general_frame, behavior_detections, control)
+                        annotated_frame = LazyAnnotatedFrame.from_image(behavior_frame)
 
                 if event_triggered:
                     # Handle the triggered event, e.g., start video saving
@@ -503,9 +837,16 @@ class VideoProcessor:
                         control["save_video_thread_active"] = True
 
                         frames_to_save = list(control["frame_buffer"]) # Get frames from buffer
+                        for buffered_frame in frames_to_save:
+                            buffered_frame.retain() # Held by the save thread until the clip is written
                         input_fps_for_save = control.get("input_fps", 25.0) # Use detected FPS or default
-                        width_for_save = control.get("width", frame.shape[1] if frame is not None else 0)
-                        height_for_save = control.get("height", frame.shape[0] if frame is not None else 0)
+                        # Size the clip by the buffered frames, not the control: the shared source may
+                        # have reopened with another resolution since
+                        if frames_to_save:
+                            height_for_save, width_for_save = frames_to_save[-1].shape[:2]
+                        else:
+                            width_for_save = control.get("width", frame.shape[1] if frame is not None else 0)
+                            height_for_save = control.get("height", frame.shape[0] if frame is not None else 0)
                         behavior_code_for_save = control.get("behavior_code")
 
                         # Get alarm data from the behavior handler
@@ -519,7 +860,7 @@ class VideoProcessor:
                         # The utility function will create the Alarm record in SQLite.
                         # Pass the main controls dictionary so the utility function can update flags
                         save_video_thread = threading.Thread(
-                            target=save_buffered_video, # Call the utility function
+                            target=self._save_clip, # Calls save_buffered_video, then releases the frames
                             # Pass alarm_data and self.controls to the utility function
                             args=(code, frames_to_save, input_fps_for_save, width_for_save, height_for_save, behavior_code_for_save, alarm_data, self.controls),
                             daemon=True # Allow main program to exit
@@ -533,18 +874,38 @@ class VideoProcessor:
 
                 # --- End Delegate Behavior Logic ---
 
-                # Add the final annotated frame to the buffer for potential saving
-                # Ensure we append a copy if the frame object might be modified later
-                control["frame_buffer"].append(annotated_frame.copy())
-
+                # Add the (not yet rendered) annotated frame to the buffer for potential saving;
+                # the save thread renders the buffered frames. Neither the raw frame nor a
+                # rendered image is modified after this point, so no copy is needed
+                # A clip has one frame size: drop the buffered frames when the source changed resolution
+                frame_buffer = control["frame_buffer"]
+                if frame_buffer and frame_buffer[-1].shape[:2] != annotated_frame.shape[:2]:
+                    self.logger.info(f"[{code}] Frame size changed to {annotated_frame.shape[1]}x{annotated_frame.shape[0]}, clearing the clip buffer.")
+                    self._clear_frame_buffer(frame_buffer)
+                if len(frame_buffer) == frame_buffer.maxlen:
+                    frame_buffer[0].release() # Evicted by the append below
+                annotated_frame.retain() # Held by the clip buffer until evicted
+                frame_buffer.append(annotated_frame)
+                annotated_frame.retain() # Held as the snapshot frame until the next one replaces it
+                previous_frame = control.get("latest_annotated_frame")
+                control["latest_annotated_frame"] = annotated_frame
+                if previous_frame is not None:
+                    previous_frame.release()
+
+
+                # Put the final annotated frame into the output queue (non-blocking if queue is full);
+                # without a pusher nobody would render it, so it is not queued at all
+                if control.get("push_stream"):
+                    annotated_frame.retain() # Released by the pusher once the frame is rendered
+                    try:
+                        annotated_frame_queue.put_nowait(annotated_frame)
+                    except queue.Full:
+                        # logger.warning(f"[{code}] Detector annotated frame queue is full. Dropping frame.")
+                        # Dropping annotated frames is acceptable under load
+                        annotated_frame.release() # Drop the frame if the queue is full
 
-                # Put the final annotated frame into the output queue (non-blocking if queue is full)
-                try:
-                    annotated_frame_queue.put_nowait(annotated_frame)
-                except queue.Full:
-                    # logger.warning(f"[{code}] Detector annotated frame queue is full. Dropping frame.")
-                    # Dropping annotated frames is acceptable under load
-                    pass # Drop the frame if the queue is full
+                # The clip buffer, snapshot and pusher queue hold their own references now
+                lease = self._release_lease(lease)
 
                 # Mark the task as done for the item retrieved from the input queue
                 frame_queue.task_done()
@@ -570,17 +931,193 @@ class VideoProcessor:
             if behavior_handler:
                  behavior_handler.on_detection_stop(control) # Call optional stop method
 
+            # Release the shared memory ring used in process-pool mode (once timed-out requests finish)
+            if control.get("frame_ring") is not None:
+                control["frame_ring"].close_when_idle()
+                control["frame_ring"] = None
+
             # Mark any remaining items in the input queue as done if they were retrieved before stopping
             # This is tricky with get(timeout) and potential exceptions, but important for proper queue joining if used
             # For simplicity with daemon threads, we might skip explicit task_done for remaining items on exit.
+            # Return every pooled buffer this control still holds
+            self._release_lease(lease)
+            self._clear_frame_buffer(control["frame_buffer"])
+            latest_frame = control.pop("latest_annotated_frame", None)
+            if latest_frame is not None:
+                latest_frame.release()
             # Clear the output queue on exit
             while not annotated_frame_queue.empty():
                 try:
-                    annotated_frame_queue.get_nowait()
+                    annotated_frame_queue.get_nowait().release()
                 except queue.Empty:
                     pass # Queue is empty
             logger.info(f"[{code}] Detector thread exited.")
 
+    @staticmethod
+    def _release_lease(lease):
+        """Releases a hold on a pooled frame buffer (None for unpooled frames); returns None."""
+        if lease is not None:
+            lease.release()
+        return None
+
+    @staticmethod
+    def _clear_frame_buffer(frame_buffer):
+        """Empties a clip buffer, releasing its holds on the buffered frames."""
+        while frame_buffer:
+            frame_buffer.popleft().release()
+
+    def _save_clip(self, code, frames, *save_args):
+        """Save thread: writes the clip with save_buffered_video, then releases the save's holds on the frames."""
+        try:
+            save_buffered_video(code, frames, *save_args)
+        finally:
+            for frame in frames:
+                frame.release()
+
+
+    def _run_inference(self, code, control, scheduler, frame):
+        """
+        Runs the model on one frame, or only on the crops around the control's
+        ROIs and/or on overlapping tiles (tiled inference).
+        Nothing is drawn here; see _annotate_lazily.
+
+        Args:
+            code (str): The unique code for the control instance.
+            control (dict): The control state dictionary.
+            scheduler (InferenceScheduler | None): The model's shared scheduler (None in process-pool mode).
+            frame (np.ndarray): The raw BGR frame.
+
+        Returns:
+            np.ndarray | None: The raw detections ([x1, y1, x2, y2, confidence, class_id] each),
+                               or None if inference failed.
+        """
+        try:
+            if not control.get("rois") and not control.get("tiling"):
+                _, detections = self._infer_images(control, scheduler, [frame], annotate=False)[0]
+            else:
+                # 只对检测区域的裁剪图/切片推理（同一批次），再将检测框映射回整帧坐标
+                regions, roi_layout = self._get_inference_regions(control, frame)
+                images = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in regions]
+                outputs = self._infer_images(control, scheduler, images, annotate=False)
+
+                detections = np.concatenate([
+                    offset_detections(region_detections, x1, y1)
+                    for (x1, y1, _, _), (_, region_detections) in zip(regions, outputs)
+                ])
+                if roi_layout is not None:
+                    # Drop boxes outside the ROI polygons (crops are padded bounding rectangles)
+                    detections = filter_detections_in_polygons(detections, roi_layout.polygons)
+                if len(regions) > 1:
+                    if control.get("tiling"):
+                        detections = nms_detections(detections, TILE_MERGE_IOU_THRESHOLD, TILE_MERGE_METRIC)
+                    else:
+                        detections = nms_detections(detections, ROI_MERGE_IOU_THRESHOLD)
+
+            return detections
+        except Exception as e:
+            logger.error(f"[{code}] Error during model inference: {str(e)}")
+            # No valid detections
+            return None
+
+    def _annotate_lazily(self, control, frame, detections, lease=None):
+        """
+        Wraps a raw frame in a LazyAnnotatedFrame that draws the general detections
+        (and the control's ROI outlines, if any) when it is first rendered.
+        The frame's buffer lease goes with it, for the holders of the annotated frame.
+        """
+        names = control.get("class_names")
+        cached = control.get("inference_regions")
+        roi_layout = cached[2] if cached is not None else None
+
+        def draw_general_detections(image):
+            draw_detections(image, detections, names, inplace=True)
+            if roi_layout is not None:
+                roi_layout.draw(image)
+            return image
+
+        return LazyAnnotatedFrame(frame, [draw_general_detections], lease)
+
+    def _get_inference_regions(self, control, frame):
+        """
+        Returns the frame regions run through the model: the ROI crops (or the
+        whole frame), each split into overlapping tiles if the behavior uses
+        tiled inference. Cached in the control until the frame size changes.
+
+        Args:
+            control (dict): The control state dictionary.
+            frame (np.ndarray): The raw BGR frame.
+
+        Returns:
+            tuple[list, RoiLayout | None]: (x1, y1, x2, y2) regions in frame coordinates,
+                                           and the ROI layout if the control has ROIs.
+        """
+        cached = control.get("inference_regions")
+        if cached is not None and cached[0] == frame.shape[:2]:
+            return cached[1], cached[2]
+
+        height, width = frame.shape[:2]
+        roi_layout = None
+        base_regions = [(0, 0, width, height)]
+        if control.get("rois"):
+            roi_layout = RoiLayout(control["rois"], width, height, ROI_CROP_PADDING)
+            base_regions = roi_layout.crops
+
+        tiling = control.get("tiling")
+        if not tiling:
+            regions = list(base_regions)
+        else:
+            regions = []
+            for x1, y1, x2, y2 in base_regions:
+                tiles = get_tile_layout(x2 - x1, y2 - y1, tiling["tile_size"], tiling["overlap"])
+                if TILED_INFERENCE_INCLUDE_FULL_FRAME and len(tiles) > 1:
+                    regions.append((x1, y1, x2, y2))
+                regions.extend((x1 + tx1, y1 + ty1, x1 + tx2, y1 + ty2) for tx1, ty1, tx2, ty2 in tiles)
+
+        control["inference_regions"] = (frame.shape[:2], regions, roi_layout)
+        return regions, roi_layout
+
+    def _infer_images(self, control, scheduler, images, annotate):
+        """
+        Runs the model on a list of images (a whole frame or crops of it).
+
+        Args:
+            control (dict): The control state dictionary.
+            scheduler (InferenceScheduler | None): The model's shared scheduler (None in process-pool mode).
+            images (list[np.ndarray]): The BGR images.
+            annotate (bool): Whether to draw the detections on each image.
+
+        Returns:
+            list[tuple[np.ndarray | None, np.ndarray]]: For each image, the annotated image (None if
+                                                  annotate is False) and the raw detections.
+        """
+        outputs = []
+        if self.process_detector is not None:
+            # All images of the frame go to one worker call through this control's shared memory
+            # ring; the worker returns detections and writes the annotated images back into the ring
+            control["frame_ring"] = self.process_detector.ensure_ring(control.get("frame_ring"), images)
+            outputs = self.process_detector.detect_many(
+                control["frame_ring"], control["behavior_code"], images,
+                timeout=INFERENCE_RESULT_TIMEOUT_SECONDS, annotate=annotate,
+                predict_kwargs=control.get("predict_kwargs")
+            )
+            control["class_names"] = self.process_detector.names.get(control["behavior_code"])
+            return outputs
+
+        # Submit the images as one group so the scheduler runs them in the same model call
+        # (together with other controls' frames using the same predict arguments);
+        # each future resolves to its own Results object
+        futures = scheduler.submit_many(images, control.get("predict_kwargs"))
+        for future in futures:
+            result = future.result(timeout=INFERENCE_RESULT_TIMEOUT_SECONDS)
+            # .plot() draws bounding boxes, masks, etc.
+            # .boxes.data gives raw detection data [x1, y1, x2, y2, confidence, class_id];
+            # kept as an array, behaviors receive it wrapped in a Detections container
+            annotated_image = result.plot() if annotate and result else None
+            detections = result.boxes.data.cpu().numpy() if result else as_detection_array([])
+            control["class_names"] = result.names
+            outputs.append((annotated_image, detections))
+        return outputs
+
 
     def _push_stream(self, code, annotated_frame_queue, push_stream, push_stream_url, stop_event, error_event, control):
         """Thread to push annotated frames via FFmpeg."""
@@ -613,59 +1150,14 @@ class VideoProcessor:
                  logger.info(f"[{code}] Pusher thread exiting due to missing stream properties.")
                  return # Exit thread
 
-            # Build FFmpeg command using utility function
-            command = build_ffmpeg_push_command(push_stream_url, width, height, input_fps)
-
-            if command is None:
-                logger.error(f"[{code}] Pusher unsupported push stream URL protocol: {push_stream_url}")
-                error_event.set()
-                control["error"] = control.get("error", f"Pusher unsupported push stream URL protocol: {push_stream_url}")
-                logger.info(f"[{code}] Pusher thread exiting due to unsupported protocol.")
-                return # Exit thread
-
-            logger.info(f"[{code}] Pusher starting FFmpeg process: {' '.join(command)}")
-
-            try:
-                # Use bufsize=0 for unbuffered pipe, which might help with low latency
-                # Redirect stderr to PIPE to capture FFmpeg logs
-                ffmpeg_process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=0)
-
-                # Start a thread to read and log FFmpeg stderr
-                def log_ffmpeg_output(process, code):
-                    try:
-                        for line in iter(process.stderr.readline, b''):
-                            # Decode stderr bytes to string, ignoring errors
-                            logger.info(f"[{code}] FFmpeg: {line.decode('utf-8', errors='ignore').strip()}")
-                    except Exception as e:
-                         logger.error(f"[{code}] Error reading FFmpeg stderr: {e}")
-                    finally:
-                        # Ensure stderr is closed
-                        try:
-                            process.stderr.close()
-                        except Exception:
-                            pass # Ignore errors on closing
-
-                threading.Thread(target=log_ffmpeg_output, args=(ffmpeg_process, code), daemon=True).start()
-
-            except FileNotFoundError:
-                logger.error(f"[{code}] Pusher FFmpeg command not found. Is FFmpeg installed and in PATH?")
-                error_event.set()
-                control["error"] = control.get("error", "FFmpeg command not found.")
-                logger.info(f"[{code}] Pusher thread exiting due to FFmpeg not found.")
-                return # Exit thread
-            except Exception as e:
-                logger.error(f"[{code}] Pusher failed to start FFmpeg process: {str(e)}")
-                error_event.set()
-                control["error"] = control.get("error", f"Pusher failed to start FFmpeg: {str(e)}")
-                logger.info(f"[{code}] Pusher thread exiting due to FFmpeg startup failure.")
-                return # Exit thread
-
-            logger.info(f"[{code}] FFmpeg process started successfully.")
+            # FFmpeg reads rawvideo of a fixed size, so it is started with the size of the first
+            # frame and restarted whenever the frames change size (e.g. the shared source reopened)
+            pushed_shape = None
 
             # Process annotated frames from the queue
             while not stop_event.is_set() and not error_event.is_set():
                 # Check if FFmpeg process is still running
-                if ffmpeg_process.poll() is not None:
+                if ffmpeg_process is not None and ffmpeg_process.poll() is not None:
                     logger.error(f"[{code}] Pusher FFmpeg process exited unexpectedly with code {ffmpeg_process.returncode}.")
                     error_event.set() # Signal error
                     control["error"] = control.get("error", f"Pusher FFmpeg process exited unexpectedly (code {ffmpeg_process.returncode}).")
@@ -674,7 +1166,14 @@ class VideoProcessor:
                 try:
                     # Get annotated frame from the queue with a timeout
                     # Use configured timeout
-                    annotated_frame = annotated_frame_queue.get(timeout=PUSHER_QUEUE_GET_TIMEOUT)
+                    queued_frame = annotated_frame_queue.get(timeout=PUSHER_QUEUE_GET_TIMEOUT)
+                    # Annotations are drawn here, in the pusher thread, not in the detector loop;
+                    # the rendered copy no longer needs the raw frame's pooled buffer
+                    try:
+                        with control["stage_stats"].time(STAGE_ANNOTATION):
+                            annotated_frame = render_frame(queued_frame)
+                    finally:
+                        queued_frame.release()
                 except queue.Empty:
                     # If queue is empty, check stop event and continue if not set
                     if stop_event.is_set() or error_event.is_set():
@@ -682,13 +1181,28 @@ class VideoProcessor:
                     # No sleep needed here, timeout in get() handles waiting
                     continue # Try getting frame again
 
+                if annotated_frame.shape[:2] != pushed_shape:
+                    if ffmpeg_process is not None:
+                        logger.warning(f"[{code}] Pusher frame size changed from {pushed_shape[1]}x{pushed_shape[0]} to "
+                                       f"{annotated_frame.shape[1]}x{annotated_frame.shape[0]}, restarting FFmpeg.")
+                        self._stop_push_process(code, ffmpeg_process)
+                        ffmpeg_process = None
+                    height, width = annotated_frame.shape[:2]
+                    input_fps = control.get("input_fps", input_fps)
+                    ffmpeg_process = self._start_push_process(code, push_stream_url, width, height, input_fps, error_event, control)
+                    if ffmpeg_process is None:
+                        logger.info(f"[{code}] Pusher thread exiting due to FFmpeg startup failure.")
+                        break # Exit loop, error_event is set
+                    pushed_shape = annotated_frame.shape[:2]
+
                 # Push to FFmpeg stdin
                 try:
                     # Ensure frame is contiguous before writing to pipe
                     if not annotated_frame.flags['C_CONTIGUOUS']:
                         annotated_frame = np.ascontiguousarray(annotated_frame)
                     # Write frame bytes to FFmpeg process's standard input
-                    ffmpeg_process.stdin.write(annotated_frame.tobytes())
+                    with control["stage_stats"].time(STAGE_PUSH_WRITE):
+                        ffmpeg_process.stdin.write(annotated_frame.tobytes())
                     # No need to flush explicitly with bufsize=0, but doesn't hurt
                     # ffmpeg_process.stdin.flush()
                 except BrokenPipeError:
@@ -713,37 +1227,95 @@ class VideoProcessor:
         finally:
             logger.info(f"[{code}] Pusher thread cleaning up.")
             if ffmpeg_process:
-                try:
-                    # Attempt to close stdin gracefully first
-                    if ffmpeg_process.stdin and not ffmpeg_process.stdin.closed:
-                         try:
-                             # Send 'q' to FFmpeg stdin to quit gracefully (might not work for rawvideo input)
-                             # Or just close stdin to signal end of input
-                             ffmpeg_process.stdin.close()
-                             logger.info(f"[{code}] Pusher closed FFmpeg stdin.")
-                         except Exception as e:
-                             logger.warning(f"[{code}] Error closing FFmpeg stdin: {e}")
-
-                    # Wait for FFmpeg to exit, with a timeout
-                    # Use configured timeout
-                    return_code = ffmpeg_process.wait(timeout=THREAD_JOIN_TIMEOUT_SECONDS)
-                    logger.info(f"[{code}] Pusher FFmpeg process exited with code {return_code}.")
-                except subprocess.TimeoutExpired:
-                    logger.warning(f"[{code}] Pusher FFmpeg process did not exit within timeout, killing it.")
-                    try:
-                        ffmpeg_process.kill()
-                        # Wait a bit more after killing
-                        ffmpeg_process.wait(timeout=2)
-                    except Exception as e:
-                        logger.error(f"[{code}] Error killing FFmpeg process: {e}")
-                except Exception as e:
-                    logger.error(f"[{code}] Pusher error during FFmpeg cleanup: {str(e)}")
+                self._stop_push_process(code, ffmpeg_process)
 
             # Mark any remaining items in the input queue as done
             # This is tricky with get(timeout) and potential exceptions, but important for proper queue joining if used
             # For simplicity with daemon threads, we might skip explicit task_done for remaining items on exit.
             logger.info(f"[{code}] Pusher thread exited.")
 
+    def _start_push_process(self, code, push_stream_url, width, height, input_fps, error_event, control):
+        """
+        Starts the FFmpeg process that pushes rawvideo frames of the given size.
+
+        Returns:
+            subprocess.Popen | None: The process, or None if it could not be started (error_event is then set).
+        """
+        # Build FFmpeg command using utility function
+        command = build_ffmpeg_push_command(push_stream_url, width, height, input_fps)
+
+        if command is None:
+            logger.error(f"[{code}] Pusher unsupported push stream URL protocol: {push_stream_url}")
+            error_event.set()
+            control["error"] = control.get("error", f"Pusher unsupported push stream URL protocol: {push_stream_url}")
+            return None
+
+        logger.info(f"[{code}] Pusher starting FFmpeg process: {' '.join(command)}")
+
+        try:
+            # Use bufsize=0 for unbuffered pipe, which might help with low latency
+            # Redirect stderr to PIPE to capture FFmpeg logs
+            ffmpeg_process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=0)
+
+            # Start a thread to read and log FFmpeg stderr
+            def log_ffmpeg_output(process, code):
+                try:
+                    for line in iter(process.stderr.readline, b''):
+                        # Decode stderr bytes to string, ignoring errors
+                        logger.info(f"[{code}] FFmpeg: {line.decode('utf-8', errors='ignore').strip()}")
+                except Exception as e:
+                     logger.error(f"[{code}] Error reading FFmpeg stderr: {e}")
+                finally:
+                    # Ensure stderr is closed
+                    try:
+                        process.stderr.close()
+                    except Exception:
+                        pass # Ignore errors on closing
+
+            threading.Thread(target=log_ffmpeg_output, args=(ffmpeg_process, code), daemon=True).start()
+
+        except FileNotFoundError:
+            logger.error(f"[{code}] Pusher FFmpeg command not found. Is FFmpeg installed and in PATH?")
+            error_event.set()
+            control["error"] = control.get("error", "FFmpeg command not found.")
+            return None
+        except Exception as e:
+            logger.error(f"[{code}] Pusher failed to start FFmpeg process: {str(e)}")
+            error_event.set()
+            control["error"] = control.get("error", f"Pusher failed to start FFmpeg: {str(e)}")
+            return None
+
+        logger.info(f"[{code}] FFmpeg process started successfully.")
+        return ffmpeg_process
+
+    def _stop_push_process(self, code, ffmpeg_process):
+        """Closes the FFmpeg push process' stdin and waits for it to exit, killing it after the timeout."""
+        try:
+            # Attempt to close stdin gracefully first
+            if ffmpeg_process.stdin and not ffmpeg_process.stdin.closed:
+                 try:
+                     # Send 'q' to FFmpeg stdin to quit gracefully (might not work for rawvideo input)
+                     # Or just close stdin to signal end of input
+                     ffmpeg_process.stdin.close()
+                     logger.info(f"[{code}] Pusher closed FFmpeg stdin.")
+                 except Exception as e:
+                     logger.warning(f"[{code}] Error closing FFmpeg stdin: {e}")
+
+            # Wait for FFmpeg to exit, with a timeout
+            # Use configured timeout
+            return_code = ffmpeg_process.wait(timeout=THREAD_JOIN_TIMEOUT_SECONDS)
+            logger.info(f"[{code}] Pusher FFmpeg process exited with code {return_code}.")
+        except subprocess.TimeoutExpired:
+            logger.warning(f"[{code}] Pusher FFmpeg process did not exit within timeout, killing it.")
+            try:
+                ffmpeg_process.kill()
+                # Wait a bit more after killing
+                ffmpeg_process.wait(timeout=2)
+            except Exception as e:
+                logger.error(f"[{code}] Error killing FFmpeg process: {e}")
+        except Exception as e:
+            logger.error(f"[{code}] Pusher error during FFmpeg cleanup: {str(e)}")
+
 
     def _cleanup_control(self, code):
         """
@@ -761,7 +1333,7 @@ class VideoProcessor:
         control["stop_event"].set()
 
         # Attempt to join threads if they are still around (should have been joined by manager, but belt and suspenders)
-        threads_to_join = ["puller_thread", "detector_thread", "pusher_thread", "manager_thread"]
+        threads_to_join = ["detector_thread", "pusher_thread", "manager_thread"]
         for thread_name in threads_to_join:
             thread = control.get(thread_name)
             if thread and thread.is_alive():
@@ -776,6 +1348,14 @@ class VideoProcessor:
                 except Exception as e:
                      logger.error(f"[{code}] Cleanup: Error joining {thread_name}: {e}")
 
+        # Unsubscribe from the stream source (a no-op if the manager already did)
+        self.stream_sources.release(code, control)
+
+        # Release this control's reference on its model so idle models can be evicted
+        model_cache_key = control.pop("model_cache_key", None)
+        if model_cache_key:
+            self.model_cache.release(model_cache_key)
+
         # Clear queues to release references to frames
         queues_to_clear = ["frame_queue", "annotated_frame_queue"]
         for queue_name in queues_to_clear:
@@ -784,8 +1364,12 @@ class VideoProcessor:
                 logger.info(f"[{code}] Cleanup: Clearing {queue_name}.")
                 while not q.empty():
                     try:
-                        # Use get_nowait() with a try-except to safely clear
-                        q.get_nowait()
+                        # Use get_nowait() with a try-except to safely clear; queued frames give back their pooled buffers
+                        item = q.get_nowait()
+                        if queue_name == "annotated_frame_queue":
+                            item.release()
+                        else:
+                            self._release_lease(item[2])
                         # If task_done was consistently called on get, uncomment this:
                         # try: q.task_done() except ValueError: pass
                     except queue.Empty: